@@ -1,21 +1,46 @@
-import base64
+import asyncio
+import hashlib
 import json
 import logging
 import os
-from typing import Dict
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
 from typing import Tuple, Union
 
 import boto3
 from dotenv import load_dotenv
-from fastapi import FastAPI, WebSocket, HTTPException, UploadFile
+from fastapi import FastAPI, Request, WebSocket, HTTPException, UploadFile
 from fastapi import File
 from fastapi import WebSocketDisconnect
-from fastapi.responses import JSONResponse
-from langchain_community.graphs import Neo4jGraph
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.datastructures import UploadFile as StarletteUploadFile
 from langchain_core.prompts import PromptTemplate
 from pydantic import BaseModel
 from types import SimpleNamespace
 from utils.json_validations import validate_and_load, SchemaOneModel, SchemaTwoModel
+from utils.inference_executor import InferenceExecutor, InferenceBusyError
+from utils.bounded_cache import BoundedCache, default_sizeof
+from utils.graph_store import GraphStore
+from utils.graph_schema import bootstrap_schema
+from utils.child_context import (NO_DATA_CONTEXT, ChildContext, child_context, fetch_child_facts,
+                                 fetch_children_facts, has_child_facts)
+from utils.image_payload import ImagePayload, ImageTooLargeError
+from utils.image_preprocessing import ImagePreprocessor, processed_image_size
+from utils.uploads import UploadSizeLimitMiddleware, iter_base64_json
+from utils.single_flight import SingleFlight
+from utils.context_store import ContextStore
+from utils.context_materializer import ContextMaterializer
+from utils.context_compaction import ContextCompactor, estimate_tokens
+from utils.metrics import MetricsRegistry, watch_event_loop_lag
+from utils.session_store import create_session_store
+from utils.rate_limit import TokenBucket
+from utils.batch_reports import BatchReportGenerator, CheckpointInUseError, ReportCheckpoint
+from utils.resilient_inference import (AIMDLimiter, CircuitBreaker, InferenceError, InferenceResult,
+                                       ResilientInference)
+from utils.model_router import ModelRouter, Route, parse_routes
 # Load environment variables
 load_dotenv()
 
@@ -23,22 +48,208 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# FastAPI app
-app = FastAPI()
-
 # Environment variables (set in AWS or .env)
 NEO4J_URI = os.getenv("NEO4J_URI", "neo4j+s://6a91c5ff.databases.neo4j.io")
 NEO4J_USERNAME = os.getenv("NEO4J_USERNAME", "neo4j")
 NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
+NEO4J_DATABASE = os.getenv("NEO4J_DATABASE") or None
+NEO4J_MAX_POOL_SIZE = int(os.getenv("NEO4J_MAX_POOL_SIZE", "50"))
+NEO4J_ACQUISITION_TIMEOUT_SECONDS = float(os.getenv("NEO4J_ACQUISITION_TIMEOUT_SECONDS", "10"))
+NEO4J_MAX_CONNECTION_LIFETIME_SECONDS = float(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME_SECONDS", "3600"))
+NEO4J_MAX_RETRY_SECONDS = float(os.getenv("NEO4J_MAX_RETRY_SECONDS", "5"))
+# Create the constraints/indexes the context queries rely on at startup (idempotent)
+NEO4J_BOOTSTRAP_SCHEMA = os.getenv("NEO4J_BOOTSTRAP_SCHEMA", "true").lower() == "true"
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+BEDROCK_MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "8"))
+BEDROCK_MAX_QUEUE = int(os.getenv("BEDROCK_MAX_QUEUE", "32"))
+BEDROCK_TIMEOUT_SECONDS = float(os.getenv("BEDROCK_TIMEOUT_SECONDS", "30"))
+# Model calls started per second (0 = no limit); the concurrency limit adapts between
+# BEDROCK_MIN_CONCURRENCY and BEDROCK_MAX_CONCURRENCY, halving on throttling
+BEDROCK_RATE_PER_SECOND = float(os.getenv("BEDROCK_RATE_PER_SECOND", "0"))
+BEDROCK_MIN_CONCURRENCY = int(os.getenv("BEDROCK_MIN_CONCURRENCY", "1"))
+# Throttled, timed-out and failed calls are retried with jittered backoff within BEDROCK_TIMEOUT_SECONDS
+BEDROCK_RETRIES = int(os.getenv("BEDROCK_RETRIES", "3"))
+BEDROCK_RETRY_BASE_SECONDS = float(os.getenv("BEDROCK_RETRY_BASE_SECONDS", "0.25"))
+BEDROCK_RETRY_MAX_SECONDS = float(os.getenv("BEDROCK_RETRY_MAX_SECONDS", "4"))
+# Consecutive failures that open the circuit (0 = never), and how long it fails fast before a probe
+BEDROCK_CIRCUIT_FAILURES = int(os.getenv("BEDROCK_CIRCUIT_FAILURES", "5"))
+BEDROCK_CIRCUIT_RESET_SECONDS = float(os.getenv("BEDROCK_CIRCUIT_RESET_SECONDS", "30"))
+# Stream tokens to the client by default; a prompt can opt out with {"stream": false}
+BEDROCK_STREAMING = os.getenv("BEDROCK_STREAMING", "true").lower() == "true"
+CONTEXT_CACHE_MAX_ENTRIES = int(os.getenv("CONTEXT_CACHE_MAX_ENTRIES", "10000"))
+CONTEXT_CACHE_MAX_BYTES = int(os.getenv("CONTEXT_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "900"))
+# Largest decoded image accepted per prompt (base64 text or binary frame)
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(10 * 1024 * 1024)))
+# Largest WebSocket message uvicorn reads into memory; anything bigger closes the connection (1009)
+# before it is buffered. The default fits a prompt carrying the largest image as base64 text, which
+# is bigger than the same image sent as a binary frame
+WS_MAX_MESSAGE_BYTES = int(os.getenv("WS_MAX_MESSAGE_BYTES") or -(-IMAGE_MAX_BYTES // 3) * 4 + 64 * 1024)
+# Images are downscaled to this longest side (0 forwards them unchanged) and cached by content hash
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1568"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_RECOMPRESS_MIN_BYTES = int(os.getenv("IMAGE_RECOMPRESS_MIN_BYTES", str(512 * 1024)))
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "256"))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+IMAGE_CACHE_TTL_SECONDS = float(os.getenv("IMAGE_CACHE_TTL_SECONDS", "3600"))
+# Request body limit for the upload endpoints and the read size used when streaming base64
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(IMAGE_MAX_BYTES + 64 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(192 * 1024)))
+# Reuse model responses for identical (context, prompt, image, model config) requests
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
+
+# Contexts are compacted to about this many tokens before prompt formatting (0 keeps full sentences)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "400"))
+# Local SQLite copy of every child's context, kept current by a background materializer
+# (empty path disables it); set the interval to 0 when the materializer runs elsewhere
+CONTEXT_STORE_PATH = os.getenv("CONTEXT_STORE_PATH", "")
+CONTEXT_MATERIALIZER_INTERVAL_SECONDS = float(os.getenv("CONTEXT_MATERIALIZER_INTERVAL_SECONDS", "0"))
+CONTEXT_MATERIALIZER_BATCH_SIZE = int(os.getenv("CONTEXT_MATERIALIZER_BATCH_SIZE", "200"))
+# Opt-in: identical model requests that are in flight at the same time share one Bedrock call, so
+# concurrent sessions asking the same thing get the same sampled answer
+INFERENCE_COALESCING = os.getenv("INFERENCE_COALESCING", "false").lower() == "true"
+# Prompts a pipelined session (handshake with "pipelined": true) may have in flight at once
+PIPELINE_MAX_IN_FLIGHT = int(os.getenv("PIPELINE_MAX_IN_FLIGHT", "4"))
+# Batch report runs share these limits, so they cannot crowd live sessions out of the inference pool
+REPORT_MAX_CONCURRENCY = int(os.getenv("REPORT_MAX_CONCURRENCY", "4"))
+REPORT_RATE_PER_SECOND = float(os.getenv("REPORT_RATE_PER_SECOND", "2"))
+REPORT_BATCH_SIZE = int(os.getenv("REPORT_BATCH_SIZE", "200"))
+REPORT_CHECKPOINT_DIR = os.getenv("REPORT_CHECKPOINT_DIR", "report_checkpoints")
+# Session metadata and contexts shared by uvicorn workers: "memory" for one worker,
+# "sqlite" (a WAL file on the host) when running several; other workers' invalidations are
+# applied every SESSION_STORE_SYNC_SECONDS
+SESSION_STORE_BACKEND = os.getenv("SESSION_STORE_BACKEND", "memory")
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "session_store.db")
+SESSION_STORE_SYNC_SECONDS = float(os.getenv("SESSION_STORE_SYNC_SECONDS", "2"))
+SESSION_RESUME_TTL_SECONDS = float(os.getenv("SESSION_RESUME_TTL_SECONDS", "3600"))
 
-# Initialize Neo4j
-graph = Neo4jGraph(url=NEO4J_URI, username=NEO4J_USERNAME, password=NEO4J_PASSWORD)
+BEDROCK_MODEL_ID = os.getenv("BEDROCK_MODEL_ID", "amazon.nova-lite-v1:0")
+# Models for text-only and image prompts as "model_id[@region], ...", in order of preference; every
+# route must accept the Nova messages request body
+BEDROCK_TEXT_ROUTES = parse_routes(os.getenv("BEDROCK_TEXT_ROUTES", BEDROCK_MODEL_ID))
+BEDROCK_IMAGE_ROUTES = parse_routes(os.getenv("BEDROCK_IMAGE_ROUTES", BEDROCK_MODEL_ID))
+# A call still running past this percentile of its route's recent latency is duplicated on the next
+# route (0 = no hedging; on by default only when there is another route); at most
+# BEDROCK_HEDGE_MAX_RATIO of calls are hedged
+BEDROCK_HEDGE_PERCENTILE = float(os.getenv(
+    "BEDROCK_HEDGE_PERCENTILE", "95" if len(BEDROCK_TEXT_ROUTES) > 1 or len(BEDROCK_IMAGE_ROUTES) > 1 else "0"))
+BEDROCK_HEDGE_MAX_RATIO = float(os.getenv("BEDROCK_HEDGE_MAX_RATIO", "0.1"))
+BEDROCK_HEDGE_MIN_SAMPLES = int(os.getenv("BEDROCK_HEDGE_MIN_SAMPLES", "20"))
+# Fraction of calls sent to a route other than the fastest, to keep measuring it
+BEDROCK_ROUTE_EXPLORE = float(os.getenv("BEDROCK_ROUTE_EXPLORE", "0.05"))
+
+# Initialize Neo4j (async, pooled; connections are opened on first query)
+graph_store = GraphStore(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD, database=NEO4J_DATABASE,
+                         max_connection_pool_size=NEO4J_MAX_POOL_SIZE,
+                         connection_acquisition_timeout=NEO4J_ACQUISITION_TIMEOUT_SECONDS,
+                         max_connection_lifetime=NEO4J_MAX_CONNECTION_LIFETIME_SECONDS,
+                         max_transaction_retry_time=NEO4J_MAX_RETRY_SECONDS)
 
 # Initialize Bedrock client
 bedrock_client = boto3.client("bedrock-runtime", region_name=AWS_REGION,
                               aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
                               aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'))
+# Clients for routes in other regions, created on first use
+regional_bedrock_clients = {}
+
+def bedrock_client_for(region: Optional[str]):
+    if not region or region == AWS_REGION:
+        return bedrock_client
+    client = regional_bedrock_clients.get(region)
+    if client is None:
+        client = regional_bedrock_clients[region] = boto3.client(
+            "bedrock-runtime", region_name=region,
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'))
+    return client
+
+# Groups, dedupes and ranks child facts into a token-budgeted context
+context_compactor = ContextCompactor(CONTEXT_TOKEN_BUDGET) if CONTEXT_TOKEN_BUDGET > 0 else None
+
+# Bounded thread pool so blocking Bedrock calls never run on the event loop
+inference_executor = InferenceExecutor(max_concurrency=BEDROCK_MAX_CONCURRENCY,
+                                       max_queue=BEDROCK_MAX_QUEUE,
+                                       timeout=BEDROCK_TIMEOUT_SECONDS)
+
+# Admission, retries and circuit breaking in front of the executor. A call keeps its adaptive
+# limit slot until its worker thread finishes, even after timing out, so the limit (at most
+# BEDROCK_MAX_CONCURRENCY, the executor's thread count) bounds busy threads too, and calls
+# wait in the limiter's queue rather than the executor's
+inference = ResilientInference(inference_executor,
+                               AIMDLimiter(BEDROCK_MAX_CONCURRENCY, minimum=BEDROCK_MIN_CONCURRENCY,
+                                           max_queue=BEDROCK_MAX_QUEUE),
+                               CircuitBreaker(BEDROCK_CIRCUIT_FAILURES, BEDROCK_CIRCUIT_RESET_SECONDS),
+                               rate_limit=TokenBucket(BEDROCK_RATE_PER_SECOND),
+                               retries=BEDROCK_RETRIES,
+                               backoff_base=BEDROCK_RETRY_BASE_SECONDS,
+                               backoff_max=BEDROCK_RETRY_MAX_SECONDS)
+
+# Chooses the model for each call by payload type and observed latency, and hedges slow calls
+model_router = ModelRouter(BEDROCK_TEXT_ROUTES, BEDROCK_IMAGE_ROUTES,
+                           hedge_percentile=BEDROCK_HEDGE_PERCENTILE,
+                           min_samples=BEDROCK_HEDGE_MIN_SAMPLES,
+                           max_hedge_ratio=BEDROCK_HEDGE_MAX_RATIO,
+                           explore=BEDROCK_ROUTE_EXPLORE,
+                           hedge_allowed=lambda: inference.limiter.waiting == 0)
+
+# Request-path instrumentation, exposed at /metrics; gauges are read at scrape time
+metrics = MetricsRegistry()
+stage_seconds = metrics.histogram("graphrag_stage_seconds", "Time spent in each request stage", labels=("stage",))
+request_seconds = metrics.histogram("graphrag_request_seconds", "Prompt received to final response frame sent",
+                                    labels=("source",))
+context_lookups = metrics.counter("graphrag_context_lookups_total", "In-process context cache lookups",
+                                  labels=("result",))
+context_loads = metrics.counter("graphrag_context_loads_total", "Context cache misses by where the context came from",
+                                labels=("source",))
+errors_total = metrics.counter("graphrag_errors_total", "Prompts answered with an error, by error class",
+                               labels=("error",))
+event_loop_lag = metrics.histogram("graphrag_event_loop_lag_seconds", "Delay in waking a task sleeping on the event loop")
+metrics.gauge("graphrag_active_connections", "Open WebSocket sessions", lambda: len(manager.active_connections))
+metrics.gauge("graphrag_inference_queue_depth", "Bedrock calls waiting for an inference slot",
+              lambda: inference.limiter.waiting + inference_executor.queue_depth)
+metrics.gauge("graphrag_inference_in_flight", "Bedrock calls running", lambda: inference_executor.in_flight)
+metrics.gauge("graphrag_inference_concurrency_limit", "Adaptive limit on concurrent Bedrock calls",
+              lambda: int(inference.limiter.limit))
+metrics.gauge("graphrag_inference_circuit_open", "1 while Bedrock calls fail fast, 0 otherwise",
+              lambda: int(inference.breaker.state != CircuitBreaker.CLOSED))
+metrics.gauge("graphrag_context_cache_entries", "Children in the in-process context cache", lambda: len(context_cache))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if NEO4J_BOOTSTRAP_SCHEMA:
+        try:
+            await bootstrap_schema(graph_store)
+        except Exception as e:
+            logger.warning(f"Graph schema bootstrap skipped: {str(e)}")
+    lag_task = asyncio.create_task(watch_event_loop_lag(event_loop_lag))
+    sync_task = asyncio.create_task(
+        session_store.follow_invalidations(apply_shared_invalidation, SESSION_STORE_SYNC_SECONDS))
+    materializer_task = None
+    if context_materializer is not None and CONTEXT_MATERIALIZER_INTERVAL_SECONDS > 0:
+        materializer_task = asyncio.create_task(
+            context_materializer.run_forever(CONTEXT_MATERIALIZER_INTERVAL_SECONDS,
+                                             lock_path=f"{CONTEXT_STORE_PATH}.refresh.lock"))
+    yield
+    lag_task.cancel()
+    sync_task.cancel()
+    if materializer_task is not None:
+        materializer_task.cancel()
+        try:
+            await materializer_task
+        except asyncio.CancelledError:
+            pass
+    await graph_store.close()
+    inference_executor.shutdown()
+    if context_store is not None:
+        context_store.close()
+    session_store.close()
+
+# FastAPI app
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=UPLOAD_MAX_BYTES, paths=["/uploadfile/", "/image-base64/"])
 
 def template_request_body():
     system_list = [
@@ -70,124 +281,653 @@ class PromptRequest(BaseModel):
     prompt: str
     session_id: str  # For WebSocket auth
 
+class BatchReportRequest(BaseModel):
+    child_ids: List[str]
+    prompt: str  # {child_id} is replaced with each child's id
+    checkpoint: Optional[str] = None  # name of a server-side checkpoint; repeat the request to resume
+
 # GraphRAG query to retrieve context
-def build_graph_context(child_id: str) -> str:
+async def build_graph_context(child_id: str) -> ChildContext:
     try:
-        query = f"""
-        MATCH (c:Child {{child_id: '{child_id}'}})-[:ASSIGNED]->(h:Homework),
-              (c)-[:PARTICIPATED]->(a:Activity), (h)-[:COVERS]->(con:Concept), 
-              (c)-[:EXPERIENCED]->(em:Emotion)-[:RELATED_TO]->(a:Activity) 
-        RETURN DISTINCT c.name, h.title, h.status, h.difficulty, em.name, em.trigger, con.name, a.name 
-        LIMIT 10
-        """
-
-        result = graph.query(query)
-        if not result:
-            return f"No data found for child {child_id}."
-        context = []
-        for record in result:
-            context.append(
-                f"{record['c.name']} is working on {record['h.title']} (Status: {record['h.status']}, "
-                f"Difficulty: {record['h.difficulty']}),  , "
-                f"covering concept {record['con.name']}. "
-                f"Also felt {record['em.name']} due to participating in {record['a.name']} activity because of '{record['em.trigger']}'."
-            )
-        return "\n".join(context)
+        facts = await fetch_child_facts(graph_store, child_id)
+        return child_context(child_id, facts, context_compactor)
     except Exception as e:
         logger.error(f"Graph query error: {str(e)}")
-        return "Error retrieving graph context."
+        return ChildContext("Error retrieving graph context.")
 
-# Call Bedrock Nova Lite
-async def call_bedrock(context: str, **kwargs) -> str:
-    try:
-        request_body = template_request_body()
-        prompt = kwargs.get('prompt')
+def invoke_bedrock_model(body: bytes, route: Route):
+    """Blocking invoke_model call; runs on the inference executor's thread pool."""
+    response = bedrock_client_for(route.region).invoke_model(
+        body=body,
+        modelId=route.model_id
+    )
+    # Parse the response
+    response_body = json.loads(response['body'].read())
+    return response_body['output']['message']['content']
 
-        prompt_template = PromptTemplate(
-            template="Context: {context}\nInstruction: {prompt}\nRespond in 2-3 sentences, empathetic tone, parent-friendly.",
-            input_variables=["context", "prompt"]
-        )
-        formatted_prompt = prompt_template.format(context=context, prompt=prompt)
-
-        if  kwargs.get('image_hex'):
-            image_hex_bytes = kwargs.get('image_hex')
-            request_body["messages"][0]["content"].append(
-                {
-                    "image": {
-                        "format": "jpeg",
-                        "source": {
-                            "bytes": image_hex_bytes
-                        }
-                    }
-                }
-            )
+def stream_bedrock_model(body: bytes, route: Route):
+    """
+    Blocking generator over invoke_model_with_response_stream; runs on the inference
+    executor's thread pool. Yields ("text", delta) for generated text and
+    ("usage", dict) once the model reports token usage.
+    """
+    response = bedrock_client_for(route.region).invoke_model_with_response_stream(
+        body=body,
+        modelId=route.model_id
+    )
+    for event in response['body']:
+        chunk = event.get('chunk')
+        if not chunk:
+            continue
+        chunk_body = json.loads(chunk['bytes'])
+        if 'contentBlockDelta' in chunk_body:
+            text = chunk_body['contentBlockDelta'].get('delta', {}).get('text')
+            if text:
+                yield "text", text
+        elif 'metadata' in chunk_body:
+            yield "usage", chunk_body['metadata'].get('usage', {})
+
+prompt_template = PromptTemplate(
+    template="Context: {context}\nInstruction: {prompt}\nRespond in 2-3 sentences, empathetic tone, parent-friendly.",
+    input_variables=["context", "prompt"]
+)
+
+def format_prompt(context: str, prompt: str) -> str:
+    return prompt_template.format(context=context, prompt=prompt)
 
+def request_digest(context: str, **kwargs) -> str:
+    """
+    Digest of everything that determines the model's answer: the models it may be routed to,
+    system prompt and inference config, the formatted prompt (which embeds the graph context)
+    and the image content.
+    """
+    image: Optional[ImagePayload] = kwargs.get('image')
+    model_config = {key: value for key, value in template_request_body().items() if key != "messages"}
+    material = json.dumps([[route.name for route in model_router.routes_for(image is not None)],
+                           model_config,
+                           format_prompt(context, kwargs.get('prompt')),
+                           f"{image.format}:{image.sha256()}" if image is not None else None],
+                          sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
 
+def response_cache_key(child_id: str, context: str, **kwargs) -> tuple:
+    """(child_id, request digest); the child_id lets a child's entries be dropped together."""
+    return child_id, request_digest(context, **kwargs)
+
+# Stands in for the image in the serialized request; replaced with the image's base64 bytes
+_IMAGE_PLACEHOLDER = "__graphrag_image_base64__"
+
+def build_bedrock_request(context: str, **kwargs) -> bytes:
+    """
+    Serialize the Bedrock request body. The image's base64 bytes are spliced into the JSON
+    after serialization, so a multi-megabyte image is copied once into the body instead of
+    going through json.dumps as a Python string.
+    """
+    request_body = template_request_body()
+    image: Optional[ImagePayload] = kwargs.get('image')
+    formatted_prompt = format_prompt(context, kwargs.get('prompt'))
+
+    if image is not None:
         request_body["messages"][0]["content"].append(
             {
-                "text": formatted_prompt
+                "image": {
+                    "format": image.format,
+                    "source": {
+                        "bytes": _IMAGE_PLACEHOLDER
+                    }
+                }
             }
         )
 
-        response = bedrock_client.invoke_model(
-            body=json.dumps(request_body),
-            modelId="amazon.nova-lite-v1:0"
-        )
-        # Parse the response
-        response_body = json.loads(response['body'].read())
-        return response_body['output']['message']['content']
-    except Exception as e:
-        logger.error(f"Bedrock error: {str(e)}")
-        return "Error generating response from Bedrock."
+
+    request_body["messages"][0]["content"].append(
+        {
+            "text": formatted_prompt
+        }
+    )
+    body = json.dumps(request_body)
+    if image is None:
+        return body.encode("utf-8")
+    # The image block precedes the prompt text, so the first occurrence is always ours
+    head, _, tail = body.partition(_IMAGE_PLACEHOLDER)
+    return b"".join((head.encode("utf-8"), image.base64_bytes(), tail.encode("utf-8")))
+
+# Call Bedrock Nova Lite
+async def run_bedrock(context: str, **kwargs) -> InferenceResult:
+    with stage_seconds.time(stage="prompt_build"):
+        body = build_bedrock_request(context, **kwargs)
+    with stage_seconds.time(stage="bedrock"):
+        return await model_router.run(lambda route: inference.run(invoke_bedrock_model, body, route),
+                                      multimodal=kwargs.get('image') is not None)
+
+async def call_bedrock(context: str, **kwargs) -> InferenceResult:
+    """The model's response content in result.value, or the kind of failure in result.error."""
+    if inference_flight is not None:
+        result = await inference_flight.do(request_digest(context, **kwargs), run_bedrock, context, **kwargs)
+    else:
+        result = await run_bedrock(context, **kwargs)
+    if not result.ok:
+        logger.error(f"Bedrock call failed ({result.error.value}, {result.attempts} attempts): {result.message}")
+        errors_total.inc(error=f"bedrock_{result.error.value}")
+    return result
+
+def inference_error_message(result: InferenceResult) -> dict:
+    """Error frame for a failed model call; `busy` tells the client that retrying later should work."""
+    if result.retry_later:
+        message = {"error": "Server is busy, please retry in a few seconds.", "busy": True}
+        if result.retry_after is not None:
+            message["retry_after"] = result.retry_after
+    else:
+        message = {"error": "Error generating response from Bedrock."}
+    message["error_type"] = result.error.value
+    return message
+
+# Stream Bedrock Nova Lite
+async def open_bedrock_stream(context: str, **kwargs):
+    with stage_seconds.time(stage="prompt_build"):
+        body = build_bedrock_request(context, **kwargs)
+    events = model_router.stream(lambda route: inference.stream(stream_bedrock_model, body, route),
+                                 multimodal=kwargs.get('image') is not None)
+    async for event in events:
+        yield event
+
+async def stream_bedrock(context: str, **kwargs):
+    """Async generator of ("text" | "usage", value) events from the response stream."""
+    if inference_flight is not None:
+        events = inference_flight.stream(request_digest(context, **kwargs), open_bedrock_stream, context, **kwargs)
+    else:
+        events = open_bedrock_stream(context, **kwargs)
+    async for event in events:
+        yield event
+
+def tagged(message: dict, request_id: Optional[str] = None) -> str:
+    """Serialize a frame, tagged with its prompt's request_id in pipelined sessions."""
+    if request_id is not None:
+        message["request_id"] = request_id
+    return json.dumps(message)
+
+async def send_streamed_response(session_id: str, context: str, request_id: Optional[str] = None,
+                                 **kwargs) -> Optional[list]:
+    """
+    Forward partial text frames as the model generates them, then a final frame
+    carrying the full text (same shape as the one-shot response) and timing metadata.
+    Returns the response content, or None if the stream failed (after sending the error frame).
+    """
+    started = time.perf_counter()
+    first_token_at = None
+    parts = []
+    usage = {}
+    try:
+        async for kind, value in stream_bedrock(context, **kwargs):
+            if kind == "usage":
+                usage = value
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                stage_seconds.observe(first_token_at - started, stage="bedrock_ttft")
+            await manager.send_message(
+                session_id,
+                tagged({"chunk": value, "seq": len(parts), "source": "bedrock"}, request_id)
+            )
+            parts.append(value)
+    except InferenceError as e:
+        logger.error(f"Bedrock stream failed ({e.result.error.value}, {e.result.attempts} attempts): "
+                     f"{e.result.message}")
+        errors_total.inc(error=f"bedrock_stream_{e.result.error.value}")
+        await manager.send_message(session_id, tagged(inference_error_message(e.result), request_id))
+        return None
+
+    finished = time.perf_counter()
+    stage_seconds.observe(finished - started, stage="bedrock_stream")
+    timing = {
+        "ttft_ms": round((first_token_at - started) * 1000, 1) if first_token_at else None,
+        "total_ms": round((finished - started) * 1000, 1),
+        "chunks": len(parts)
+    }
+    logger.info(f"Streamed response for {session_id}: {timing}")
+    response = [{"text": "".join(parts)}]
+    await manager.send_message(
+        session_id,
+        tagged({"response": response, "source": "bedrock",
+                "final": True, "timing": timing, "usage": usage}, request_id)
+    )
+    return response
 
 # WebSocket connection manager
 class SessionManager:
-    def __init__(self):
+    def __init__(self, context_cache: BoundedCache, session_store):
+        # Connections are this worker's own; session metadata is also recorded in the
+        # session store so a reconnect to any worker can resume the session
         self.active_connections: Dict[str, WebSocket] = {}
-        self.active_contexts: Dict[str, str] = {}
+        # Pipelined prompts answer concurrently; one frame is written to a socket at a time
+        self.send_locks: Dict[str, asyncio.Lock] = {}
+        # Graph context is cached per child and shared by every session for that child
+        self.session_children: Dict[str, str] = {}
+        self.context_cache = context_cache
+        self.session_store = session_store
 
     async def initialize(self, websocket: WebSocket):
         await websocket.accept()
         logger.info(f"Connected opened, awaiting session object")
         await websocket.send_text(json.dumps({"msg": "To setup session, Send session-id with child-id"}))
 
-    async def connect(self, websocket: WebSocket, session_id: str):
+    async def connect(self, websocket: WebSocket, session_id: str, child_id: str):
         # await websocket.accept()
         self.active_connections[session_id] = websocket
+        self.send_locks[session_id] = asyncio.Lock()
+        self.session_children[session_id] = child_id
+        await asyncio.to_thread(self.session_store.register, session_id, child_id)
         logger.info(f"Connected: {session_id}")
 
-    def disconnect(self, session_id: str):
+    async def disconnect(self, session_id: str):
+        self.session_children.pop(session_id, None)
+        self.send_locks.pop(session_id, None)
         if session_id in self.active_connections:
             del self.active_connections[session_id]
+            await asyncio.to_thread(self.session_store.unregister, session_id)
             logger.info(f"Disconnected: {session_id}")
 
-    def set_graph_context(self, session_id: str, context: str):
-        if session_id in self.active_connections and session_id not in self.active_contexts:
-            self.active_contexts[session_id] = context
-
-        if session_id not in self.active_connections and session_id in self.active_contexts:
-            del self.active_contexts[session_id]
-            logger.info(f"Deleted dangling context from session: {session_id}")
-
     def get_graph_context(self, session_id: str):
-        return self.active_contexts.get(session_id)
+        child_id = self.session_children.get(session_id)
+        if child_id is None:
+            return None
+        return self.context_cache.get(child_id)
 
 
     async def send_message(self, session_id: str, message: str):
-        if session_id in self.active_connections:
-            await self.active_connections[session_id].send_text(message)
+        websocket = self.active_connections.get(session_id)
+        if websocket is not None:
+            with stage_seconds.time(stage="send"):
+                async with self.send_locks[session_id]:
+                    await websocket.send_text(message)
+
+# Process-wide graph context cache keyed by child_id; holds ChildContext entries
+context_cache = BoundedCache(max_entries=CONTEXT_CACHE_MAX_ENTRIES,
+                             max_bytes=CONTEXT_CACHE_MAX_BYTES,
+                             ttl_seconds=CONTEXT_CACHE_TTL_SECONDS,
+                             sizeof=lambda context: default_sizeof(context.text),
+                             name="graph_context")
+
+# Shared across workers when SESSION_STORE_BACKEND=sqlite
+session_store = create_session_store(SESSION_STORE_BACKEND, SESSION_STORE_PATH,
+                                     context_ttl_seconds=CONTEXT_CACHE_TTL_SECONDS,
+                                     session_ttl_seconds=SESSION_RESUME_TTL_SECONDS)
+manager = SessionManager(context_cache, session_store)
+
+def apply_shared_invalidation(child_id: Optional[str]):
+    """Another worker invalidated a child's context (every child's with None); drop the local copy."""
+    if child_id is None:
+        context_cache.clear()
+    else:
+        context_cache.invalidate(child_id)
+
+async def invalidate_everywhere(child_ids: List[str]) -> bool:
+    """Drop children's contexts from this worker's cache and the shared store, and notify the other workers once."""
+    dropped = [context_cache.invalidate(child_id) for child_id in child_ids]
+    return await asyncio.to_thread(session_store.invalidate_many, child_ids) or any(dropped)
 
-manager = SessionManager()
+# Concurrent cache misses for the same child share one graph query; identical model
+# requests in flight together share one Bedrock call
+context_flight = SingleFlight(name="graph_context")
+inference_flight = SingleFlight(name="inference") if INFERENCE_COALESCING else None
+
+# Precomputed contexts; lookups go context_cache -> context_store -> live graph query
+context_store = None
+context_materializer = None
+if CONTEXT_STORE_PATH:
+    context_store = ContextStore(CONTEXT_STORE_PATH)
+    context_materializer = ContextMaterializer(graph_store, context_store,
+                                               batch_size=CONTEXT_MATERIALIZER_BATCH_SIZE,
+                                               on_refresh=invalidate_everywhere,
+                                               compactor=context_compactor)
+
+async def load_graph_context(child_id: str) -> ChildContext:
+    """
+    Load a child's context from the context store, the contexts shared by the other
+    workers, or build it live, and cache it; run through context_flight.
+    """
+    context = await asyncio.to_thread(context_store.get, child_id) if context_store is not None else None
+    if context is not None:
+        context_loads.inc(source="store")
+    else:
+        context = await asyncio.to_thread(session_store.get_context, child_id)
+        if context is not None:
+            context_loads.inc(source="shared")
+    if context is None:
+        with stage_seconds.time(stage="graph_query"):
+            context = await build_graph_context(child_id)
+        if "Error" in context.text:
+            context_loads.inc(source="error")
+            return context
+        context_loads.inc(source="live")
+        if context_store is not None:
+            await asyncio.to_thread(context_store.put, child_id, context)
+        else:
+            await asyncio.to_thread(session_store.set_context, child_id, context)
+    context_cache.set(child_id, context)
+    return context
+
+async def load_graph_contexts(child_ids: List[str]) -> Dict[str, str]:
+    """
+    Contexts for many children: cached, stored or shared ones first, the rest built from
+    one batched graph query and cached. Children without graph data are left out.
+    """
+    contexts: Dict[str, str] = {}
+    missing = []
+    cached: Dict[str, Optional[ChildContext]] = {child_id: context_cache.get(child_id) for child_id in child_ids}
+    uncached = [child_id for child_id, context in cached.items() if context is None]
+    stored = {}
+    if context_store is not None and uncached:
+        stored = await asyncio.to_thread(context_store.get_many, uncached)
+    for child_id in child_ids:
+        context = cached[child_id]
+        if context is None:
+            context = stored.get(child_id)
+        if context is None:
+            context = await asyncio.to_thread(session_store.get_context, child_id)
+        if context is None:
+            missing.append(child_id)
+        elif context.text != NO_DATA_CONTEXT.format(child_id=child_id):
+            contexts[child_id] = context.text
+    if not missing:
+        return contexts
+
+    with stage_seconds.time(stage="graph_query"):
+        facts = await fetch_children_facts(graph_store, missing)
+    built = []
+    for child_id in missing:
+        context = child_context(child_id, facts.get(child_id), context_compactor)
+        context_loads.inc(source="live")
+        context_cache.set(child_id, context)
+        built.append((child_id, context))
+        if has_child_facts(facts.get(child_id)):
+            contexts[child_id] = context.text
+    if context_store is not None:
+        await asyncio.to_thread(context_store.put_many, built)
+    else:
+        for child_id, context in built:
+            await asyncio.to_thread(session_store.set_context, child_id, context)
+    return contexts
+
+# Model responses keyed by (child_id, request digest); optional since it trades answer variety for latency
+response_cache = None
+if RESPONSE_CACHE_ENABLED:
+    response_cache = BoundedCache(max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                                  max_bytes=RESPONSE_CACHE_MAX_BYTES,
+                                  ttl_seconds=RESPONSE_CACHE_TTL_SECONDS,
+                                  name="response",
+                                  group_of=lambda key: key[0])
+
+    def _drop_child_responses(child_id: Optional[str]):
+        # A child's context was invalidated: their cached answers were built on stale facts
+        if child_id is None:
+            response_cache.clear()
+        else:
+            response_cache.invalidate_group(child_id)
+
+    context_cache.add_invalidation_listener(_drop_child_responses)
+
+# Downscaled/recompressed images keyed by the SHA-256 of the uploaded bytes
+image_preprocessor = ImagePreprocessor(max_dimension=IMAGE_MAX_DIMENSION,
+                                       jpeg_quality=IMAGE_JPEG_QUALITY,
+                                       recompress_min_bytes=IMAGE_RECOMPRESS_MIN_BYTES,
+                                       cache=BoundedCache(max_entries=IMAGE_CACHE_MAX_ENTRIES,
+                                                          max_bytes=IMAGE_CACHE_MAX_BYTES,
+                                                          ttl_seconds=IMAGE_CACHE_TTL_SECONDS,
+                                                          sizeof=processed_image_size,
+                                                          name="image"))
+
+async def generate_report(context: str, prompt: str):
+    """
+    One-shot model call for a batch report.
+
+    :raises InferenceBusyError: if the call is worth retrying later (busy, throttled, circuit open)
+    :raises InferenceError: for any other failure
+    """
+    result = await call_bedrock(context, prompt=prompt)
+    if result.retry_later:
+        raise InferenceBusyError(f"Bedrock {result.error.value}: {result.message}")
+    if not result.ok:
+        raise InferenceError(result)
+    return result.value
+
+report_generator = BatchReportGenerator(load_graph_contexts, generate_report,
+                                        max_concurrency=REPORT_MAX_CONCURRENCY,
+                                        rate_limit=TokenBucket(REPORT_RATE_PER_SECOND),
+                                        batch_size=REPORT_BATCH_SIZE,
+                                        retry_on=(InferenceBusyError,))
 
 @app.post("/uploadfile/")
 async def create_upload_file(file: UploadFile = File(...)):
     return {"filename": file.filename, "content_type": file.content_type}
 
-@app.post("/image-base64/")
-async def upload_image(file: UploadFile = File(...)):
-    contents = await file.read()
-    encoded_image = base64.b64encode(contents).decode("utf-8")
-    return {"image_data": encoded_image}
+_FILE_UPLOAD_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"]
+        }}}
+    }
+}
+
+@app.post("/image-base64/", openapi_extra=_FILE_UPLOAD_BODY)
+async def upload_image(request: Request):
+    """
+    Return the uploaded file as {"image_data": base64}, encoded and sent in chunks.
+    Starlette spools uploads over 1 MB to a temporary file, so neither the upload nor
+    its encoding is held in memory; the form is closed once the response is sent.
+    """
+    form = await request.form(max_files=1)
+    file = form.get("file")
+    if not isinstance(file, StarletteUploadFile):
+        await form.close()
+        raise HTTPException(status_code=422, detail="Expected a multipart form with a 'file' field")
+    return StreamingResponse(iter_base64_json(file, "image_data", UPLOAD_CHUNK_BYTES),
+                             media_type="application/json",
+                             background=BackgroundTask(form.close))
+
+async def receive_json_message(websocket: WebSocket) -> dict:
+    """Receive the next text frame as JSON; a binary frame here is a protocol error."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("text") is None:
+        raise ValueError("Unexpected binary frame; send a prompt with image_bytes before the image")
+    return json.loads(message["text"])
+
+async def receive_image_frame(websocket: WebSocket, declared_size: int) -> ImagePayload:
+    """
+    Receive the binary image frame announced by a prompt's image_bytes. The declared size is
+    checked against the limit before the frame is read; the frame is wrapped without copying.
+    A client that sends an oversized frame anyway is cut off by uvicorn at WS_MAX_MESSAGE_BYTES.
+    """
+    if declared_size <= 0 or declared_size > IMAGE_MAX_BYTES:
+        raise ImageTooLargeError(f"image_bytes must be between 1 and {IMAGE_MAX_BYTES}; do not send the frame")
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    frame = message.get("bytes")
+    if frame is None:
+        raise ValueError("Expected a binary image frame after a prompt with image_bytes")
+    if len(frame) != declared_size:
+        raise ValueError(f"Image frame is {len(frame)} bytes, prompt declared {declared_size}")
+    return ImagePayload.from_binary_frame(frame, IMAGE_MAX_BYTES)
+
+async def read_prompt_image(websocket: WebSocket, payload) -> Optional[ImagePayload]:
+    """The prompt's image as sent: the binary frame it announced, or its base64 image_data."""
+    if payload.image_bytes is not None:
+        return await receive_image_frame(websocket, payload.image_bytes)
+    if isinstance(payload, SchemaTwoModel) and payload.image_data:
+        return ImagePayload.from_base64_text(payload.image_data, IMAGE_MAX_BYTES)
+    return None
+
+async def answer_prompt(session_id: str, child_id: str, payload, image: Optional[ImagePayload],
+                        request_started: float, request_id: Optional[str] = None):
+    """
+    Preprocess the image, load the graph context and answer one prompt (cached, one-shot or
+    streamed), sending every frame tagged with request_id when the session is pipelined.
+    """
+    async def reply(message: dict):
+        await manager.send_message(session_id, tagged(message, request_id))
+
+    if image is not None:
+        try:
+            with stage_seconds.time(stage="image_preprocess"):
+                image = await asyncio.to_thread(image_preprocessor.process, image)
+        except ValueError as e:
+            errors_total.inc(error="invalid_image")
+            await reply({"error": f"Invalid image data: {str(e)}"})
+            return
+
+    if not payload.prompt:
+        errors_total.inc(error="no_prompt")
+        await reply({"error": "No prompt provided"})
+        return
+
+    logger.info(f"Received prompt for {child_id}: {payload.prompt}, "
+                f"Image: {f'Yes ({image.format}, {image.size} bytes)' if image else 'No'}")
+
+    # Get graph context
+    with stage_seconds.time(stage="context"):
+        context = manager.get_graph_context(session_id)
+        context_lookups.inc(result="hit" if context else "miss")
+        if not context:
+            context = await context_flight.do(child_id, load_graph_context, child_id)
+    if "Error" in context.text:
+        errors_total.inc(error="graph_context")
+        await reply({"error": context.text})
+        return
+
+    # Savings travel with the context, so a context from the store or another worker reports them too
+    logger.info(f"Context for {child_id}: ~{estimate_tokens(context.text)} tokens"
+                f"{f' ({context.tokens_saved} saved by compaction)' if context_compactor is not None else ''}")
+    context = context.text
+
+    streaming = BEDROCK_STREAMING if payload.stream is None else payload.stream
+    cache_key = None
+    if response_cache is not None:
+        cache_key = response_cache_key(child_id, context, prompt=payload.prompt, image=image)
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            message = {"response": cached, "source": "cache"}
+            if streaming:
+                message["final"] = True
+            await reply(message)
+            request_seconds.observe(time.perf_counter() - request_started, source="cache")
+            return
+
+    if streaming:
+        response = await send_streamed_response(session_id, context, request_id,
+                                                prompt=payload.prompt, image=image)
+        if response is not None:
+            request_seconds.observe(time.perf_counter() - request_started, source="bedrock_stream")
+            if cache_key is not None:
+                response_cache.set(cache_key, response)
+        return
+
+    result = await call_bedrock(context, prompt=payload.prompt, image=image)
+    if not result.ok:
+        await reply(inference_error_message(result))
+        return
+    response = result.value
+
+    if cache_key is not None:
+        response_cache.set(cache_key, response)
+
+    # Send response
+    await reply({"response": response, "source": "bedrock"})
+    request_seconds.observe(time.perf_counter() - request_started, source="bedrock")
+
+async def answer_pipelined_prompt(session_id: str, child_id: str, payload, image: Optional[ImagePayload],
+                                  request_started: float, request_id: str):
+    try:
+        await answer_prompt(session_id, child_id, payload, image, request_started, request_id)
+    except asyncio.CancelledError:
+        logger.info(f"Cancelled {request_id} for {session_id}")
+        raise
+    except Exception as e:
+        logger.error(f"WebSocket error: {str(e)}")
+        errors_total.inc(error=type(e).__name__)
+        try:
+            await manager.send_message(session_id,
+                                       tagged({"error": f"Internal server error: {str(e)}"}, request_id))
+        except Exception:
+            pass
+
+async def run_pipelined_session(websocket: WebSocket, session_id: str, child_id: str):
+    """
+    Pipelined protocol: no "Enter prompt" turn-taking. Every prompt carries a request_id and is
+    answered as its own task, up to PIPELINE_MAX_IN_FLIGHT at once per session; its frames carry
+    the same request_id and may interleave with other prompts' frames. {"cancel": request_id}
+    stops a prompt. An image frame is still read right after the prompt that announced it.
+    """
+    in_flight: Dict[str, asyncio.Task] = {}
+
+    async def reply(message: dict, request_id: Optional[str] = None):
+        await manager.send_message(session_id, tagged(message, request_id))
+
+    await reply({"msg": "Ready", "pipelined": True, "max_in_flight": PIPELINE_MAX_IN_FLIGHT})
+    try:
+        while True:
+            request_id = None
+            try:
+                input_json = await receive_json_message(websocket)
+                request_started = time.perf_counter()
+                if isinstance(input_json, dict) and "cancel" in input_json:
+                    request_id = str(input_json["cancel"])
+                    task = in_flight.pop(request_id, None)
+                    if task is None:
+                        await reply({"error": "No prompt in flight with this request_id"}, request_id)
+                        continue
+                    task.cancel()
+                    await reply({"cancelled": True}, request_id)
+                    continue
+
+                if isinstance(input_json, dict) and isinstance(input_json.get("request_id"), str):
+                    request_id = input_json["request_id"]
+                with stage_seconds.time(stage="validate"):
+                    schema_ns, payload = validate_and_load(input_json)
+                try:
+                    # Consumed even when the prompt is then rejected, so the next frame is a prompt again
+                    with stage_seconds.time(stage="image"):
+                        image = await read_prompt_image(websocket, payload)
+                except ValueError as e:
+                    errors_total.inc(error="invalid_image")
+                    await reply({"error": f"Invalid image data: {str(e)}"}, request_id)
+                    continue
+
+                if not request_id:
+                    await reply({"error": "Pipelined prompts need a non-empty string request_id"})
+                    continue
+                if request_id in in_flight:
+                    await reply({"error": "A prompt with this request_id is already in flight"}, request_id)
+                    continue
+                if len(in_flight) >= PIPELINE_MAX_IN_FLIGHT:
+                    errors_total.inc(error="session_busy")
+                    await reply({"error": f"At most {PIPELINE_MAX_IN_FLIGHT} prompts may be in flight per session",
+                                 "busy": True}, request_id)
+                    continue
+
+                task = asyncio.create_task(
+                    answer_pipelined_prompt(session_id, child_id, payload, image, request_started, request_id))
+                in_flight[request_id] = task
+                task.add_done_callback(
+                    lambda done, request_id=request_id: in_flight.pop(request_id, None)
+                    if in_flight.get(request_id) is done else None)
+            except WebSocketDisconnect:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket error: {str(e)}")
+                errors_total.inc(error=type(e).__name__)
+                await reply({"error": f"Internal server error: {str(e)}"}, request_id)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        # The client is gone; coalesced calls other sessions wait on keep running
+        for task in in_flight.values():
+            task.cancel()
 
 # WebSocket endpoint
 @app.websocket("/ws/graphrag")
@@ -204,86 +944,182 @@ async def websocket_endpoint(websocket: WebSocket):
             await websocket.send_text(json.dumps({"error": "Invalid session_id or child_id"}))
             await websocket.close()
             return
+        # A session opened earlier, possibly on another worker, is resumed only for the child it belongs to
+        stored_child_id = await asyncio.to_thread(session_store.child_for, session_id)
+        if stored_child_id is not None and stored_child_id != child_id:
+            await websocket.send_text(json.dumps({"error": "Invalid session_id or child_id"}))
+            await websocket.close()
+            return
 
         # Connect WebSocket
-        await manager.connect(websocket, session_id)
+        await manager.connect(websocket, session_id, child_id)
 
-        while True:
-            try:
-                # Receive prompt
-                await manager.send_message(session_id, json.dumps({"msg": "Enter prompt"}))
-                input_json = await websocket.receive_json()
-                schema_ns, payload = validate_and_load(input_json)
-
-                # prompt_data = payload.prompt
-                #
-                # await manager.send_message(session_id, json.dumps({
-                #     "msg": """Enter image as base64 string, if not press enter. format json: {"image_data": "image_base64_string"}"""}))
-
-                if not payload.prompt:
-                    await manager.send_message(session_id, json.dumps({"error": "No prompt provided"}))
-                    continue
+        try:
+            if data.get("pipelined") is True:
+                await run_pipelined_session(websocket, session_id, child_id)
+                return
 
-                logger.info(f"Received prompt for {child_id}: {payload.prompt}, "
-                            f"Image: {'Yes' if isinstance(payload, SchemaTwoModel) and payload.image_data else 'No'}")
+            while True:
+                try:
+                    # Receive prompt
+                    await manager.send_message(session_id, json.dumps({"msg": "Enter prompt"}))
+                    input_json = await receive_json_message(websocket)
+                    request_started = time.perf_counter()
+                    with stage_seconds.time(stage="validate"):
+                        schema_ns, payload = validate_and_load(input_json)
 
-                # Get graph context
-                if not manager.get_graph_context(session_id):
-                    ctx = build_graph_context(child_id)
-                    manager.set_graph_context(session_id, ctx)
+                    # prompt_data = payload.prompt
+                    #
+                    # await manager.send_message(session_id, json.dumps({
+                    #     "msg": """Enter image as base64 string, if not press enter. format json: {"image_data": "image_base64_string"}"""}))
 
-                context = manager.get_graph_context(session_id)
-                if "Error" in context:
-                    await manager.send_message(
-                        session_id,
-                        json.dumps({"error": context})
-                    )
-                    continue
-
-                image_data_hex_value=None
-                # Add image if provided
-                if isinstance(payload, SchemaTwoModel) and payload.image_data:
+                    # Read the image first so a binary image frame is consumed right after its prompt
                     try:
-                        image_data = payload.image_data
-                        # Decode base64 image
-                        image_bytes = base64.b64decode(
-                            image_data.split(",")[1] if "," in image_data else image_data)
-                        # image_data_hex_value=image_bytes.hex()
-                        image_data_hex_value=image_data
-
-                    except Exception as e:
-                        await websocket.send_text(json.dumps({"error": f"Invalid image data: {str(e)}"}))
+                        with stage_seconds.time(stage="image"):
+                            image = await read_prompt_image(websocket, payload)
+                    except ValueError as e:
+                        errors_total.inc(error="invalid_image")
+                        await manager.send_message(session_id, json.dumps({"error": f"Invalid image data: {str(e)}"}))
                         continue
 
-                response = await call_bedrock(context, prompt=payload.prompt, image_hex=image_data_hex_value)
+                    await answer_prompt(session_id, child_id, payload, image, request_started)
 
-                if "Error" in response:
+                except WebSocketDisconnect:
+                    break
+                except Exception as e:
+                    logger.error(f"WebSocket error: {str(e)}")
+                    errors_total.inc(error=type(e).__name__)
                     await manager.send_message(
                         session_id,
-                        json.dumps({"error": response})
+                        json.dumps({"error": f"Internal server error: {str(e)}"})
                     )
-                    continue
-
-                # Send response
-                await manager.send_message(
-                    session_id,
-                    json.dumps({"response": response, "source": "bedrock"})
-                )
-
-            except WebSocketDisconnect:
-                manager.disconnect(session_id)
-                break
-            except Exception as e:
-                logger.error(f"WebSocket error: {str(e)}")
-                await manager.send_message(
-                    session_id,
-                    json.dumps({"error": f"Internal server error: {str(e)}"})
-                )
+        finally:
+            # Also reached when the socket fails mid-session, so no per-session state outlives it
+            await manager.disconnect(session_id)
 
     except Exception as e:
         logger.error(f"Connection error: {str(e)}")
         await websocket.close()
 
+async def report_lines(request: BatchReportRequest, checkpoint_path: Optional[str] = None):
+    """
+    NDJSON lines of a report run. The checkpoint is opened (and locked) here rather than in the
+    endpoint, so it is only held while the body is actually streamed, and always closed after.
+    """
+    checkpoint = None
+    try:
+        if checkpoint_path is not None:
+            try:
+                checkpoint = await asyncio.to_thread(ReportCheckpoint, checkpoint_path, request.prompt)
+            except (CheckpointInUseError, ValueError) as e:
+                # Another run took the checkpoint after the endpoint checked it
+                yield json.dumps({"error": str(e)}) + "\n"
+                return
+        async for result in report_generator.run(request.child_ids, request.prompt, checkpoint):
+            yield json.dumps(result) + "\n"
+    finally:
+        # Also reached when the client disconnects mid-run
+        if checkpoint is not None:
+            checkpoint.close()
+
+@app.post("/reports/batch")
+async def batch_reports(request: BatchReportRequest):
+    """
+    Generate a report per child, streamed as NDJSON lines as they complete, then a summary line.
+    With a checkpoint name, repeating the request skips children already reported.
+    """
+    checkpoint_path = None
+    if request.checkpoint is not None:
+        if not re.fullmatch(r"[A-Za-z0-9_.-]{1,100}", request.checkpoint) or request.checkpoint.startswith("."):
+            raise HTTPException(status_code=422, detail="checkpoint must be a plain name (letters, digits, _ . -)")
+        checkpoint_path = os.path.join(REPORT_CHECKPOINT_DIR, request.checkpoint + ".ndjson")
+        os.makedirs(REPORT_CHECKPOINT_DIR, exist_ok=True)
+        try:
+            # Refuse a checkpoint that is in use or belongs to another prompt before the response starts
+            (await asyncio.to_thread(ReportCheckpoint, checkpoint_path, request.prompt)).close()
+        except (CheckpointInUseError, ValueError) as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    return StreamingResponse(report_lines(request, checkpoint_path), media_type="application/x-ndjson")
+
+@app.get("/reports/stats")
+async def batch_report_stats():
+    return report_generator.stats()
+
+@app.get("/inference/stats")
+async def inference_stats():
+    """Bedrock calls, retries and failures by kind, the adaptive concurrency limit and the circuit state."""
+    return inference.stats()
+
+@app.get("/inference/routes")
+async def inference_routes():
+    """Routes per payload type, calls answered and recent latency per route, and how often hedging won."""
+    return model_router.stats()
+
+@app.get("/context-cache/stats")
+async def context_cache_stats():
+    return context_cache.stats()
+
+@app.delete("/context-cache/{child_id}")
+async def invalidate_child_context(child_id: str):
+    """Drop a child's cached (and stored) graph context on every worker, e.g. after their graph data changed."""
+    stored = await asyncio.to_thread(context_store.delete, child_id) if context_store is not None else False
+    return {"child_id": child_id, "invalidated": await invalidate_everywhere([child_id]) or stored}
+
+@app.delete("/context-cache")
+async def clear_context_cache():
+    context_cache.clear()
+    await asyncio.to_thread(session_store.invalidate_context, None)
+    return {"cleared": True}
+
+@app.get("/session-store/stats")
+async def session_store_stats():
+    """Sessions connected to (or resumable on) every worker sharing the store, and shared context hits."""
+    return await asyncio.to_thread(session_store.stats)
+
+@app.get("/response-cache/stats")
+async def response_cache_stats():
+    if response_cache is None:
+        return {"name": "response", "enabled": False}
+    return {"enabled": True, **response_cache.stats()}
+
+@app.get("/context-compaction/stats")
+async def context_compaction_stats():
+    """Estimated prompt tokens before and after compaction, summed over every context built here."""
+    if context_compactor is None:
+        return {"enabled": False}
+    return {"enabled": True, **context_compactor.stats()}
+
+@app.get("/context-store/stats")
+async def context_store_stats():
+    if context_store is None:
+        return {"enabled": False}
+    return {"enabled": True, **await asyncio.to_thread(context_store.stats)}
+
+@app.post("/context-store/refresh")
+async def refresh_context_store(full: bool = False):
+    """Run the materializer now: changed children only, or every child with ?full=true."""
+    if context_materializer is None:
+        raise HTTPException(status_code=404, detail="Context store is not enabled (set CONTEXT_STORE_PATH)")
+    return await context_materializer.refresh(full=full)
+
+@app.get("/single-flight/stats")
+async def single_flight_stats():
+    """How many graph queries and model calls were saved by coalescing concurrent identical requests."""
+    stats = {"graph_context": context_flight.stats()}
+    if inference_flight is not None:
+        stats["inference"] = inference_flight.stats()
+    return stats
+
+@app.get("/image-cache/stats")
+async def image_cache_stats():
+    """Preprocessing counters (bytes saved, images resized) and the image cache hit rate."""
+    return image_preprocessor.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text format: stage latency histograms, lookup/error counters and pool gauges."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
@@ -291,4 +1127,5 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run("app:app", host="0.0.0.0", port=8000, workers=int(os.getenv("WEB_CONCURRENCY", "1")),
+                ws_max_size=WS_MAX_MESSAGE_BYTES)
\ No newline at end of file
@@ -0,0 +1,6 @@
+# Run with `python -m pytest` from src/main, which puts this directory on sys.path so
+# tests import modules as utils.x, the same way the app does. Tests in neo4j_scripts import
+# their modules by name, the same way the scripts run from that directory do.
+
+# Scripts against a live Neo4j instance, run by hand with `python -m utils.<name>`
+collect_ignore = ["utils/test_neo4j_connection.py", "utils/test_graph_context_query.py"]
@@ -0,0 +1,101 @@
+import logging
+import sqlite3
+import threading
+from typing import Dict, Iterable, Set
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    """
+    SQLite-backed record of which entities have been written to Neo4j.
+
+    Keeps one connection open in WAL mode and commits a whole batch of keys in a
+    single transaction, right after the matching graph transaction commits. Keys are
+    loaded into memory per entity type on first lookup, so `is_committed` is a set
+    membership test. A per-type counter table answers "is this load already done?"
+    without reading any keys.
+
+    Graph batches are written with MERGE, so if the process dies after a graph commit
+    but before the checkpoint commit, replaying that batch leaves the graph unchanged;
+    each batch is applied exactly once as far as the resulting data is concerned.
+    """
+
+    def __init__(self, path: str = "checkpoint.db"):
+        """
+        Args:
+            path (str): SQLite file holding the checkpoints
+        """
+        self.path = path
+        # Shared across loader threads; every access goes through self._lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._keys: Dict[str, Set[str]] = {}
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoints (
+                    entity_type TEXT,
+                    entity_id TEXT,
+                    PRIMARY KEY (entity_type, entity_id)
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS checkpoint_counts (
+                    entity_type TEXT PRIMARY KEY,
+                    committed INTEGER NOT NULL
+                )
+            """)
+            if self.conn.execute("SELECT 1 FROM checkpoint_counts LIMIT 1").fetchone() is None:
+                # Checkpoint files written before the counter table existed
+                self.conn.execute("""
+                    INSERT INTO checkpoint_counts (entity_type, committed)
+                    SELECT entity_type, COUNT(*) FROM checkpoints GROUP BY entity_type
+                """)
+            self.conn.commit()
+
+    def _loaded_keys(self, entity_type: str) -> Set[str]:
+        keys = self._keys.get(entity_type)
+        if keys is None:
+            rows = self.conn.execute(
+                "SELECT entity_id FROM checkpoints WHERE entity_type = ?", (entity_type,))
+            keys = {entity_id for (entity_id,) in rows}
+            self._keys[entity_type] = keys
+            logger.info(f"Loaded {len(keys)} {entity_type} checkpoints")
+        return keys
+
+    def is_committed(self, entity_type: str, entity_id: str) -> bool:
+        with self._lock:
+            return entity_id in self._loaded_keys(entity_type)
+
+    def committed_count(self, entity_type: str) -> int:
+        """Number of committed entities of a type; does not load the keys."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT committed FROM checkpoint_counts WHERE entity_type = ?", (entity_type,)).fetchone()
+            return row[0] if row else 0
+
+    def mark_committed_many(self, entity_type: str, entity_ids: Iterable[str]):
+        """Record a batch of committed entities in one SQLite transaction."""
+        entity_ids = list(entity_ids)
+        with self._lock:
+            keys = self._loaded_keys(entity_type)
+            before = self.conn.total_changes
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO checkpoints (entity_type, entity_id) VALUES (?, ?)",
+                    ((entity_type, entity_id) for entity_id in entity_ids))
+                inserted = self.conn.total_changes - before
+                self.conn.execute("""
+                    INSERT INTO checkpoint_counts (entity_type, committed) VALUES (?, ?)
+                    ON CONFLICT(entity_type) DO UPDATE SET committed = committed + excluded.committed
+                """, (entity_type, inserted))
+            keys.update(entity_ids)
+
+    def mark_committed(self, entity_type: str, entity_id: str):
+        self.mark_committed_many(entity_type, [entity_id])
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
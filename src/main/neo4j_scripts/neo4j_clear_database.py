@@ -1,4 +1,7 @@
+import argparse
+import json
 import logging
+import time
 from neo4j import GraphDatabase
 import os
 
@@ -54,7 +57,144 @@ class Neo4jClearDatabase:
         """
         tx.run(query)
 
+    def clear_database_batched(self, batch_size=10000, by_label=False, rebuild_indexes=False,
+                               schema_file="schema_backup.json"):
+        """
+        Delete everything in chunks of `batch_size`, one transaction per chunk, relationships first.
+
+        Each chunk commits on its own, so the wipe never needs more transaction memory than one
+        chunk and can be interrupted and rerun at any point; the rerun simply continues with
+        whatever is left.
+        Args:
+            batch_size (int): relationships/nodes deleted per transaction
+            by_label (bool): delete relationship type by type and label by label, logging each
+            rebuild_indexes (bool): drop indexes and constraints before the wipe and re-create them after;
+                their definitions are kept in `schema_file` until re-created, so an interrupted run
+                restores them on the next run
+            schema_file (str): JSON file holding the index/constraint definitions during the wipe
+        Returns:
+            dict: relationships and nodes deleted, elapsed seconds and throughput
+        """
+        started = time.perf_counter()
+        report = {"relationships_deleted": 0, "nodes_deleted": 0}
+        try:
+            with self.driver.session() as session:
+                if rebuild_indexes:
+                    self._drop_schema(session, schema_file)
+
+                rel_types = self._names(session, "CALL db.relationshipTypes() YIELD relationshipType "
+                                                 "RETURN relationshipType AS name") if by_label else []
+                for rel_type in rel_types:
+                    report["relationships_deleted"] += self._delete_in_chunks(
+                        session, f"MATCH ()-[r:`{self._escape(rel_type)}`]->() WITH r LIMIT $limit "
+                                 f"DELETE r RETURN count(r) AS deleted", batch_size, f"{rel_type} relationships")
+                report["relationships_deleted"] += self._delete_in_chunks(
+                    session, "MATCH ()-[r]->() WITH r LIMIT $limit DELETE r RETURN count(r) AS deleted",
+                    batch_size, "relationships")
+
+                labels = self._names(session, "CALL db.labels() YIELD label RETURN label AS name") if by_label else []
+                for label in labels:
+                    report["nodes_deleted"] += self._delete_in_chunks(
+                        session, f"MATCH (n:`{self._escape(label)}`) WITH n LIMIT $limit "
+                                 f"DETACH DELETE n RETURN count(n) AS deleted", batch_size, f"{label} nodes")
+                report["nodes_deleted"] += self._delete_in_chunks(
+                    session, "MATCH (n) WITH n LIMIT $limit DETACH DELETE n RETURN count(n) AS deleted",
+                    batch_size, "nodes")
+
+                if rebuild_indexes:
+                    self._restore_schema(session, schema_file)
+        except Exception as e:
+            logger.error(f"Error clearing database: {str(e)}")
+            raise
+
+        elapsed = time.perf_counter() - started
+        total = report["relationships_deleted"] + report["nodes_deleted"]
+        report["seconds"] = round(elapsed, 2)
+        report["deleted_per_second"] = round(total / elapsed, 1) if elapsed else 0.0
+        logger.info(f"Database cleared in batches: {report}")
+        return report
+
+    def _delete_in_chunks(self, session, query, batch_size, what):
+        total = 0
+        started = time.perf_counter()
+        while True:
+            deleted = session.execute_write(self._execute_chunk, query, batch_size)
+            if not deleted:
+                break
+            total += deleted
+            elapsed = time.perf_counter() - started
+            logger.info(f"Deleted {total} {what} ({total / elapsed:.0f}/s)")
+        return total
+
+    @staticmethod
+    def _execute_chunk(tx, query, limit):
+        return tx.run(query, limit=limit).single()["deleted"]
+
+    @staticmethod
+    def _names(session, query):
+        return [record["name"] for record in session.run(query)]
+
+    @staticmethod
+    def _escape(name):
+        return name.replace("`", "``")
+
+    def _drop_schema(self, session, schema_file):
+        """Save index and constraint definitions to `schema_file`, then drop them."""
+        if os.path.exists(schema_file):
+            # Left by an interrupted run: those definitions are the ones to restore, and the
+            # indexes they describe may already be gone
+            with open(schema_file) as f:
+                schema = json.load(f)
+            logger.info(f"Reusing schema backup {schema_file} from a previous run")
+        else:
+            constraints = [record.data() for record in session.run(
+                "SHOW CONSTRAINTS YIELD name, createStatement")]
+            # Constraint-backed indexes are dropped and re-created with their constraint;
+            # the built-in token lookup indexes are left alone
+            indexes = [record.data() for record in session.run(
+                "SHOW INDEXES YIELD name, type, owningConstraint, createStatement "
+                "WHERE type <> 'LOOKUP' AND owningConstraint IS NULL "
+                "RETURN name, createStatement")]
+            schema = {"constraints": constraints, "indexes": indexes}
+            with open(schema_file, "w") as f:
+                json.dump(schema, f, indent=2)
+        for constraint in schema["constraints"]:
+            session.run(f"DROP CONSTRAINT `{self._escape(constraint['name'])}` IF EXISTS").consume()
+        for index in schema["indexes"]:
+            session.run(f"DROP INDEX `{self._escape(index['name'])}` IF EXISTS").consume()
+        logger.info(f"Dropped {len(schema['constraints'])} constraints and {len(schema['indexes'])} indexes")
+
+    def _restore_schema(self, session, schema_file):
+        """Re-create the indexes and constraints saved in `schema_file`, then remove the file."""
+        with open(schema_file) as f:
+            schema = json.load(f)
+        existing = {record["name"] for record in session.run("SHOW INDEXES YIELD name RETURN name")}
+        existing |= {record["name"] for record in session.run("SHOW CONSTRAINTS YIELD name RETURN name")}
+        for item in schema["constraints"] + schema["indexes"]:
+            if item["name"] not in existing:
+                session.run(item["createStatement"]).consume()
+        os.remove(schema_file)
+        logger.info(f"Re-created {len(schema['constraints'])} constraints and {len(schema['indexes'])} indexes")
+
 def main():
+    parser = argparse.ArgumentParser(description="Delete all data from the Neo4j database")
+    parser.add_argument("--mode", choices=["single", "batched"], default="single",
+                        help="delete in a single transaction (default), or in chunks, one transaction each")
+    parser.add_argument("--batch-size", type=int, default=10000,
+                        help="relationships/nodes per transaction in batched mode")
+    parser.add_argument("--by-label", action="store_true",
+                        help="batched mode: delete relationship type by type and label by label")
+    parser.add_argument("--rebuild-indexes", action="store_true",
+                        help="batched mode: drop indexes/constraints before the wipe and re-create them afterwards")
+    parser.add_argument("--schema-file", default="schema_backup.json",
+                        help="with --rebuild-indexes: where index/constraint definitions are kept "
+                             "while they are dropped")
+    args = parser.parse_args()
+    if args.batch_size <= 0:
+        parser.error("--batch-size must be a positive number")
+    if args.mode != "batched" and (args.by_label or args.rebuild_indexes):
+        parser.error("--by-label and --rebuild-indexes need --mode batched")
+
     # Environment variables
     uri = os.getenv("NEO4J_URI")
     username = os.getenv("NEO4J_USERNAME")
@@ -63,7 +203,11 @@ def main():
     # Initialize and clear database
     db_clearer = Neo4jClearDatabase(uri, username, password)
     try:
-        db_clearer.clear_database()
+        if args.mode == "batched":
+            db_clearer.clear_database_batched(batch_size=args.batch_size, by_label=args.by_label,
+                                              rebuild_indexes=args.rebuild_indexes, schema_file=args.schema_file)
+        else:
+            db_clearer.clear_database()
     finally:
         db_clearer.close()
 
@@ -1,75 +1,41 @@
+import argparse
 import logging
 import os
-import sqlite3
-import uuid
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from checkpoint_store import CheckpointStore
 from neo4j import GraphDatabase
-from random import choice, randint
-from typing import List, Dict
+from synthetic_data import SyntheticSchoolData
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 class Neo4jPopulator:
-    def __init__(self, uri, username, password, checkpoint_db="checkpoint.db"):
+    def __init__(self, uri, username, password, checkpoint_db="checkpoint.db", batch_size=500,
+                 data: Optional[SyntheticSchoolData] = None, workers: int = 4, partition_by: str = "school"):
         self.driver = GraphDatabase.driver(uri, auth=(username, password))
         self.checkpoint_db = checkpoint_db
-        self.setup_checkpoint_db()
-        self.schools = [
-            {"id": "SCH001", "name": "VIBGYOR School"},
-            {"id": "SCH002", "name": "Cambridge Public School"},
-            {"id": "SCH003", "name": "Euro School"}
-        ]
-        self.standards = [f"STD{str(i).zfill(2)}" for i in range(1, 11)]
-        self.subjects = [
-            {"id": "SUB001", "name": "Mathematics"},
-            {"id": "SUB002", "name": "Science"},
-            {"id": "SUB003", "name": "English"},
-            {"id": "SUB004", "name": "Social Studies"},
-            {"id": "SUB005", "name": "Hindi"}
-        ]
-        self.activities = [
-            "Cricket", "Football", "Bharatnatyam Dance", "Kalaripayattu Martial Art",
-            "Karate Martial Art", "Carnatic Music", "Guitar Classes", "Piano Classes",
-            "Indian Flute Classes", "Drama", "Debates", "Science Club"
-        ]
-
-    def setup_checkpoint_db(self):
-        """Initialize SQLite database for checkpointing."""
-        with sqlite3.connect(self.checkpoint_db) as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS checkpoints (
-                    entity_type TEXT,
-                    entity_id TEXT,
-                    PRIMARY KEY (entity_type, entity_id)
-                )
-            """)
-            conn.commit()
+        self.batch_size = batch_size
+        self.checkpoints = CheckpointStore(checkpoint_db)
+        self.data = data or SyntheticSchoolData()
+        self.workers = workers
+        self.partition_by = partition_by
 
     def is_committed(self, entity_type: str, entity_id: str) -> bool:
         """Check if an entity has been committed."""
-        with sqlite3.connect(self.checkpoint_db) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT 1 FROM checkpoints WHERE entity_type = ? AND entity_id = ?",
-                (entity_type, entity_id)
-            )
-            return cursor.fetchone() is not None
+        return self.checkpoints.is_committed(entity_type, entity_id)
 
     def mark_committed(self, entity_type: str, entity_id: str):
         """Mark an entity as committed."""
-        with sqlite3.connect(self.checkpoint_db) as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO checkpoints (entity_type, entity_id) VALUES (?, ?)",
-                (entity_type, entity_id)
-            )
-            conn.commit()
+        self.checkpoints.mark_committed(entity_type, entity_id)
 
     def close(self):
         if self.driver is not None:
             self.driver.close()
+        self.checkpoints.close()
 
     def create_indexes(self):
         """Create indexes to prevent duplicates."""
@@ -90,190 +56,263 @@ class Neo4jPopulator:
         tx.run("CREATE INDEX subject_id IF NOT EXISTS FOR (sub:Subject) ON (sub.subject_id)")
         tx.run("CREATE INDEX activity_id IF NOT EXISTS FOR (act:Activity) ON (act.activity_id)")
 
-    def populate_database(self):
+    def populate_database(self, mode: str = "batched"):
+        """
+        Populate the database.
+        Args:
+            mode (str): "batched" sends entity lists to UNWIND queries, one transaction per batch;
+                "parallel" runs the batched student load on `workers` threads, one partition each;
+                "per-entity" runs one transaction per school/standard/subject/activity/student
+        """
+        if mode == "batched":
+            self.populate_database_batched()
+        elif mode == "parallel":
+            self.populate_database_parallel()
+        elif mode == "per-entity":
+            self.populate_database_per_entity()
+        else:
+            raise ValueError(f"Unknown populate mode: {mode}")
+
+    def populate_database_per_entity(self):
+        """
+        One transaction per school, subject, activity, standard and student, using the same
+        MERGE queries as the batched load with a single row each.
+        """
         try:
-            # Create indexes first
             self.create_indexes()
-            # Create schools
-            for school in self.schools:
-                if not self.is_committed("School", school["id"]):
-                    with self.driver.session() as session:
-                        session.write_transaction(self._create_school, school)
-                        self.mark_committed("School", school["id"])
-                        logger.info(f"Created school {school['name']}")
-
-            # Create standards, students, subjects, parents, activities
-            for school in self.schools:
-                for std_id in self.standards:
-                    std_key = f"{school['id']}_{std_id}"
-                    if not self.is_committed("Standard", std_key):
-                        with self.driver.session() as session:
-                            session.write_transaction(self._create_standard, school["id"], std_id)
-                            self.mark_committed("Standard", std_key)
-                            logger.info(f"Created standard {std_id} for {school['name']}")
+            with self.driver.session() as session:
+                for entity_type, query, rows in (
+                        ("School", self._merge_schools_query(), self.data.iter_schools()),
+                        ("Subject", self._merge_subjects_query(), self.data.subject_records()),
+                        ("Activity", self._merge_activities_query(), self.data.activity_records()),
+                        ("Standard", self._merge_standards_query(), self.data.iter_standards()),
+                        ("Student", self._merge_students_query(), self.data.iter_students())):
+                    for row in rows:
+                        if not self.is_committed(entity_type, row["id"]):
+                            session.execute_write(self._write_batch, query, [row])
+                            self.mark_committed(entity_type, row["id"])
+                            logger.info(f"Created {entity_type} {row['id']}")
+        except Exception as e:
+            logger.error(f"Error populating database: {str(e)}")
+            raise
 
-                    # Create subjects
-                    for subject in self.subjects:
-                        if not self.is_committed("Subject", subject["id"]):
-                            with self.driver.session() as session:
-                                session.write_transaction(self._create_subject, subject)
-                                self.mark_committed("Subject", subject["id"])
-                                logger.info(f"Created subject {subject['name']}")
+    def populate_database_batched(self):
+        """
+        Load every entity type with UNWIND queries, `batch_size` rows per transaction.
+        Writes use MERGE, so a batch that is replayed after a crash does not create duplicates.
+        """
+        try:
+            self.create_indexes()
+            with self.driver.session() as session:
+                self._load_shared_entities(session)
+                self._load_batches(session, "Student", self._merge_students_query(), self.data.iter_students(),
+                                   expected=self.data.student_count)
+        except Exception as e:
+            logger.error(f"Error populating database: {str(e)}")
+            raise
 
-                    # Create activities
-                    for activity in self.activities:
-                        act_id = f"ACT{str(uuid.uuid4())[:8]}"
-                        if not self.is_committed("Activity", act_id):
-                            with self.driver.session() as session:
-                                session.write_transaction(self._create_activity, act_id, activity)
-                                self.mark_committed("Activity", act_id)
-                                logger.info(f"Created activity {activity}")
+    def _load_shared_entities(self, session):
+        """Schools, subjects, activities and standards: the nodes every student links to."""
+        self._load_batches(session, "School", self._merge_schools_query(), self.data.iter_schools())
+        self._load_batches(session, "Subject", self._merge_subjects_query(), self.data.subject_records())
+        self._load_batches(session, "Activity", self._merge_activities_query(), self.data.activity_records())
+        self._load_batches(session, "Standard", self._merge_standards_query(), self.data.iter_standards())
 
-                    # Create students and related data
-                    for i in range(1, 11):  # 10 students per standard
-                        student_id = f"STU{school['id'][-3:]}{std_id[-2:]}{str(i).zfill(2)}"
-                        if not self.is_committed("Student", student_id):
-                            with self.driver.session() as session:
-                                session.write_transaction(
-                                    self._create_student_and_related,
-                                    school["id"], std_id, student_id, i
-                                )
-                                self.mark_committed("Student", student_id)
-                                logger.info(f"Created student {student_id}")
+    def populate_database_parallel(self) -> Dict:
+        """
+        Two-phase parallel load.
 
+        Phase 1 writes the shared nodes (schools, subjects, activities, standards) from a single
+        session, so no two workers ever create or update the same node. Phase 2 splits the
+        students by school or by standard and loads each partition on a worker thread with its
+        own session. A partition is checkpointed once all its students are committed, so a
+        rerun skips finished partitions outright.
+        Returns:
+            dict: merged load report (totals, throughput and one entry per partition)
+        """
+        started = time.perf_counter()
+        try:
+            self.create_indexes()
+            with self.driver.session() as session:
+                self._load_shared_entities(session)
         except Exception as e:
-            logger.error(f"Error populating database: {str(e)}")
+            logger.error(f"Error populating shared entities: {str(e)}")
             raise
 
-    @staticmethod
-    def _create_school(tx, school: Dict):
-        query = """
-        MATCH (s:School {school_id: $school_id})
-        WITH s, count(s) AS cnt
-        WHERE cnt = 0
-        CREATE (s:School {school_id: $school_id, name: $name})
+        partitions = self._partitions()
+        report = {"partitions": [], "students": 0, "failed": []}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="populate") as pool:
+            futures = {pool.submit(self._load_partition, key, school_id, std_id): key
+                       for key, school_id, std_id in partitions}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.error(f"Partition {key} failed: {str(e)}")
+                    report["failed"].append(key)
+                    continue
+                report["partitions"].append(result)
+                report["students"] += result["students"]
+                done = len(report["partitions"]) + len(report["failed"])
+                logger.info(f"Partition {key} done ({done}/{len(partitions)}), "
+                            f"{report['students']} students written this run")
+
+        elapsed = time.perf_counter() - started
+        report["seconds"] = round(elapsed, 2)
+        report["students_per_second"] = round(report["students"] / elapsed, 1) if elapsed else 0.0
+        logger.info(f"Parallel load finished: {report['students']} students in {report['seconds']}s "
+                    f"({report['students_per_second']}/s) on {self.workers} workers, "
+                    f"{len(report['failed'])} failed partitions")
+        if report["failed"]:
+            raise RuntimeError(f"{len(report['failed'])} partitions failed: {', '.join(sorted(report['failed']))}")
+        return report
+
+    def _partitions(self) -> List[tuple]:
+        """(checkpoint key, school_id, standard_id or None) for every partition of the student load."""
+        if self.partition_by == "school":
+            return [(f"school:{school_id}", school_id, None) for school_id in self.data.school_ids()]
+        if self.partition_by == "standard":
+            return [(f"standard:{std['id']}", std["school_id"], std["standard_id"])
+                    for std in self.data.iter_standards()]
+        raise ValueError(f"Unknown partition: {self.partition_by}")
+
+    def _load_partition(self, key: str, school_id: str, std_id: Optional[str]) -> Dict:
+        if self.checkpoints.is_committed("Partition", key):
+            return {"partition": key, "students": 0, "seconds": 0.0, "skipped": True}
+        started = time.perf_counter()
+        with self.driver.session() as session:
+            written = self._load_batches(session, "Student", self._merge_students_query(),
+                                         self.data.iter_students(school_id, std_id))
+        self.checkpoints.mark_committed("Partition", key)
+        return {"partition": key, "students": written, "seconds": round(time.perf_counter() - started, 2),
+                "skipped": False}
+
+    def _load_batches(self, session, entity_type: str, query: str, rows: Iterable[Dict],
+                      expected: Optional[int] = None) -> int:
+        """
+        Send uncommitted rows to `query` as $rows, one write transaction per batch. The batch's
+        checkpoints are committed together right after its graph transaction commits.
+        Args:
+            expected (int): total number of rows, if known; lets a finished load be skipped
+                without generating or checking any rows
+        Returns:
+            int: number of rows written
         """
-        tx.run(query, school_id=school["id"], name=school["name"])
+        if expected is not None and self.checkpoints.committed_count(entity_type) >= expected:
+            logger.info(f"All {expected} {entity_type} nodes already committed, skipping")
+            return 0
+        pending = (row for row in rows if not self.checkpoints.is_committed(entity_type, row["id"]))
+        total = 0
+        for batch in self._batched(pending, self.batch_size):
+            session.execute_write(self._write_batch, query, batch)
+            self.checkpoints.mark_committed_many(entity_type, (row["id"] for row in batch))
+            total += len(batch)
+            logger.info(f"Created {len(batch)} {entity_type} nodes ({total} this run)")
+        return total
 
     @staticmethod
-    def _create_standard(tx, school_id: str, std_id: str):
-        query = """
-        MATCH (s:School {school_id: $school_id})
-        MATCH (std:Standard {standard_id: $std_id, school_id: $school_id})
-        WITH s, std, count(std) AS cnt
-        WHERE cnt = 0
-        CREATE (std:Standard {standard_id: $std_id, school_id: $school_id, name: $name})
-        CREATE (std)-[:BELONGS_TO]->(s)
-        """
-        tx.run(query, school_id=school_id, std_id=std_id, name=f"Standard {std_id[-2:]}")
+    def _batched(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+        iterator = iter(rows)
+        while True:
+            batch = list(islice(iterator, size))
+            if not batch:
+                return
+            yield batch
+
+    @staticmethod
+    def _write_batch(tx, query: str, rows: List[Dict]):
+        tx.run(query, rows=rows).consume()
 
     @staticmethod
-    def _create_subject(tx, subject: Dict):
-        query = """
-        MATCH (sub:Subject {subject_id: $subject_id})
-        WITH sub, count(sub) AS cnt
-        WHERE cnt = 0
-        CREATE (sub:Subject {subject_id: $subject_id, name: $name})
+    def _merge_schools_query() -> str:
+        return """
+        UNWIND $rows AS row
+        MERGE (s:School {school_id: row.id})
+        SET s.name = row.name
         """
-        tx.run(query, subject_id=subject["id"], name=subject["name"])
 
     @staticmethod
-    def _create_activity(tx, act_id: str, activity: str):
-        query = """
-        MATCH (act:Activity {activity_id: $act_id})
-        WITH act, count(act) AS cnt
-        WHERE cnt = 0
-        CREATE (act:Activity {activity_id: $act_id, name: $name})
+    def _merge_subjects_query() -> str:
+        return """
+        UNWIND $rows AS row
+        MERGE (sub:Subject {subject_id: row.id})
+        SET sub.name = row.name
         """
-        tx.run(query, act_id=act_id, name=activity)
 
     @staticmethod
-    def _create_student_and_related(tx, school_id: str, std_id: str, student_id: str, index: int):
-        # Generate data
-        name = f"Student {index} {std_id[-2:]} {school_id[-3:]}"
-        scores = {sub["name"]: randint(60, 95) for sub in [
-            {"name": "Mathematics"}, {"name": "Science"}, {"name": "English"},
-            {"name": "Social Studies"}, {"name": "Hindi"}
-        ]}
-        attendance = randint(85, 95)
-        remarks = f"Good performance in {choice(['Math', 'Science', 'English'])}"
-        mother_id = f"PAR{student_id}M"
-        father_id = f"PAR{student_id}F"
-        has_activity = randint(0, 1) == 1  # 50% chance
-        activity_id = f"ACT{str(uuid.uuid4())[:8]}" if has_activity else None
+    def _merge_activities_query() -> str:
+        return """
+        UNWIND $rows AS row
+        MERGE (act:Activity {activity_id: row.id})
+        SET act.name = row.name
+        """
 
-        query = """
-        MATCH (std:Standard {standard_id: $std_id, school_id: $school_id})
-        MATCH (stu:Student {student_id: $student_id})
-        WITH std, stu, count(stu) AS stu_cnt
-        WHERE stu_cnt = 0
-        CREATE (stu:Student {
-            student_id: $student_id,
-            name: $name,
-            academic_scores: $scores,
-            attendance: $attendance,
-            remarks: $remarks
-        })
-        CREATE (stu)-[:ENROLLED_IN]->(std)
-        WITH stu
-        MATCH (m:Parent {parent_id: $mother_id}), (f:Parent {parent_id: $father_id})
-        WITH stu, m, f, count(m) AS m_cnt, count(f) AS f_cnt
-        WHERE m_cnt = 0 AND f_cnt = 0
-        CREATE (m:Parent {parent_id: $mother_id, name: $mother_name, role: 'Mother'})
-        CREATE (f:Parent {parent_id: $father_id, name: $father_name, role: 'Father'})
-        CREATE (m)-[:PARENT_OF]->(stu)
-        CREATE (f)-[:PARENT_OF]->(stu)
-        WITH stu
-        MATCH (sub:Subject)
-        WHERE sub.subject_id IN $subject_ids
-        CREATE (stu)-[:STUDIES {score: $scores[sub.name]}]->(sub)
+    @staticmethod
+    def _merge_standards_query() -> str:
+        return """
+        UNWIND $rows AS row
+        MATCH (s:School {school_id: row.school_id})
+        MERGE (std:Standard {standard_id: row.standard_id, school_id: row.school_id})
+        SET std.name = row.name
+        MERGE (std)-[:BELONGS_TO]->(s)
         """
-        params = {
-            "school_id": school_id,
-            "std_id": std_id,
-            "student_id": student_id,
-            "name": name,
-            "scores": scores,
-            "attendance": attendance,
-            "remarks": remarks,
-            "mother_id": mother_id,
-            "mother_name": f"Mrs. {name} Mother",
-            "father_id": father_id,
-            "father_name": f"Mr. {name} Father",
-            "subject_ids": [sub["id"] for sub in [
-                {"id": "SUB001", "name": "Mathematics"},
-                {"id": "SUB002", "name": "Science"},
-                {"id": "SUB003", "name": "English"},
-                {"id": "SUB004", "name": "Social Studies"},
-                {"id": "SUB005", "name": "Hindi"}
-            ]]
-        }
-        tx.run(query, **params)
 
-        if has_activity:
-            # Create activity relationship in the same transaction
-            act_query = """
-            MATCH (stu:Student {student_id: $student_id})
-            MATCH (act:Activity)
-            WHERE act.name = $activity_name
-            WITH stu, act, count(*) AS act_cnt
-            WHERE act_cnt > 0
-            MERGE (stu)-[:PARTICIPATES_IN]->(act)
-            """
-            tx.run(act_query, student_id=student_id, activity_name=choice([
-                "Cricket", "Football", "Bharatnatyam Dance", "Kalaripayattu Martial Art",
-                "Karate Martial Art", "Carnatic Music", "Guitar Classes", "Piano Classes",
-                "Indian Flute Classes", "Drama", "Debates", "Science Club"
-            ]))
+    @staticmethod
+    def _merge_students_query() -> str:
+        # Scores live on the STUDIES relationships; Neo4j does not accept map-valued node properties
+        return """
+        UNWIND $rows AS row
+        MATCH (std:Standard {standard_id: row.standard_id, school_id: row.school_id})
+        MERGE (stu:Student {student_id: row.id})
+        SET stu.name = row.name, stu.attendance = row.attendance, stu.remarks = row.remarks
+        MERGE (stu)-[:ENROLLED_IN]->(std)
+        MERGE (m:Parent {parent_id: row.mother_id})
+        SET m.name = row.mother_name, m.role = 'Mother'
+        MERGE (f:Parent {parent_id: row.father_id})
+        SET f.name = row.father_name, f.role = 'Father'
+        MERGE (m)-[:PARENT_OF]->(stu)
+        MERGE (f)-[:PARENT_OF]->(stu)
+        WITH stu, row
+        CALL {
+            WITH stu, row
+            UNWIND row.scores AS score
+            MATCH (sub:Subject {subject_id: score.subject_id})
+            MERGE (stu)-[r:STUDIES]->(sub)
+            SET r.score = score.score
+        }
+        WITH stu, row
+        WHERE row.activity_id IS NOT NULL
+        MATCH (act:Activity {activity_id: row.activity_id})
+        MERGE (stu)-[:PARTICIPATES_IN]->(act)
+        """
 
 def main():
+    parser = argparse.ArgumentParser(description="Populate Neo4j with the school schema")
+    parser.add_argument("--mode", choices=["batched", "parallel", "per-entity"], default="batched",
+                        help="batched UNWIND load (default), parallel batched load, or one transaction per entity")
+    parser.add_argument("--workers", type=int, default=4, help="worker threads in parallel mode")
+    parser.add_argument("--partition-by", choices=["school", "standard"], default="school",
+                        help="how the student load is split between workers in parallel mode")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows per transaction in batched mode")
+    parser.add_argument("--checkpoint-db", default="checkpoint.db", help="SQLite checkpoint file")
+    parser.add_argument("--schools", type=int, default=3)
+    parser.add_argument("--standards", type=int, default=10, help="standards per school")
+    parser.add_argument("--students-per-standard", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42, help="seed for the generated roster")
+    args = parser.parse_args()
+
     NEO4J_URI = os.getenv("NEO4J_URI")
     NEO4J_USERNAME = os.getenv("NEO4J_USERNAME")
     NEO4J_PASSWORD = os.getenv("NEO4J_PASSWORD")
 
-    populator = Neo4jPopulator(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD)
+    populator = Neo4jPopulator(NEO4J_URI, NEO4J_USERNAME, NEO4J_PASSWORD,
+                               checkpoint_db=args.checkpoint_db, batch_size=args.batch_size,
+                               data=SyntheticSchoolData(args.schools, args.standards,
+                                                        args.students_per_standard, args.seed),
+                               workers=args.workers, partition_by=args.partition_by)
     try:
-        populator.populate_database()
+        populator.populate_database(mode=args.mode)
     finally:
         populator.close()
 
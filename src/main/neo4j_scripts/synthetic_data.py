@@ -0,0 +1,214 @@
+import argparse
+import csv
+import logging
+import os
+import random
+from typing import Dict, Iterator, List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCHOOL_NAMES = ["VIBGYOR School", "Cambridge Public School", "Euro School"]
+SUBJECTS = [
+    {"id": "SUB001", "name": "Mathematics"},
+    {"id": "SUB002", "name": "Science"},
+    {"id": "SUB003", "name": "English"},
+    {"id": "SUB004", "name": "Social Studies"},
+    {"id": "SUB005", "name": "Hindi"}
+]
+ACTIVITIES = [
+    "Cricket", "Football", "Bharatnatyam Dance", "Kalaripayattu Martial Art",
+    "Karate Martial Art", "Carnatic Music", "Guitar Classes", "Piano Classes",
+    "Indian Flute Classes", "Drama", "Debates", "Science Club"
+]
+REMARK_SUBJECTS = ["Math", "Science", "English"]
+MALE_FIRST_NAMES = ["Aarav", "Vivaan", "Aditya", "Vihaan", "Arjun", "Sai", "Reyansh", "Ishaan", "Kabir", "Rohan"]
+FEMALE_FIRST_NAMES = ["Ananya", "Diya", "Saanvi", "Aadhya", "Myra", "Kavya", "Anika", "Ira", "Meera", "Priya"]
+LAST_NAMES = [
+    "Sharma", "Verma", "Iyer", "Nair", "Reddy", "Patel", "Gupta", "Rao", "Menon", "Das",
+    "Kulkarni", "Joshi", "Singh", "Mehta", "Pillai"
+]
+
+# neo4j-admin import files: (file name, header). Node files carry a :LABEL column and
+# relationship files a :TYPE column, so they can be passed without per-file labels.
+NODE_FILES = {
+    "School": ("schools.csv", ["school_id:ID(School)", "name", ":LABEL"]),
+    "Standard": ("standards.csv", [":ID(Standard)", "standard_id", "school_id", "name", ":LABEL"]),
+    "Subject": ("subjects.csv", ["subject_id:ID(Subject)", "name", ":LABEL"]),
+    "Activity": ("activities.csv", ["activity_id:ID(Activity)", "name", ":LABEL"]),
+    "Student": ("students.csv", ["student_id:ID(Student)", "name", "attendance:int", "remarks", ":LABEL"]),
+    "Parent": ("parents.csv", ["parent_id:ID(Parent)", "name", "role", ":LABEL"]),
+}
+RELATIONSHIP_FILES = {
+    "BELONGS_TO": ("belongs_to.csv", [":START_ID(Standard)", ":END_ID(School)", ":TYPE"]),
+    "ENROLLED_IN": ("enrolled_in.csv", [":START_ID(Student)", ":END_ID(Standard)", ":TYPE"]),
+    "PARENT_OF": ("parent_of.csv", [":START_ID(Parent)", ":END_ID(Student)", ":TYPE"]),
+    "STUDIES": ("studies.csv", [":START_ID(Student)", ":END_ID(Subject)", "score:int", ":TYPE"]),
+    "PARTICIPATES_IN": ("participates_in.csv", [":START_ID(Student)", ":END_ID(Activity)", ":TYPE"]),
+}
+
+
+class SyntheticSchoolData:
+    """
+    Seeded, lazily generated school roster.
+
+    Every student is generated from its own RNG seeded with (seed, student_id), so the
+    same arguments always produce the same records, any school or standard can be
+    generated on its own, and nothing is held in memory beyond the current record.
+    """
+
+    def __init__(self, schools: int = 3, standards: int = 10, students_per_standard: int = 10,
+                 seed: int = 42, activity_ratio: float = 0.5):
+        """
+        Args:
+            schools (int): number of schools
+            standards (int): standards per school
+            students_per_standard (int): students in each standard
+            seed (int): seed for every random choice
+            activity_ratio (float): share of students enrolled in an extracurricular activity
+        """
+        self.schools = schools
+        self.standards = standards
+        self.students_per_standard = students_per_standard
+        self.seed = seed
+        self.activity_ratio = activity_ratio
+        # Id widths keep the original ids (SCH001, STD01, STU0010101) at the default sizes
+        self._school_width = max(3, len(str(schools)))
+        self._standard_width = max(2, len(str(standards)))
+        self._student_width = max(2, len(str(students_per_standard)))
+
+    @property
+    def student_count(self) -> int:
+        return self.schools * self.standards * self.students_per_standard
+
+    def school_ids(self) -> List[str]:
+        return [f"SCH{str(n).zfill(self._school_width)}" for n in range(1, self.schools + 1)]
+
+    def standard_ids(self) -> List[str]:
+        return [f"STD{str(n).zfill(self._standard_width)}" for n in range(1, self.standards + 1)]
+
+    def iter_schools(self) -> Iterator[Dict]:
+        for n, school_id in enumerate(self.school_ids(), start=1):
+            name = SCHOOL_NAMES[n - 1] if n <= len(SCHOOL_NAMES) else f"School {n}"
+            yield {"id": school_id, "name": name}
+
+    def iter_standards(self, school_id: Optional[str] = None) -> Iterator[Dict]:
+        school_ids = [school_id] if school_id else self.school_ids()
+        for sch_id in school_ids:
+            for std_id in self.standard_ids():
+                yield {"id": f"{sch_id}_{std_id}", "school_id": sch_id, "standard_id": std_id,
+                       "name": f"Standard {std_id[3:]}"}
+
+    @staticmethod
+    def subject_records() -> List[Dict]:
+        return [dict(subject) for subject in SUBJECTS]
+
+    @staticmethod
+    def activity_records() -> List[Dict]:
+        """Activities with stable ids, so batches can be replayed and students can reference them."""
+        return [{"id": f"ACT{str(i).zfill(3)}", "name": name} for i, name in enumerate(ACTIVITIES, start=1)]
+
+    def iter_students(self, school_id: Optional[str] = None, standard_id: Optional[str] = None) -> Iterator[Dict]:
+        """Yield student records, optionally restricted to one school and/or standard."""
+        school_ids = [school_id] if school_id else self.school_ids()
+        standard_ids = [standard_id] if standard_id else self.standard_ids()
+        for sch_id in school_ids:
+            for std_id in standard_ids:
+                for index in range(1, self.students_per_standard + 1):
+                    yield self.student(sch_id, std_id, index)
+
+    def student(self, school_id: str, std_id: str, index: int) -> Dict:
+        student_id = f"STU{school_id[3:]}{std_id[3:]}{str(index).zfill(self._student_width)}"
+        rng = random.Random(f"{self.seed}:{student_id}")
+        first_name = rng.choice(MALE_FIRST_NAMES + FEMALE_FIRST_NAMES)
+        last_name = rng.choice(LAST_NAMES)
+        name = f"{first_name} {last_name}"
+        has_activity = rng.random() < self.activity_ratio
+        activity_id = f"ACT{str(rng.randint(1, len(ACTIVITIES))).zfill(3)}" if has_activity else None
+        return {
+            "id": student_id,
+            "school_id": school_id,
+            "standard_id": std_id,
+            "name": name,
+            "attendance": rng.randint(85, 95),
+            "remarks": f"Good performance in {rng.choice(REMARK_SUBJECTS)}",
+            "mother_id": f"PAR{student_id}M",
+            "mother_name": f"Mrs. {rng.choice(FEMALE_FIRST_NAMES)} {last_name}",
+            "father_id": f"PAR{student_id}F",
+            "father_name": f"Mr. {rng.choice(MALE_FIRST_NAMES)} {last_name}",
+            "scores": [{"subject_id": sub["id"], "score": rng.randint(60, 95)} for sub in SUBJECTS],
+            "activity_id": activity_id
+        }
+
+    def write_bulk_import_csv(self, out_dir: str) -> Dict[str, int]:
+        """
+        Stream the roster into node and relationship CSVs in the neo4j-admin import format.
+        Returns the number of rows written per label/relationship type.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        specs = {**NODE_FILES, **RELATIONSHIP_FILES}
+        handles = {key: open(os.path.join(out_dir, file_name), "w", newline="", encoding="utf-8")
+                   for key, (file_name, _) in specs.items()}
+        counts = {key: 0 for key in specs}
+        try:
+            writers = {key: csv.writer(handle) for key, handle in handles.items()}
+            for key, (_, header) in specs.items():
+                writers[key].writerow(header)
+
+            def write(key, row):
+                writers[key].writerow(row)
+                counts[key] += 1
+
+            for school in self.iter_schools():
+                write("School", [school["id"], school["name"], "School"])
+            for subject in self.subject_records():
+                write("Subject", [subject["id"], subject["name"], "Subject"])
+            for activity in self.activity_records():
+                write("Activity", [activity["id"], activity["name"], "Activity"])
+            for std in self.iter_standards():
+                write("Standard", [std["id"], std["standard_id"], std["school_id"], std["name"], "Standard"])
+                write("BELONGS_TO", [std["id"], std["school_id"], "BELONGS_TO"])
+            for stu in self.iter_students():
+                write("Student", [stu["id"], stu["name"], stu["attendance"], stu["remarks"], "Student"])
+                write("ENROLLED_IN", [stu["id"], f"{stu['school_id']}_{stu['standard_id']}", "ENROLLED_IN"])
+                write("Parent", [stu["mother_id"], stu["mother_name"], "Mother", "Parent"])
+                write("Parent", [stu["father_id"], stu["father_name"], "Father", "Parent"])
+                write("PARENT_OF", [stu["mother_id"], stu["id"], "PARENT_OF"])
+                write("PARENT_OF", [stu["father_id"], stu["id"], "PARENT_OF"])
+                for score in stu["scores"]:
+                    write("STUDIES", [stu["id"], score["subject_id"], score["score"], "STUDIES"])
+                if stu["activity_id"]:
+                    write("PARTICIPATES_IN", [stu["id"], stu["activity_id"], "PARTICIPATES_IN"])
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return counts
+
+
+def import_command(out_dir: str, database: str = "neo4j") -> str:
+    """neo4j-admin command that loads the files written by write_bulk_import_csv into an empty database."""
+    nodes = " ".join(f"--nodes={os.path.join(out_dir, file_name)}" for file_name, _ in NODE_FILES.values())
+    relationships = " ".join(f"--relationships={os.path.join(out_dir, file_name)}"
+                             for file_name, _ in RELATIONSHIP_FILES.values())
+    return f"neo4j-admin database import full {nodes} {relationships} --overwrite-destination {database}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic school roster as neo4j-admin import CSVs")
+    parser.add_argument("--schools", type=int, default=3)
+    parser.add_argument("--standards", type=int, default=10, help="standards per school")
+    parser.add_argument("--students-per-standard", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default="import", help="output directory for the CSV files")
+    args = parser.parse_args()
+
+    data = SyntheticSchoolData(args.schools, args.standards, args.students_per_standard, args.seed)
+    counts = data.write_bulk_import_csv(args.out)
+    for key, count in counts.items():
+        logger.info(f"{key}: {count} rows")
+    logger.info(f"Load with: {import_command(args.out)}")
+
+
+if __name__ == "__main__":
+    main()
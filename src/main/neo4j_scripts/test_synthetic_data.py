@@ -0,0 +1,38 @@
+import csv
+import os
+
+from synthetic_data import RELATIONSHIP_FILES, SUBJECTS, SyntheticSchoolData
+
+
+def test_same_arguments_give_the_same_roster():
+    first = list(SyntheticSchoolData(2, 3, 4, seed=7).iter_students())
+    assert first == list(SyntheticSchoolData(2, 3, 4, seed=7).iter_students())
+    assert first != list(SyntheticSchoolData(2, 3, 4, seed=8).iter_students())
+
+
+def test_a_school_or_standard_alone_matches_the_full_roster():
+    data = SyntheticSchoolData(3, 4, 5)
+    roster = list(data.iter_students())
+    assert len(roster) == data.student_count == 60
+    assert list(data.iter_students(school_id="SCH002")) == [s for s in roster if s["school_id"] == "SCH002"]
+    assert list(data.iter_students("SCH003", "STD04")) == [
+        s for s in roster if s["school_id"] == "SCH003" and s["standard_id"] == "STD04"]
+
+
+def test_default_sizes_keep_the_original_ids():
+    data = SyntheticSchoolData()
+    student = next(data.iter_students())
+    assert (student["id"], student["school_id"], student["standard_id"]) == ("STU0010101", "SCH001", "STD01")
+    assert data.school_ids()[-1] == "SCH003" and data.standard_ids()[-1] == "STD10"
+    assert SyntheticSchoolData(schools=1200).school_ids()[-1] == "SCH1200"
+
+
+def test_bulk_import_csv_counts_match_the_files(tmp_path):
+    data = SyntheticSchoolData(2, 2, 3)
+    counts = data.write_bulk_import_csv(str(tmp_path))
+    assert counts["Student"] == 12 and counts["Parent"] == 24
+    assert counts["STUDIES"] == 12 * len(SUBJECTS)
+    file_name, header = RELATIONSHIP_FILES["STUDIES"]
+    with open(os.path.join(tmp_path, file_name), newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == header and len(rows) == counts["STUDIES"] + 1
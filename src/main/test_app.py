@@ -0,0 +1,245 @@
+import asyncio
+import base64
+import json
+import os
+
+import pytest
+
+# Read by app at import: no schema statements against the stub graph
+os.environ.setdefault("NEO4J_BOOTSTRAP_SCHEMA", "false")
+
+import app  # noqa: E402
+from fastapi import HTTPException  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from starlette.websockets import WebSocketDisconnect  # noqa: E402
+from utils.child_context import CHILD_FACTS_QUERY, render_child_context  # noqa: E402
+from utils.context_compaction import ContextCompactor, estimate_tokens  # noqa: E402
+from utils.stub_backends import StubBedrockClient, StubGraphStore, install  # noqa: E402
+
+
+@pytest.fixture
+def install_stubs(tmp_path, monkeypatch):
+    """Installs the stub graph store and a stub Bedrock with the given timings; callable again to change them."""
+    monkeypatch.setattr(app, "REPORT_CHECKPOINT_DIR", str(tmp_path))
+    app.context_cache.clear()
+
+    def install_with(ttft_ms: float = 5, token_ms: float = 1, tokens: int = 5):
+        install(app, StubGraphStore(latency_ms=1, jitter_ms=0, seed=1),
+                StubBedrockClient(ttft_ms=ttft_ms, token_ms=token_ms, tokens=tokens, jitter_ms=0, seed=1))
+        return app
+    return install_with
+
+
+@pytest.fixture
+def stubbed(install_stubs):
+    return install_stubs()
+
+
+async def read_body(response):
+    return [json.loads(line) async for line in response.body_iterator]
+
+
+def test_batch_report_checkpoint_is_not_held_by_an_unread_response(stubbed):
+    request = app.BatchReportRequest(child_ids=["C1", "C2"], prompt="Report for {child_id}", checkpoint="nightly")
+
+    async def scenario():
+        # A response whose body is never streamed must not keep the checkpoint
+        await app.batch_reports(request)
+        lines = await read_body(await app.batch_reports(request))
+        assert lines[-1]["summary"]["ok"] == 2
+        # Repeating the request resumes: nothing is left to report
+        lines = await read_body(await app.batch_reports(request))
+        assert lines[-1]["summary"]["skipped"] == 2
+
+    asyncio.run(scenario())
+
+
+def test_batch_report_checkpoint_in_use_or_for_another_prompt_is_refused(stubbed):
+    request = app.BatchReportRequest(child_ids=["C1"], prompt="Report for {child_id}", checkpoint="nightly")
+
+    async def scenario():
+        response = await app.batch_reports(request)
+        lines = response.body_iterator
+        first = json.loads(await lines.__anext__())
+        assert first["child_id"] == "C1"
+        # The first run is still streaming, so it holds the checkpoint
+        with pytest.raises(HTTPException) as refused:
+            await app.batch_reports(request)
+        assert refused.value.status_code == 409
+        await lines.aclose()
+        other = app.BatchReportRequest(child_ids=["C1"], prompt="Another prompt", checkpoint="nightly")
+        with pytest.raises(HTTPException) as refused:
+            await app.batch_reports(other)
+        assert refused.value.status_code == 409
+
+    asyncio.run(scenario())
+
+
+
+
+class FactsGraphStore:
+    """Answers the child facts query with fixed facts, in the rank order the query returns them."""
+
+    def __init__(self, facts):
+        self.facts = facts
+
+    async def read(self, query, **params):
+        return [self.facts] if query == CHILD_FACTS_QUERY else []
+
+
+def test_compacted_context_keeps_the_highest_ranked_facts_and_reports_savings(stubbed, monkeypatch):
+    facts = {
+        "name": "Asha",
+        "homework": [{"title": f"Worksheet {rank:02d}", "status": "Pending", "difficulty": "Hard",
+                      "concepts": [f"Concept {rank:02d}"]} for rank in range(20)],
+        "emotions": [{"name": f"Feeling {rank:02d}", "trigger": "a test", "activities": ["Chess"]}
+                     for rank in range(20)],
+        "activities": ["Chess", "Painting"]
+    }
+    monkeypatch.setattr(app, "graph_store", FactsGraphStore(facts))
+    monkeypatch.setattr(app, "context_compactor", ContextCompactor(token_budget=80))
+
+    context = asyncio.run(app.load_graph_context("C-compact"))
+    assert "Worksheet 00" in context.text and "Feeling 00" in context.text
+    assert "Worksheet 19" not in context.text and "Feeling 19" not in context.text
+    assert estimate_tokens(context.text) <= 80
+    assert context.tokens_saved == estimate_tokens(render_child_context(facts)) - estimate_tokens(context.text)
+    assert context.tokens_saved > 0
+    # The savings travel with the cached context
+    assert app.context_cache.get("C-compact") == context
+
+
+def sample_image() -> bytes:
+    with open(os.path.join(os.path.dirname(__file__), "utils", "sample_image_data.json")) as f:
+        return base64.b64decode(json.load(f)["image_data"])
+
+
+def start_session(ws, session_id="s1", child_id="C1"):
+    assert "msg" in ws.receive_json()
+    ws.send_json({"session_id": session_id, "child_id": child_id})
+    assert ws.receive_json() == {"msg": "Enter prompt"}
+
+
+def test_prompt_with_a_binary_image_frame_is_answered(stubbed):
+    image = sample_image()
+    with TestClient(app.app).websocket_connect("/ws/graphrag") as ws:
+        start_session(ws)
+        ws.send_json({"prompt": "What is in this picture?", "image_bytes": len(image), "stream": False})
+        ws.send_bytes(image)
+        assert "response" in ws.receive_json()
+        assert ws.receive_json() == {"msg": "Enter prompt"}
+
+
+def test_oversized_or_invalid_image_frames_are_refused(stubbed):
+    image = sample_image()
+    with TestClient(app.app).websocket_connect("/ws/graphrag") as ws:
+        start_session(ws)
+        # Refused from the declared size alone; the client must not send the frame
+        ws.send_json({"prompt": "Too big", "image_bytes": app.IMAGE_MAX_BYTES + 1})
+        assert "image_bytes must be between 1 and" in ws.receive_json()["error"]
+        assert ws.receive_json() == {"msg": "Enter prompt"}
+        ws.send_json({"prompt": "Short frame", "image_bytes": len(image)})
+        ws.send_bytes(image[:-1])
+        assert "prompt declared" in ws.receive_json()["error"]
+        assert ws.receive_json() == {"msg": "Enter prompt"}
+        ws.send_json({"prompt": "Text instead of the frame", "image_bytes": len(image)})
+        ws.send_json({"prompt": "Next"})
+        assert "Expected a binary image frame" in ws.receive_json()["error"]
+        assert ws.receive_json() == {"msg": "Enter prompt"}
+        ws.send_json({"prompt": "Not an image", "image_bytes": 4})
+        ws.send_bytes(b"\x00\x01\x02\x03")
+        assert ws.receive_json()["error"].startswith("Invalid image data")
+        assert ws.receive_json() == {"msg": "Enter prompt"}
+        # A binary frame no prompt announced
+        ws.send_bytes(image)
+        assert "Unexpected binary frame" in ws.receive_json()["error"]
+
+
+def start_pipelined_session(ws, session_id="s1", child_id="C1"):
+    assert "msg" in ws.receive_json()
+    ws.send_json({"session_id": session_id, "child_id": child_id, "pipelined": True})
+    ready = ws.receive_json()
+    assert ready["msg"] == "Ready" and ready["max_in_flight"] == app.PIPELINE_MAX_IN_FLIGHT
+
+
+def receive_until_answered(ws, request_ids):
+    """Frames by request_id until every one of request_ids has its final frame or an error."""
+    frames, pending = {}, set(request_ids)
+    while pending:
+        frame = ws.receive_json()
+        frames.setdefault(frame["request_id"], []).append(frame)
+        if "response" in frame or "error" in frame or frame.get("cancelled"):
+            pending.discard(frame["request_id"])
+    return frames
+
+
+def test_pipelined_prompts_are_answered_with_their_request_id(stubbed):
+    with TestClient(app.app).websocket_connect("/ws/graphrag") as ws:
+        start_pipelined_session(ws)
+        ws.send_json({"prompt": "How is homework going?", "request_id": "q1"})
+        ws.send_json({"prompt": "Which activities?", "request_id": "q2", "stream": False})
+        frames = receive_until_answered(ws, ["q1", "q2"])
+        assert [frame for frame in frames["q1"] if "chunk" in frame]
+        assert "response" in frames["q1"][-1]
+        assert len(frames["q2"]) == 1 and "response" in frames["q2"][0]
+
+
+def test_pipelined_prompt_without_request_id_or_duplicate_id_is_refused(install_stubs):
+    install_stubs(ttft_ms=500)
+    with TestClient(app.app).websocket_connect("/ws/graphrag") as ws:
+        start_pipelined_session(ws)
+        ws.send_json({"prompt": "No id"})
+        assert "request_id" in ws.receive_json()["error"]
+        ws.send_json({"prompt": "First", "request_id": "q1"})
+        ws.send_json({"prompt": "Again", "request_id": "q1"})
+        refused = ws.receive_json()
+        assert refused["request_id"] == "q1" and "already in flight" in refused["error"]
+        assert "response" in receive_until_answered(ws, ["q1"])["q1"][-1]
+
+
+def test_pipelined_prompts_beyond_max_in_flight_are_busy(install_stubs, monkeypatch):
+    install_stubs(ttft_ms=500)
+    monkeypatch.setattr(app, "PIPELINE_MAX_IN_FLIGHT", 1)
+    with TestClient(app.app).websocket_connect("/ws/graphrag") as ws:
+        start_pipelined_session(ws)
+        ws.send_json({"prompt": "First", "request_id": "q1"})
+        ws.send_json({"prompt": "Second", "request_id": "q2"})
+        busy = ws.receive_json()
+        assert busy["request_id"] == "q2" and busy["busy"] is True
+        assert "response" in receive_until_answered(ws, ["q1"])["q1"][-1]
+
+
+def test_pipelined_prompt_can_be_cancelled(install_stubs):
+    install_stubs(ttft_ms=2000)
+    with TestClient(app.app).websocket_connect("/ws/graphrag") as ws:
+        start_pipelined_session(ws)
+        ws.send_json({"prompt": "Slow", "request_id": "q1"})
+        ws.send_json({"cancel": "q1"})
+        assert ws.receive_json() == {"cancelled": True, "request_id": "q1"}
+        ws.send_json({"cancel": "q1"})
+        assert "No prompt in flight" in ws.receive_json()["error"]
+        # The id is free again once cancelled
+        ws.send_json({"prompt": "Again", "request_id": "q1", "stream": False})
+        assert "response" in receive_until_answered(ws, ["q1"])["q1"][-1]
+
+
+def test_session_state_is_dropped_when_the_socket_fails_mid_session(stubbed, monkeypatch):
+    async def failing_answer(*args, **kwargs):
+        raise RuntimeError("model down")
+
+    async def failing_send(session_id, message):
+        raise RuntimeError("socket already closed")
+
+    monkeypatch.setattr(app, "answer_prompt", failing_answer)
+    with TestClient(app.app).websocket_connect("/ws/graphrag") as ws:
+        assert "msg" in ws.receive_json()
+        ws.send_json({"session_id": "s-fail", "child_id": "C1"})
+        assert ws.receive_json() == {"msg": "Enter prompt"}
+        # The error frame for the failed prompt cannot be sent either
+        monkeypatch.setattr(app.manager, "send_message", failing_send)
+        ws.send_json({"prompt": "Hi"})
+        with pytest.raises(WebSocketDisconnect):
+            ws.receive_json()
+    for state in (app.manager.active_connections, app.manager.send_locks, app.manager.session_children):
+        assert "s-fail" not in state
+    assert app.session_store.stats()["sessions_connected"] == 0
@@ -0,0 +1,266 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from utils.file_lock import try_lock
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Stands for the child's id in a report prompt
+CHILD_ID_PLACEHOLDER = "{child_id}"
+
+
+def report_prompt(prompt: str, child_id: str) -> str:
+    return prompt.replace(CHILD_ID_PLACEHOLDER, child_id)
+
+
+class CheckpointInUseError(Exception):
+    """Raised when another report run, in this or another process, has the checkpoint open."""
+
+
+class ReportCheckpoint:
+    """
+    Append-only NDJSON record of a report run, so an interrupted run can be resumed.
+
+    The first line pins the prompt (by digest); every later line is one child's outcome.
+    Resuming skips children already reported "ok" and retries the ones that failed.
+    Resuming with a different prompt is refused, since it would mix two report runs.
+    An open checkpoint holds an exclusive lock on PATH.lock until it is closed, so two
+    runs (e.g. on two app workers) never append to the same file.
+    """
+
+    def __init__(self, path: str, prompt: str):
+        """
+        :param path: str - checkpoint file, created if missing
+        :param prompt: str - the run's prompt template
+        :raises CheckpointInUseError: if another run has the checkpoint open
+        :raises ValueError: if the file belongs to a run with a different prompt
+        """
+        self.path = path
+        self.prompt_sha256 = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        self.completed: Set[str] = set()
+        self._lock_file = try_lock(path + ".lock")
+        if self._lock_file is None:
+            raise CheckpointInUseError(f"Checkpoint {path} is in use by another report run")
+        try:
+            self._open(path)
+        except BaseException:
+            self._lock_file.close()
+            raise
+
+    def _open(self, path: str):
+        if os.path.exists(path):
+            with open(path) as f:
+                lines = [json.loads(line) for line in f if line.strip()]
+            if lines and lines[0].get("prompt_sha256") != self.prompt_sha256:
+                raise ValueError(f"Checkpoint {path} was written for a different prompt")
+            self.completed = {line["child_id"] for line in lines[1:] if line.get("status") == "ok"}
+            self._file = open(path, "a")
+            if not lines:
+                self._write({"prompt_sha256": self.prompt_sha256})
+        else:
+            self._file = open(path, "w")
+            self._write({"prompt_sha256": self.prompt_sha256})
+
+    def _write(self, line: Dict[str, Any]):
+        self._file.write(json.dumps(line) + "\n")
+        # Flushed per line: a crash loses at most the reports still in flight
+        self._file.flush()
+
+    def record(self, child_id: str, status: str):
+        self._write({"child_id": child_id, "status": status})
+        if status == "ok":
+            self.completed.add(child_id)
+
+    def close(self):
+        self._file.close()
+        self._lock_file.close()
+
+
+class BatchReportGenerator:
+    """
+    Generates one model response per child for a list of children.
+
+    Contexts are loaded `batch_size` children at a time through `load_contexts` (one graph
+    query per batch rather than one per child), and model calls fan out under a concurrency
+    limit and a rate limit shared by every run on this generator. The next batch is loaded
+    while the current one's calls are running. Results are yielded as they complete, in no
+    particular order.
+    """
+
+    def __init__(self, load_contexts: Callable[[List[str]], Awaitable[Dict[str, str]]],
+                 generate: Callable[[str, str], Awaitable[Any]], max_concurrency: int = 4,
+                 rate_limit: Optional[TokenBucket] = None, batch_size: int = 200,
+                 retry_on: Tuple[Type[BaseException], ...] = (), retries: int = 5):
+        """
+        :param load_contexts: async callable - child_ids -> {child_id: context}; children without data are left out
+        :param generate: async callable - (context, prompt) -> response; raises on failure
+        :param max_concurrency: int - model calls in flight at once, across all runs
+        :param rate_limit: TokenBucket - model calls per second, across all runs (None for no limit)
+        :param batch_size: int - children per context query
+        :param retry_on: exception types worth retrying after a backoff, e.g. a full inference queue
+        :param retries: int - retries per child for those exceptions
+        """
+        self.load_contexts = load_contexts
+        self.generate = generate
+        self.max_concurrency = max_concurrency
+        self.rate_limit = rate_limit
+        self.batch_size = batch_size
+        self.retry_on = retry_on
+        self.retries = retries
+        # Created lazily so the semaphore binds to the running event loop
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.runs = 0
+        self.reports = 0
+        self.failures = 0
+
+    async def run(self, child_ids: Iterable[str], prompt: str,
+                  checkpoint: Optional[ReportCheckpoint] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield {"child_id", "status": "ok", "response", "ms"} or {"child_id", "status": "error", "error"}
+        per child, then {"summary": {...}}. Children completed in `checkpoint` are skipped.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        self.runs += 1
+        started = time.perf_counter()
+        child_ids = list(dict.fromkeys(child_ids))
+        pending = [child_id for child_id in child_ids
+                   if checkpoint is None or child_id not in checkpoint.completed]
+        results: asyncio.Queue = asyncio.Queue()
+        tasks: Set[asyncio.Task] = set()
+
+        async def answer(child_id: str, context: str):
+            results.put_nowait(await self._answer(child_id, context, report_prompt(prompt, child_id)))
+
+        async def produce():
+            for start in range(0, len(pending), self.batch_size):
+                batch = pending[start:start + self.batch_size]
+                try:
+                    contexts = await self.load_contexts(batch)
+                except Exception as e:
+                    logger.error(f"Report context batch failed: {str(e)}")
+                    for child_id in batch:
+                        results.put_nowait({"child_id": child_id, "status": "error",
+                                            "error": f"Graph context: {str(e)}"})
+                    continue
+                for child_id in batch:
+                    if child_id not in contexts:
+                        results.put_nowait({"child_id": child_id, "status": "error",
+                                            "error": "No graph data for child"})
+                        continue
+                    # Waiting for a slot here keeps at most one batch of contexts ahead of the model calls
+                    await self._slots.acquire()
+                    task = asyncio.create_task(answer(child_id, contexts[child_id]))
+                    tasks.add(task)
+                    # A done callback also runs for a task cancelled before it started
+                    task.add_done_callback(lambda done: (tasks.discard(done), self._slots.release()))
+
+        producer = asyncio.create_task(produce())
+        counts = {"ok": 0, "error": 0}
+        try:
+            for _ in range(len(pending)):
+                result = await results.get()
+                counts[result["status"]] += 1
+                if checkpoint is not None:
+                    checkpoint.record(result["child_id"], result["status"])
+                yield result
+            await producer
+        finally:
+            # The consumer went away (e.g. the client disconnected): stop the rest of the run
+            producer.cancel()
+            for task in list(tasks):
+                task.cancel()
+
+        self.reports += counts["ok"]
+        self.failures += counts["error"]
+        yield {"summary": {"children": len(child_ids),
+                           "skipped": len(child_ids) - len(pending),
+                           "ok": counts["ok"],
+                           "errors": counts["error"],
+                           "seconds": round(time.perf_counter() - started, 3)}}
+
+    async def _answer(self, child_id: str, context: str, prompt: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                if self.rate_limit is not None:
+                    await self.rate_limit.acquire()
+                response = await self.generate(context, prompt)
+                return {"child_id": child_id, "status": "ok", "response": response,
+                        "ms": round((time.perf_counter() - started) * 1000, 1)}
+            except self.retry_on as e:
+                if attempt == self.retries:
+                    return {"child_id": child_id, "status": "error", "error": str(e)}
+                await asyncio.sleep(min(30.0, 2 ** attempt))
+            except Exception as e:
+                return {"child_id": child_id, "status": "error", "error": str(e)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "batch_size": self.batch_size,
+            "runs": self.runs,
+            "reports": self.reports,
+            "failures": self.failures,
+            "rate_limit": self.rate_limit.stats() if self.rate_limit is not None else None
+        }
+
+
+def read_child_ids(path: str) -> List[str]:
+    """One child_id per line; blank lines and lines starting with # are ignored."""
+    with open(path) as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a report per child as NDJSON")
+    parser.add_argument("--child-ids", required=True, help="file with one child_id per line")
+    parser.add_argument("--prompt", required=True, help=f"prompt for every child; {CHILD_ID_PLACEHOLDER} is replaced")
+    parser.add_argument("--out", required=True, help="NDJSON file the reports are written to")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: OUT.checkpoint); rerun to resume")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("REPORT_MAX_CONCURRENCY", "4")),
+                        help="model calls in flight at once")
+    parser.add_argument("--rate", type=float, default=float(os.getenv("REPORT_RATE_PER_SECOND", "2")),
+                        help="model calls started per second (0 for no limit)")
+    parser.add_argument("--batch-size", type=int, default=int(os.getenv("REPORT_BATCH_SIZE", "200")),
+                        help="children per graph context query")
+    args = parser.parse_args()
+
+    # The app module carries the configured graph store, Bedrock client, caches and limits
+    import app
+    from utils.inference_executor import InferenceBusyError
+
+    try:
+        checkpoint = ReportCheckpoint(args.checkpoint or args.out + ".checkpoint", args.prompt)
+    except (CheckpointInUseError, ValueError) as e:
+        parser.error(str(e))
+    generator = BatchReportGenerator(app.load_graph_contexts, app.generate_report,
+                                     max_concurrency=args.concurrency, rate_limit=TokenBucket(args.rate),
+                                     batch_size=args.batch_size, retry_on=(InferenceBusyError,))
+
+    async def run():
+        try:
+            with open(args.out, "a" if checkpoint.completed else "w") as out:
+                async for result in generator.run(read_child_ids(args.child_ids), args.prompt, checkpoint):
+                    if "summary" in result:
+                        logger.info(f"Reports done: {result['summary']}")
+                        continue
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+        finally:
+            checkpoint.close()
+            await app.graph_store.close()
+            app.inference_executor.shutdown()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
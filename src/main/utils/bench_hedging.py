@@ -0,0 +1,54 @@
+"""
+Hedging benchmark: the same load test against the stubbed app with request hedging off and on.
+
+    python -m utils.bench_hedging [--percentiles 0,95] [--out hedging.json] [load test options...]
+
+The stub Bedrock makes a fraction of calls slow to the first token (--bedrock-slow-rate, default 2%,
+--bedrock-slow-ms, default 2000), so the runs show how much of that tail hedging removes. Hedges go to
+a second route (amazon.nova-micro-v1:0 unless BEDROCK_TEXT_ROUTES/BEDROCK_IMAGE_ROUTES are set with
+--env). Percentile 0 turns hedging off. Any utils.load_test option can be added, e.g. --no-stream or
+--bedrock-model-ttft-ms amazon.nova-micro-v1:0=200.
+"""
+import argparse
+import json
+
+from utils.load_test import build_parser, run
+
+# A single route is never hedged, so the benchmark gives calls somewhere else to go
+HEDGE_ROUTES = "amazon.nova-lite-v1:0,amazon.nova-micro-v1:0"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0], add_help=False)
+    parser.add_argument("--percentiles", default="0,95", help="comma-separated hedge percentiles to run (0 = off)")
+    parser.add_argument("--out", help="write every run's results as JSON to this file")
+    args, load_test_argv = parser.parse_known_args()
+
+    runs = []
+    for percentile in (float(value) for value in args.percentiles.split(",")):
+        # Given first, so the same options in load_test_argv override them
+        run_args = build_parser().parse_args(["--bedrock-slow-rate", "0.02", "--bedrock-slow-ms", "2000",
+                                              "--env", f"BEDROCK_TEXT_ROUTES={HEDGE_ROUTES}",
+                                              "--env", f"BEDROCK_IMAGE_ROUTES={HEDGE_ROUTES}"]
+                                             + load_test_argv
+                                             + ["--env", f"BEDROCK_HEDGE_PERCENTILE={percentile:g}"])
+        results = run(run_args)
+        runs.append({"hedge_percentile": percentile, **results})
+        summary, response = results["summary"], results["client_ms"]["response"]
+        print(f"hedge_percentile={percentile:g}: {summary['ok']}/{summary['prompts']} ok, "
+              f"response p50/p95/p99 {response.get('p50')}/{response.get('p95')}/{response.get('p99')} ms")
+
+    print(f"\n{'hedge at':>9}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for result in runs:
+        response = result["client_ms"]["response"]
+        label = f"p{result['hedge_percentile']:g}" if result["hedge_percentile"] > 0 else "off"
+        print(f"{label:>9}{result['summary']['throughput_rps']:>10.2f}{response.get('p50', 0):>10.1f}"
+              f"{response.get('p95', 0):>10.1f}{response.get('p99', 0):>10.1f}{response.get('max', 0):>10.1f}"
+              f"{sum(result['summary']['errors'].values()):>8}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(runs, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
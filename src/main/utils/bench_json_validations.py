@@ -0,0 +1,76 @@
+"""
+Micro-benchmark: compiled single-pass validate_and_load vs the previous multi-pass version.
+
+    python -m utils.bench_json_validations [--iterations 2000]
+"""
+import argparse
+import base64
+import json
+import os
+import timeit
+
+from jsonschema import validate, ValidationError
+from pydantic import ValidationError as PydanticValidationError
+
+from utils.json_validations import (SchemaNamespace, SchemaOneModel, SchemaTwoModel, schemaOne, schemaTwo,
+                                    validate_and_load)
+
+
+def legacy_validate_and_load(json_data: dict):
+    """The previous implementation: full jsonschema pass per schema plus pydantic validation."""
+    try:
+        validate(instance=json_data, schema=schemaTwo)
+        model = SchemaTwoModel(**json_data)
+        return SchemaNamespace.SCHEMA_TWO, model
+    except (ValidationError, PydanticValidationError) as e2:
+        error_two = str(e2)
+
+    try:
+        validate(instance=json_data, schema=schemaOne)
+        model = SchemaOneModel(**json_data)
+        return SchemaNamespace.SCHEMA_ONE, model
+    except (ValidationError, PydanticValidationError) as e1:
+        error_one = str(e1)
+
+    raise ValueError(
+        f"Input JSON does not match any known schema.\n\n"
+        f"- SchemaOne error: {error_one}\n\n"
+        f"- SchemaTwo error: {error_two}"
+    )
+
+
+def sample_image_base64() -> str:
+    path = os.path.join(os.path.dirname(__file__), "sample_image_data.json")
+    with open(path) as f:
+        return json.load(f)["image_data"]
+
+
+def payloads():
+    image = sample_image_base64()
+    # ~3 MB of base64, roughly a phone photo
+    large_image = base64.b64encode(os.urandom(2 * 1024 * 1024)).decode("ascii")
+    return {
+        "prompt only": {"prompt": "How is my child doing in extra-curricular classes?"},
+        f"sample image ({len(image) // 1024} KB)": {"prompt": "What is happening in this image?", "image_data": image},
+        f"large image ({len(large_image) // 1024} KB)": {"prompt": "What is happening in this image?",
+                                                          "image_data": large_image},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'payload':<28}{'legacy (us)':>14}{'compiled (us)':>16}{'speedup':>10}")
+    for name, payload in payloads().items():
+        assert legacy_validate_and_load(payload)[0] == validate_and_load(payload)[0]
+        legacy = min(timeit.repeat(lambda: legacy_validate_and_load(payload), number=args.iterations, repeat=3))
+        compiled = min(timeit.repeat(lambda: validate_and_load(payload), number=args.iterations, repeat=3))
+        legacy_us = legacy / args.iterations * 1e6
+        compiled_us = compiled / args.iterations * 1e6
+        print(f"{name:<28}{legacy_us:>14.2f}{compiled_us:>16.2f}{legacy_us / compiled_us:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
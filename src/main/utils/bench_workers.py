@@ -0,0 +1,50 @@
+"""
+Multi-worker benchmark: the same load test against the stubbed app served by 1, 2, 4, ... uvicorn workers.
+
+    python -m utils.bench_workers [--worker-counts 1,2,4] [--out workers.json] [load test options...]
+
+Every run uses the shared SQLite session store (a fresh file per run), so the runs differ only
+in the number of workers. Any utils.load_test option can be added, e.g. --sessions 200
+--image-percent 50 for a CPU-heavier mix.
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from utils.load_test import build_parser, run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0], add_help=False)
+    parser.add_argument("--worker-counts", default="1,2,4", help="comma-separated worker counts to run")
+    parser.add_argument("--out", help="write every run's results as JSON to this file")
+    args, load_test_argv = parser.parse_known_args()
+
+    runs = []
+    with tempfile.TemporaryDirectory() as directory:
+        for workers in (int(count) for count in args.worker_counts.split(",")):
+            store = os.path.join(directory, f"sessions-{workers}.db")
+            run_args = build_parser().parse_args(load_test_argv + [
+                "--workers", str(workers),
+                "--env", "SESSION_STORE_BACKEND=sqlite",
+                "--env", f"SESSION_STORE_PATH={store}"])
+            results = run(run_args)
+            runs.append({"workers": workers, **results})
+            summary, response = results["summary"], results["client_ms"]["response"]
+            print(f"workers={workers}: {summary['throughput_rps']} rps, {summary['ok']}/{summary['prompts']} ok, "
+                  f"response p50/p95/p99 {response.get('p50')}/{response.get('p95')}/{response.get('p99')} ms")
+
+    print(f"\n{'workers':>8}{'rps':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for result in runs:
+        response = result["client_ms"]["response"]
+        print(f"{result['workers']:>8}{result['summary']['throughput_rps']:>10.2f}{response.get('p50', 0):>10.1f}"
+              f"{response.get('p95', 0):>10.1f}{response.get('p99', 0):>10.1f}"
+              f"{sum(result['summary']['errors'].values()):>8}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(runs, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
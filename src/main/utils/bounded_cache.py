@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Set
+
+
+def default_sizeof(value: Any) -> int:
+    """Approximate payload size in bytes for the values we cache (text and binary blobs)."""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(str(value).encode("utf-8"))
+
+
+class BoundedCache:
+    """
+    Thread-safe LRU cache bounded by entry count, total payload bytes and entry age.
+
+    Least recently used entries are evicted first once either cap is exceeded;
+    entries older than `ttl_seconds` are treated as misses and dropped on access.
+    Invalidation listeners are called with each invalidated key (or None for a full
+    clear) so dependent caches can drop derived entries. With `group_of`, keys are
+    indexed by group so every entry of a group can be dropped without a scan.
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 16 * 1024 * 1024,
+                 ttl_seconds: Optional[float] = 300.0, sizeof: Callable[[Any], int] = default_sizeof,
+                 name: str = "cache", group_of: Optional[Callable[[Hashable], Hashable]] = None):
+        """
+        :param max_entries: int - maximum number of entries kept
+        :param max_bytes: int - maximum total size of cached values, as measured by `sizeof`
+        :param ttl_seconds: float - entry lifetime in seconds, None to never expire
+        :param sizeof: callable - returns the size in bytes of a cached value
+        :param name: str - label used in stats and logs
+        :param group_of: callable - maps a key to its group for invalidate_group, None for no index
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof
+        self.name = name
+        self.group_of = group_of
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()  # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._groups: Dict[Hashable, Set[Hashable]] = {}  # group -> keys, kept only with group_of
+        self._lock = threading.Lock()
+        self._listeners: List[Callable[[Optional[Hashable]], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, stored_at = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                # Never worth evicting everything else for a single oversized value
+                return
+            self._entries[key] = (value, size, time.monotonic())
+            self._bytes += size
+            if self.group_of is not None:
+                self._groups.setdefault(self.group_of(key), set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Drop one entry and notify listeners if it was cached. Returns True if the key was cached."""
+        with self._lock:
+            found = key in self._entries
+            if found:
+                self._remove(key)
+                self.invalidations += 1
+        if found:
+            self._notify(key)
+        return found
+
+    def invalidate_group(self, group: Hashable) -> int:
+        """Drop every entry in `group` (requires group_of), notifying listeners per key. Returns the count."""
+        with self._lock:
+            keys = list(self._groups.get(group, ()))
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+        for key in keys:
+            self._notify(key)
+        return len(keys)
+
+    def clear(self):
+        """Drop every entry and notify listeners."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._groups.clear()
+            self._bytes = 0
+        self._notify(None)
+
+    def add_invalidation_listener(self, listener: Callable[[Optional[Hashable]], None]):
+        self._listeners.append(listener)
+
+    def _notify(self, key: Optional[Hashable]):
+        for listener in self._listeners:
+            listener(key)
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+        if self.group_of is not None:
+            group = self.group_of(key)
+            keys = self._groups[group]
+            keys.discard(key)
+            if not keys:
+                del self._groups[group]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
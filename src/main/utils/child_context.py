@@ -0,0 +1,144 @@
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+# Facts returned per relationship type; keeps the prompt small and the query bounded
+FACT_LIMIT = 10
+
+# Each relationship type is gathered in its own subquery and collapsed to one list,
+# so the query returns a single row per child instead of the cartesian product of
+# homework x concepts x activities x emotions. Facts are ranked inside the subquery:
+# unfinished and harder homework first, emotions tied to activities first.
+_CHILD_FACTS_BODY = """
+CALL {
+    WITH c
+    MATCH (c)-[:ASSIGNED]->(h:Homework)
+    OPTIONAL MATCH (h)-[:COVERS]->(con:Concept)
+    WITH h, collect(DISTINCT con.name) AS concepts
+    ORDER BY CASE toLower(coalesce(h.status, '')) WHEN 'pending' THEN 0 WHEN 'in progress' THEN 1 ELSE 2 END,
+             CASE toLower(coalesce(h.difficulty, '')) WHEN 'hard' THEN 0 WHEN 'medium' THEN 1 ELSE 2 END,
+             h.title
+    LIMIT $fact_limit
+    RETURN collect({title: h.title, status: h.status, difficulty: h.difficulty, concepts: concepts}) AS homework
+}
+CALL {
+    WITH c
+    MATCH (c)-[:EXPERIENCED]->(em:Emotion)
+    OPTIONAL MATCH (em)-[:RELATED_TO]->(a:Activity)
+    WITH em, collect(DISTINCT a.name) AS activities
+    ORDER BY size(activities) DESC, em.name
+    LIMIT $fact_limit
+    RETURN collect({name: em.name, trigger: em.trigger, activities: activities}) AS emotions
+}
+CALL {
+    WITH c
+    MATCH (c)-[:PARTICIPATED]->(a:Activity)
+    WITH DISTINCT a.name AS activity
+    ORDER BY activity
+    LIMIT $fact_limit
+    RETURN collect(activity) AS activities
+}
+"""
+
+CHILD_FACTS_QUERY = (
+    "MATCH (c:Child {child_id: $child_id})"
+    + _CHILD_FACTS_BODY
+    + "RETURN c.name AS name, homework, emotions, activities"
+)
+
+# Same facts for many children in one round trip, one row per existing child
+CHILD_FACTS_BATCH_QUERY = (
+    "UNWIND $child_ids AS child_id\nMATCH (c:Child {child_id: child_id})"
+    + _CHILD_FACTS_BODY
+    + "RETURN c.child_id AS child_id, c.name AS name, homework, emotions, activities"
+)
+
+# Children whose context may have changed since $since (epoch millis): the child itself or any
+# node its context is built from carries a newer updated_at. Writers set updated_at = timestamp()
+# on the nodes they create or change, and on the Child when they remove one of its relationships.
+CHANGED_CHILDREN_QUERY = """
+CALL {
+    MATCH (c:Child) WHERE c.updated_at > $since RETURN c
+    UNION
+    MATCH (c:Child)-[:ASSIGNED]->(h:Homework) WHERE h.updated_at > $since RETURN c
+    UNION
+    MATCH (c:Child)-[:ASSIGNED]->(:Homework)-[:COVERS]->(con:Concept) WHERE con.updated_at > $since RETURN c
+    UNION
+    MATCH (c:Child)-[:EXPERIENCED]->(em:Emotion) WHERE em.updated_at > $since RETURN c
+    UNION
+    MATCH (c:Child)-[:EXPERIENCED]->(:Emotion)-[:RELATED_TO]->(a:Activity) WHERE a.updated_at > $since RETURN c
+    UNION
+    MATCH (c:Child)-[:PARTICIPATED]->(a:Activity) WHERE a.updated_at > $since RETURN c
+}
+RETURN DISTINCT c.child_id AS child_id
+"""
+
+ALL_CHILDREN_QUERY = "MATCH (c:Child) RETURN c.child_id AS child_id"
+
+
+async def fetch_child_facts(graph_store, child_id: str, fact_limit: int = FACT_LIMIT) -> Optional[Dict[str, Any]]:
+    """
+    Fetch ranked homework, emotion and activity facts for one child.
+
+    :return: dict with name, homework, emotions and activities, or None if the child does not exist
+    """
+    records = await graph_store.read(CHILD_FACTS_QUERY, child_id=child_id, fact_limit=fact_limit)
+    return records[0] if records else None
+
+
+async def fetch_children_facts(graph_store, child_ids: List[str],
+                               fact_limit: int = FACT_LIMIT) -> Dict[str, Dict[str, Any]]:
+    """Fetch facts for many children in one query; children that do not exist are left out."""
+    records = await graph_store.read(CHILD_FACTS_BATCH_QUERY, child_ids=child_ids, fact_limit=fact_limit)
+    return {record["child_id"]: record for record in records}
+
+
+# Context of a child that does not exist or has no facts yet
+NO_DATA_CONTEXT = "No data found for child {child_id}."
+
+
+def has_child_facts(facts: Optional[Dict[str, Any]]) -> bool:
+    """Whether a child exists and has at least one homework, emotion or activity fact."""
+    return bool(facts) and bool(facts["homework"] or facts["emotions"] or facts["activities"])
+
+
+class ChildContext(NamedTuple):
+    """A context as sent to the model, and the estimated tokens compaction saved on it (0 if not compacted)."""
+    text: str
+    tokens_saved: int = 0
+
+
+def child_context(child_id: str, facts: Optional[Dict[str, Any]], compactor=None) -> ChildContext:
+    """
+    The context sent to the model: compacted (with a ContextCompactor) or sentence-rendered
+    facts, or a no-data note for unknown or empty children.
+    """
+    if not has_child_facts(facts):
+        return ChildContext(NO_DATA_CONTEXT.format(child_id=child_id))
+    if compactor is not None:
+        text, report = compactor.compact(child_id, facts)
+        return ChildContext(text, report["tokens_saved"])
+    return ChildContext(render_child_context(facts))
+
+
+def render_child_context(facts: Dict[str, Any]) -> str:
+    """Render fetched facts as one sentence per homework, emotion and the activity list."""
+    name = facts["name"]
+    context: List[str] = []
+    for hw in facts["homework"]:
+        line = f"{name} is working on {hw['title']} (Status: {hw['status']}, Difficulty: {hw['difficulty']})"
+        if hw["concepts"]:
+            label = "concept" if len(hw["concepts"]) == 1 else "concepts"
+            line += f", covering {label} {', '.join(hw['concepts'])}"
+        context.append(line + ".")
+    for em in facts["emotions"]:
+        line = f"{name} felt {em['name']}"
+        if em["activities"]:
+            line += f" due to participating in {', '.join(em['activities'])} activity"
+        if em["trigger"]:
+            line += f" because of '{em['trigger']}'"
+        context.append(line + ".")
+    if facts["activities"]:
+        context.append(f"{name} participates in {', '.join(facts['activities'])}.")
+    return "\n".join(context)
@@ -0,0 +1,140 @@
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+
+from utils.child_context import render_child_context
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token for English text); no tokenizer is shipped for Nova."""
+    return (len(text) + 3) // 4
+
+
+def _unique(values) -> List:
+    return list(dict.fromkeys(value for value in values if value))
+
+
+class ContextCompactor:
+    """
+    Turns a child's facts into a compact, token-budgeted context.
+
+    The sentence rendering repeats the child's name and the same labels for every fact.
+    Here facts are grouped into one line per kind, duplicates (the same homework title
+    or emotion coming back with different joined fields) are merged, and items are
+    added in rank order (the query already puts pending and harder homework, and
+    emotions tied to activities, first), taking the next-best item of each kind in
+    turn until the token budget is reached.
+    """
+
+    def __init__(self, token_budget: int = 400):
+        """
+        :param token_budget: int - estimated tokens allowed for the context
+        """
+        self.token_budget = token_budget
+        self._lock = threading.Lock()
+        self.contexts = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+        self.facts_dropped = 0
+
+    def compact(self, child_id: str, facts: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """
+        :return: compacted context and a report with tokens before/after/saved and facts kept/dropped
+        """
+        homework = self._merge_homework(facts["homework"])
+        emotions = self._merge_emotions(facts["emotions"])
+        activities = _unique(facts["activities"])
+
+        sections = {"Homework": [], "Feelings": [], "Activities": []}
+        ranked = self._interleave([("Homework", item) for item in homework],
+                                  [("Feelings", item) for item in emotions],
+                                  [("Activities", item) for item in activities])
+        dropped = 0
+        for section, item in ranked:
+            sections[section].append(item)
+            if estimate_tokens(self._render(facts["name"], sections)) > self.token_budget:
+                sections[section].pop()
+                dropped += 1
+        text = self._render(facts["name"], sections)
+
+        before = estimate_tokens(render_child_context(facts))
+        after = estimate_tokens(text)
+        report = {
+            "child_id": child_id,
+            "tokens_before": before,
+            "tokens_after": after,
+            "tokens_saved": before - after,
+            "facts_kept": len(ranked) - dropped,
+            "facts_dropped": dropped
+        }
+        with self._lock:
+            self.contexts += 1
+            self.tokens_before += before
+            self.tokens_after += after
+            self.facts_dropped += dropped
+        logger.debug(f"Compacted context: {report}")
+        return text, report
+
+    @staticmethod
+    def _merge_homework(rows) -> List[str]:
+        merged: Dict[str, Dict[str, Any]] = {}
+        for hw in rows:
+            entry = merged.setdefault(hw["title"], {"labels": [], "concepts": []})
+            entry["labels"] += [str(hw["status"]).lower() if hw["status"] else None,
+                                str(hw["difficulty"]).lower() if hw["difficulty"] else None]
+            entry["concepts"] += hw["concepts"] or []
+        items = []
+        for title, entry in merged.items():
+            details = ", ".join(_unique(entry["labels"]))
+            concepts = ", ".join(_unique(entry["concepts"]))
+            details = "; ".join(part for part in (details, concepts) if part)
+            items.append(f"{title} ({details})" if details else title)
+        return items
+
+    @staticmethod
+    def _merge_emotions(rows) -> List[str]:
+        merged: Dict[str, Dict[str, List]] = {}
+        for em in rows:
+            entry = merged.setdefault(em["name"], {"activities": [], "triggers": []})
+            entry["activities"] += em["activities"] or []
+            entry["triggers"].append(em["trigger"])
+        items = []
+        for name, entry in merged.items():
+            parts = []
+            activities = _unique(entry["activities"])
+            if activities:
+                parts.append("from " + ", ".join(activities))
+            parts += [f"'{trigger}'" for trigger in _unique(entry["triggers"])]
+            items.append(f"{name} ({'; '.join(parts)})" if parts else name)
+        return items
+
+    @staticmethod
+    def _interleave(*ranked_lists) -> List[Tuple[str, str]]:
+        interleaved = []
+        for position in range(max((len(items) for items in ranked_lists), default=0)):
+            for items in ranked_lists:
+                if position < len(items):
+                    interleaved.append(items[position])
+        return interleaved
+
+    @staticmethod
+    def _render(name: str, sections: Dict[str, List[str]]) -> str:
+        lines = [f"Child: {name}"]
+        for section, items in sections.items():
+            if items:
+                separator = ", " if section == "Activities" else " | "
+                lines.append(f"{section}: {separator.join(items)}")
+        return "\n".join(lines)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "contexts": self.contexts,
+                "tokens_before": self.tokens_before,
+                "tokens_after": self.tokens_after,
+                "tokens_saved": self.tokens_before - self.tokens_after,
+                "facts_dropped": self.facts_dropped
+            }
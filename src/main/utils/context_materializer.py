@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from utils.child_context import (ALL_CHILDREN_QUERY, CHANGED_CHILDREN_QUERY, FACT_LIMIT, child_context,
+                                 fetch_children_facts)
+from utils.context_compaction import ContextCompactor
+from utils.context_store import ContextStore
+from utils.file_lock import try_lock
+
+logger = logging.getLogger(__name__)
+
+
+class ContextMaterializer:
+    """
+    Precomputes every child's context into a ContextStore and keeps it current.
+
+    The first run renders all children. Later runs only re-render children whose own
+    node, or one of their Homework, Concept, Emotion or Activity nodes, has an
+    updated_at newer than the previous run's watermark. The watermark is the graph's
+    own clock, read at the start of a run, so a change committed during a run is
+    picked up again by the next one instead of being missed. Every run also reads the
+    ids of all children and purges stored contexts of children no longer in the graph,
+    which no change query can return.
+    """
+
+    def __init__(self, graph_store, store: ContextStore, batch_size: int = 200, fact_limit: int = FACT_LIMIT,
+                 on_refresh: Optional[Callable[[List[str]], Awaitable[Any]]] = None, compactor=None):
+        """
+        :param graph_store: GraphStore - source of the child facts
+        :param store: ContextStore - where rendered contexts are written
+        :param batch_size: int - children fetched per graph query
+        :param fact_limit: int - facts per relationship type, as in the live query
+        :param on_refresh: coroutine function - awaited with each batch of refreshed child_ids, e.g. to drop cached copies
+        :param compactor: ContextCompactor - renders token-budgeted contexts, None for full sentences
+        """
+        self.graph_store = graph_store
+        self.store = store
+        self.batch_size = batch_size
+        self.fact_limit = fact_limit
+        self.on_refresh = on_refresh
+        self.compactor = compactor
+        # The background loop and on-demand refreshes must not interleave watermark updates;
+        # created lazily so the lock binds to the running event loop
+        self._running: Optional[asyncio.Lock] = None
+
+    async def refresh(self, full: bool = False) -> Dict[str, Any]:
+        """Render changed children (all of them on the first run or with full=True) and advance the watermark."""
+        if self._running is None:
+            self._running = asyncio.Lock()
+        async with self._running:
+            return await self._refresh(full)
+
+    async def _refresh(self, full: bool) -> Dict[str, Any]:
+        started = time.perf_counter()
+        now = (await self.graph_store.read("RETURN timestamp() AS now"))[0]["now"]
+        since = None if full else await asyncio.to_thread(self.store.get_watermark)
+        all_child_ids = [record["child_id"] for record in await self.graph_store.read(ALL_CHILDREN_QUERY)
+                         if record["child_id"]]
+        if since is None:
+            child_ids: List[str] = all_child_ids
+        else:
+            records = await self.graph_store.read(CHANGED_CHILDREN_QUERY, since=since)
+            child_ids = [record["child_id"] for record in records if record["child_id"]]
+
+        for start in range(0, len(child_ids), self.batch_size):
+            batch = child_ids[start:start + self.batch_size]
+            facts = await fetch_children_facts(self.graph_store, batch, self.fact_limit)
+            contexts = [(child_id, child_context(child_id, facts.get(child_id), self.compactor)) for child_id in batch]
+            await asyncio.to_thread(self.store.put_many, contexts)
+            if self.on_refresh is not None:
+                await self.on_refresh(batch)
+
+        purged = await asyncio.to_thread(self.store.purge_except, all_child_ids)
+        if purged and self.on_refresh is not None:
+            await self.on_refresh(purged)
+        await asyncio.to_thread(self.store.set_watermark, now)
+        report = {
+            "mode": "full" if since is None else "incremental",
+            "since": since,
+            "watermark": now,
+            "children_refreshed": len(child_ids),
+            "children_purged": len(purged),
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+        logger.info(f"Context store refresh: {report}")
+        return report
+
+    async def run_forever(self, interval_seconds: float, lock_path: Optional[str] = None):
+        """
+        Refresh every `interval_seconds` until cancelled; a failed run is logged and retried next interval.
+
+        :param lock_path: str - with several processes configured alike, only the one holding an
+                          exclusive lock on this file refreshes; the others take over if it exits
+        """
+        lock_file = None
+        try:
+            while True:
+                if lock_path is not None and lock_file is None:
+                    lock_file = try_lock(lock_path)
+                    if lock_file is not None:
+                        logger.info(f"Context store refreshes run in this process (holding {lock_path})")
+                if lock_path is None or lock_file is not None:
+                    try:
+                        await self.refresh()
+                    except asyncio.CancelledError:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Context store refresh failed: {str(e)}")
+                await asyncio.sleep(interval_seconds)
+        finally:
+            if lock_file is not None:
+                lock_file.close()
+
+
+def main():
+    from utils.graph_store import GraphStore
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Precompute child contexts into the local context store")
+    parser.add_argument("--path", default=os.getenv("CONTEXT_STORE_PATH") or "child_context.db",
+                        help="SQLite context store file")
+    parser.add_argument("--batch-size", type=int, default=200, help="children fetched per graph query")
+    parser.add_argument("--full", action="store_true", help="re-render every child instead of only changed ones")
+    parser.add_argument("--token-budget", type=int, default=int(os.getenv("CONTEXT_TOKEN_BUDGET", "400")),
+                        help="compact each context to about this many tokens (0 keeps full sentences)")
+    parser.add_argument("--interval", type=float, default=0,
+                        help="keep running, refreshing every INTERVAL seconds (default: run once)")
+    args = parser.parse_args()
+
+    graph_store = GraphStore(os.getenv("NEO4J_URI"), os.getenv("NEO4J_USERNAME", "neo4j"),
+                             os.getenv("NEO4J_PASSWORD"), database=os.getenv("NEO4J_DATABASE") or None)
+    store = ContextStore(args.path)
+    compactor = ContextCompactor(args.token_budget) if args.token_budget > 0 else None
+    materializer = ContextMaterializer(graph_store, store, batch_size=args.batch_size, compactor=compactor)
+
+    async def run():
+        try:
+            await materializer.refresh(full=args.full)
+            if args.interval > 0:
+                await asyncio.sleep(args.interval)
+                await materializer.run_forever(args.interval)
+        finally:
+            await graph_store.close()
+            store.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
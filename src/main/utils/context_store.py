@@ -0,0 +1,125 @@
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.child_context import ChildContext
+
+
+class ContextStore:
+    """
+    Local SQLite copy of every child's rendered graph context.
+
+    Reads are a primary-key lookup on an open connection, so serving a context needs
+    no network round trip. The file is in WAL mode: several app workers can read it
+    while one materializer writes. The materializer's change-tracking watermark is
+    stored alongside the contexts so a restart resumes incremental refreshes. Every
+    method blocks on SQLite, so the app calls them through asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = "child_context.db"):
+        """
+        :param path: str - SQLite file holding the contexts
+        """
+        self.path = path
+        # Shared between the event loop and the materializer; every access goes through self._lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS child_context (
+                    child_id TEXT PRIMARY KEY,
+                    context TEXT NOT NULL,
+                    refreshed_at REAL NOT NULL,
+                    tokens_saved INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(child_context)")]
+            if "tokens_saved" not in columns:
+                # Stores written before compaction savings were kept alongside each context
+                self.conn.execute("ALTER TABLE child_context ADD COLUMN tokens_saved INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS store_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, child_id: str) -> Optional[ChildContext]:
+        return self.get_many([child_id]).get(child_id)
+
+    def get_many(self, child_ids: Iterable[str]) -> Dict[str, ChildContext]:
+        """Stored contexts of the given children; children without one are left out."""
+        contexts = {}
+        with self._lock:
+            for child_id in child_ids:
+                row = self.conn.execute(
+                    "SELECT context, tokens_saved FROM child_context WHERE child_id = ?", (child_id,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                    contexts[child_id] = ChildContext(*row)
+        return contexts
+
+    def put_many(self, contexts: Iterable[Tuple[str, ChildContext]]):
+        """Upsert (child_id, context) pairs in one transaction."""
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany("""
+                INSERT INTO child_context (child_id, context, refreshed_at, tokens_saved) VALUES (?, ?, ?, ?)
+                ON CONFLICT(child_id) DO UPDATE SET context = excluded.context, refreshed_at = excluded.refreshed_at,
+                                                    tokens_saved = excluded.tokens_saved
+            """, ((child_id, context.text, now, context.tokens_saved) for child_id, context in contexts))
+
+    def put(self, child_id: str, context: ChildContext):
+        self.put_many([(child_id, context)])
+
+    def delete(self, child_id: str) -> bool:
+        with self._lock, self.conn:
+            return self.conn.execute("DELETE FROM child_context WHERE child_id = ?", (child_id,)).rowcount > 0
+
+    def purge_except(self, child_ids: Iterable[str]) -> List[str]:
+        """Delete the contexts of children not in `child_ids`, e.g. ones removed from the graph; returns their ids."""
+        keep = set(child_ids)
+        with self._lock, self.conn:
+            purged = [row[0] for row in self.conn.execute("SELECT child_id FROM child_context") if row[0] not in keep]
+            self.conn.executemany("DELETE FROM child_context WHERE child_id = ?", ((child_id,) for child_id in purged))
+        return purged
+
+    def get_watermark(self) -> Optional[int]:
+        """Graph timestamp (epoch millis) of the last completed refresh, None before the first one."""
+        with self._lock:
+            row = self.conn.execute("SELECT value FROM store_state WHERE key = 'watermark'").fetchone()
+            return int(row[0]) if row else None
+
+    def set_watermark(self, watermark: int):
+        with self._lock, self.conn:
+            self.conn.execute("""
+                INSERT INTO store_state (key, value) VALUES ('watermark', ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            """, (str(watermark),))
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM child_context").fetchone()[0]
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "children": len(self),
+            "watermark": self.get_watermark(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
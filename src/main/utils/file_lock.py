@@ -0,0 +1,19 @@
+import fcntl
+from typing import IO, Optional
+
+
+def try_lock(path: str) -> Optional[IO]:
+    """
+    Take an exclusive lock on `path` without waiting, so one process (or one caller within
+    a process) at a time owns what the file guards. The lock is held until the returned
+    file is closed, or the process exits.
+
+    :return: the open lock file, None if the lock is held elsewhere
+    """
+    lock_file = open(path, "a+")
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
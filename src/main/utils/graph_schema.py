@@ -0,0 +1,52 @@
+import asyncio
+import logging
+import os
+
+from dotenv import load_dotenv
+
+logger = logging.getLogger(__name__)
+
+# Constraints and indexes for the labels the app queries. Every statement uses
+# IF NOT EXISTS, so running the bootstrap repeatedly is a no-op once applied.
+SCHEMA_STATEMENTS = [
+    # Anchor lookup for every context query; the uniqueness constraint also creates the index
+    "CREATE CONSTRAINT child_id_unique IF NOT EXISTS FOR (c:Child) REQUIRE c.child_id IS UNIQUE",
+    "CREATE INDEX homework_status IF NOT EXISTS FOR (h:Homework) ON (h.status)",
+    "CREATE INDEX concept_name IF NOT EXISTS FOR (con:Concept) ON (con.name)",
+    "CREATE INDEX emotion_name IF NOT EXISTS FOR (em:Emotion) ON (em.name)",
+    "CREATE INDEX activity_name IF NOT EXISTS FOR (a:Activity) ON (a.name)",
+    # Change tracking for the context materializer (updated_at > $since range scans)
+    "CREATE INDEX child_updated_at IF NOT EXISTS FOR (c:Child) ON (c.updated_at)",
+    "CREATE INDEX homework_updated_at IF NOT EXISTS FOR (h:Homework) ON (h.updated_at)",
+    "CREATE INDEX concept_updated_at IF NOT EXISTS FOR (con:Concept) ON (con.updated_at)",
+    "CREATE INDEX emotion_updated_at IF NOT EXISTS FOR (em:Emotion) ON (em.updated_at)",
+    "CREATE INDEX activity_updated_at IF NOT EXISTS FOR (a:Activity) ON (a.updated_at)",
+]
+
+
+async def bootstrap_schema(graph_store):
+    """Apply SCHEMA_STATEMENTS, one schema transaction per statement."""
+    for statement in SCHEMA_STATEMENTS:
+        await graph_store.write(statement)
+    logger.info(f"Graph schema bootstrap applied ({len(SCHEMA_STATEMENTS)} statements)")
+
+
+def main():
+    from utils.graph_store import GraphStore
+
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    graph_store = GraphStore(os.getenv("NEO4J_URI"), os.getenv("NEO4J_USERNAME", "neo4j"),
+                             os.getenv("NEO4J_PASSWORD"), database=os.getenv("NEO4J_DATABASE") or None)
+
+    async def run():
+        try:
+            await bootstrap_schema(graph_store)
+        finally:
+            await graph_store.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from neo4j import AsyncGraphDatabase, AsyncDriver, READ_ACCESS
+
+logger = logging.getLogger(__name__)
+
+
+class GraphStore:
+    """
+    Async Neo4j access layer for the request path.
+
+    Wraps a single pooled AsyncDriver. Queries are always sent with parameters so
+    Neo4j can reuse cached plans, and reads run in read transactions so clustered
+    deployments route them to followers/read replicas.
+    """
+
+    def __init__(self, uri: str, username: str, password: Optional[str], database: Optional[str] = None,
+                 max_connection_pool_size: int = 50, connection_acquisition_timeout: float = 10.0,
+                 max_connection_lifetime: float = 3600.0, max_transaction_retry_time: float = 5.0):
+        """
+        :param uri: str - Neo4j URI (e.g., neo4j+s://<instance>.databases.neo4j.io)
+        :param username: str - Neo4j username
+        :param password: str - Neo4j password
+        :param database: str - database name, None for the server default
+        :param max_connection_pool_size: int - maximum pooled connections per host
+        :param connection_acquisition_timeout: float - seconds to wait for a pooled connection
+        :param max_connection_lifetime: float - seconds before a pooled connection is recycled
+        :param max_transaction_retry_time: float - seconds the driver keeps retrying transient failures
+        """
+        self.uri = uri
+        self.database = database
+        self._auth = (username, password)
+        self._driver_config = {
+            "max_connection_pool_size": max_connection_pool_size,
+            "connection_acquisition_timeout": connection_acquisition_timeout,
+            "max_connection_lifetime": max_connection_lifetime,
+            "max_transaction_retry_time": max_transaction_retry_time,
+        }
+        self._driver: Optional[AsyncDriver] = None
+
+    def _get_driver(self) -> AsyncDriver:
+        # Created on first use so the driver binds to the server's event loop
+        if self._driver is None:
+            self._driver = AsyncGraphDatabase.driver(self.uri, auth=self._auth, **self._driver_config)
+            logger.info(f"Neo4j async driver initialized (pool size {self._driver_config['max_connection_pool_size']})")
+        return self._driver
+
+    async def read(self, query: str, **params: Any) -> List[Dict[str, Any]]:
+        """Run a parameterized read query in a read transaction and return the records as dicts."""
+        async with self._get_driver().session(database=self.database, default_access_mode=READ_ACCESS) as session:
+            return await session.execute_read(self._fetch_all, query, params)
+
+    async def write(self, query: str, **params: Any) -> List[Dict[str, Any]]:
+        """Run a parameterized write query in a write transaction and return the records as dicts."""
+        async with self._get_driver().session(database=self.database) as session:
+            return await session.execute_write(self._fetch_all, query, params)
+
+    @staticmethod
+    async def _fetch_all(tx, query: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        result = await tx.run(query, params)
+        return await result.data()
+
+    async def close(self):
+        if self._driver is not None:
+            await self._driver.close()
+            self._driver = None
+            logger.info("Neo4j async driver closed")
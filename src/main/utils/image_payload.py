@@ -0,0 +1,88 @@
+import base64
+import binascii
+import hashlib
+import sys
+from typing import Optional, Union
+
+if sys.version_info >= (3, 11):
+    def _strict_b64decode(encoded: bytes) -> bytes:
+        return binascii.a2b_base64(encoded, strict_mode=True)
+else:
+    # strict_mode is 3.11+; validate=True rejects the same non-alphabet input with an extra scan
+    def _strict_b64decode(encoded: bytes) -> bytes:
+        return base64.b64decode(encoded, validate=True)
+
+
+class ImageTooLargeError(ValueError):
+    """Raised when an image exceeds the configured size limit."""
+
+
+class ImagePayload:
+    """
+    An uploaded image, decoded at most once and carried as bytes/memoryview to the model request.
+
+    Bedrock's invoke_model body is JSON, so the image has to travel base64-encoded; when the
+    client already sent base64 text that encoding is kept and reused instead of re-encoding
+    the decoded bytes.
+    """
+
+    def __init__(self, data: Union[bytes, memoryview], base64_data: Optional[bytes] = None, format: str = "jpeg"):
+        """
+        :param data: bytes | memoryview - raw image bytes
+        :param base64_data: bytes - the same image as base64 ASCII, if already available
+        :param format: str - image format sent to the model (jpeg, png, gif, webp)
+        """
+        self.data = data
+        self.format = format
+        self._base64 = base64_data
+        self._sha256: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    def base64_bytes(self) -> bytes:
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self.data)
+        return self._base64
+
+    def sha256(self) -> str:
+        """Hex digest of the image bytes, computed once."""
+        if self._sha256 is None:
+            self._sha256 = hashlib.sha256(self.data).hexdigest()
+        return self._sha256
+
+    def with_format(self, format: str) -> "ImagePayload":
+        """The same image (and base64 encoding, if any) labelled with another format."""
+        image = ImagePayload(self.data, base64_data=self._base64, format=format)
+        image._sha256 = self._sha256
+        return image
+
+    @classmethod
+    def from_base64_text(cls, text: str, max_bytes: int) -> "ImagePayload":
+        """
+        Decode a base64 (optionally data-URL prefixed) image string. The size limit is checked
+        from the encoded length before anything is decoded.
+
+        :raises ImageTooLargeError: if the decoded image would exceed max_bytes
+        :raises ValueError: if the text is not valid base64
+        """
+        if text.startswith("data:") and "," in text:
+            text = text[text.index(",") + 1:]
+        if len(text) // 4 * 3 > max_bytes + 2:
+            raise ImageTooLargeError(f"Image is larger than the {max_bytes} byte limit")
+        encoded = text.encode("ascii", errors="strict")
+        try:
+            data = _strict_b64decode(encoded)
+        except binascii.Error as e:
+            raise ValueError(f"Invalid base64 image data: {str(e)}")
+        if len(data) > max_bytes:
+            raise ImageTooLargeError(f"Image is larger than the {max_bytes} byte limit")
+        return cls(data, base64_data=encoded)
+
+    @classmethod
+    def from_binary_frame(cls, frame: bytes, max_bytes: int) -> "ImagePayload":
+        """Wrap a binary WebSocket frame without copying it."""
+        if len(frame) > max_bytes:
+            raise ImageTooLargeError(f"Image is larger than the {max_bytes} byte limit")
+        return cls(memoryview(frame))
@@ -0,0 +1,154 @@
+import io
+import logging
+import threading
+from typing import Any, Dict, Optional, Union
+
+from utils.bounded_cache import BoundedCache
+from utils.image_payload import ImagePayload
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it images are only format-checked
+    Image = None
+    ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# Leading bytes of the formats Bedrock accepts for image content blocks
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"GIF87a", "gif"),
+    (b"GIF89a", "gif"),
+)
+
+_PIL_FORMATS = {"jpeg": "JPEG", "png": "PNG", "webp": "WEBP"}
+
+
+def detect_image_format(data: Union[bytes, memoryview]) -> Optional[str]:
+    """Return jpeg, png, gif or webp from the image's magic bytes, or None if unrecognised."""
+    head = bytes(data[:12])
+    for signature, fmt in _SIGNATURES:
+        if head.startswith(signature):
+            return fmt
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+class ImagePreprocessor:
+    """
+    Detects the image format and shrinks images before they are sent for inference.
+
+    Images wider or taller than `max_dimension` are downscaled; images above
+    `recompress_min_bytes` are re-encoded, and the re-encoded version is only kept
+    when it is smaller. Results (including their base64 encoding) are cached by the
+    SHA-256 of the uploaded bytes, so an image that was seen before skips the decode,
+    the resize and the encode. GIFs are passed through untouched to keep animation.
+    Without Pillow installed every image is passed through after the format check.
+    """
+
+    def __init__(self, max_dimension: int = 1568, jpeg_quality: int = 85,
+                 recompress_min_bytes: int = 512 * 1024, cache: Optional[BoundedCache] = None):
+        """
+        :param max_dimension: int - longest side in pixels after downscaling, 0 to forward images unchanged
+        :param jpeg_quality: int - quality for re-encoded JPEG and WebP images
+        :param recompress_min_bytes: int - images at least this large are re-encoded even if not resized
+        :param cache: BoundedCache - processed images keyed by content hash, None to disable caching
+        """
+        self.max_dimension = max_dimension
+        self.jpeg_quality = jpeg_quality
+        self.recompress_min_bytes = recompress_min_bytes
+        self.cache = cache
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.resized = 0
+        self.recompressed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if Image is None:
+            logger.warning("Pillow is not installed; images will be forwarded without resizing")
+
+    def process(self, image: ImagePayload) -> ImagePayload:
+        """
+        Return the image to send to the model, with its format set. CPU bound; call it off the event loop.
+
+        :raises ValueError: if the image is not JPEG, PNG, GIF or WebP
+        """
+        fmt = detect_image_format(image.data)
+        if fmt is None:
+            raise ValueError("Unsupported image format; expected JPEG, PNG, GIF or WebP")
+        key = image.sha256()
+        result = self.cache.get(key) if self.cache is not None else None
+        if result is None:
+            result = self._transform(image, fmt)
+            # Encode once here so cache hits reuse the base64 as well
+            result.base64_bytes()
+            if self.cache is not None:
+                self.cache.set(key, result)
+        with self._lock:
+            self.bytes_in += image.size
+            self.bytes_out += result.size
+        return result
+
+    def _transform(self, image: ImagePayload, fmt: str) -> ImagePayload:
+        with self._lock:
+            self.processed += 1
+        if Image is None or fmt == "gif" or self.max_dimension <= 0:
+            return image.with_format(fmt)
+
+        with Image.open(io.BytesIO(image.data)) as img:
+            oversized = max(img.size) > self.max_dimension
+            if not oversized and image.size < self.recompress_min_bytes:
+                return image.with_format(fmt)
+            if fmt == "jpeg":
+                # Lets the JPEG decoder skip detail we are about to throw away
+                img.draft("RGB", (self.max_dimension, self.max_dimension))
+            img = ImageOps.exif_transpose(img)
+            if oversized:
+                img.thumbnail((self.max_dimension, self.max_dimension), Image.LANCZOS)
+            out_fmt = fmt
+            if fmt == "png" and img.mode in ("RGB", "L"):
+                # Opaque PNGs (photos of worksheets) are far smaller as JPEG
+                out_fmt = "jpeg"
+            encoded = self._encode(img, out_fmt)
+
+        if len(encoded) >= image.size and not oversized:
+            return image.with_format(fmt)
+        with self._lock:
+            if oversized:
+                self.resized += 1
+            else:
+                self.recompressed += 1
+        return ImagePayload(encoded, format=out_fmt)
+
+    def _encode(self, img, fmt: str) -> bytes:
+        if fmt == "jpeg" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buffer = io.BytesIO()
+        options = {"optimize": True}
+        if fmt in ("jpeg", "webp"):
+            options["quality"] = self.jpeg_quality
+        img.save(buffer, format=_PIL_FORMATS[fmt], **options)
+        return buffer.getvalue()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                "pillow": Image is not None,
+                "max_dimension": self.max_dimension,
+                "processed": self.processed,
+                "resized": self.resized,
+                "recompressed": self.recompressed,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out
+            }
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+
+def processed_image_size(image: ImagePayload) -> int:
+    """Cache sizeof for processed images: raw bytes plus the cached base64 copy."""
+    return image.size + len(image.base64_bytes())
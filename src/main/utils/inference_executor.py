@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stream on the hand-off queue
+_END = object()
+
+
+class InferenceBusyError(Exception):
+    """Raised when the inference queue is full and the request is shed."""
+
+
+class InferenceTimeoutError(Exception):
+    """Raised when a request does not finish within its timeout."""
+
+
+class InferenceExecutor:
+    """
+    Runs blocking model calls (boto3 invoke_model etc.) off the event loop.
+
+    At most `max_concurrency` calls run at once on a dedicated thread pool, up to
+    `max_queue` more may wait for a slot, and anything beyond that is rejected
+    immediately with InferenceBusyError so callers can tell the client to retry.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 32, timeout: float = 30.0):
+        """
+        :param max_concurrency: int - number of model calls allowed to run at the same time
+        :param max_queue: int - number of calls allowed to wait for a free slot
+        :param timeout: float - default per-request timeout in seconds (queue wait + execution)
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="inference")
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+        self._running = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    @property
+    def in_flight(self) -> int:
+        return self._running
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        # Created lazily so the semaphore binds to the running event loop
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        return self._slots
+
+    async def _acquire_slot(self, timeout: float, deadline: float, on_release: Optional[Callable[[], None]]):
+        loop = asyncio.get_running_loop()
+        if self._waiting + self._running >= self.max_concurrency + self.max_queue:
+            if on_release is not None:
+                on_release()
+            raise InferenceBusyError(
+                f"Inference queue is full ({self._waiting} waiting, {self._running} running)")
+
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._get_slots().acquire(), timeout=max(deadline - loop.time(), 0))
+        except BaseException as e:
+            # No thread was started, so nothing else will release the caller's resources
+            if on_release is not None:
+                on_release()
+            if isinstance(e, asyncio.TimeoutError):
+                raise InferenceTimeoutError(f"Timed out after {timeout}s waiting for an inference slot")
+            raise
+        finally:
+            self._waiting -= 1
+        # Counted as running from the moment the slot is taken, before yielding again
+        self._running += 1
+
+    async def run(self, fn: Callable[..., Any], *args, timeout: Optional[float] = None,
+                  on_release: Optional[Callable[[], None]] = None) -> Any:
+        """
+        Run `fn(*args)` on the inference pool.
+
+        :param on_release: callable - called on the event loop once the call holds no thread any
+                           more: when its worker thread finishes, even after a timeout, or at once
+                           if it never got a slot
+        :raises InferenceBusyError: if the queue is already full
+        :raises InferenceTimeoutError: if the call does not complete within the timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        await self._acquire_slot(timeout, deadline, on_release)
+
+        future = loop.run_in_executor(self._pool, fn, *args)
+        # The slot is released when the worker thread actually finishes, not when the
+        # caller gives up, so timed-out calls cannot oversubscribe the thread pool.
+        future.add_done_callback(lambda done: self._release(done, on_release))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=max(deadline - loop.time(), 0))
+        except asyncio.TimeoutError:
+            logger.warning(f"Inference call exceeded {timeout}s timeout; abandoning result")
+            raise InferenceTimeoutError(f"Inference call timed out after {timeout}s")
+
+    async def stream(self, fn: Callable[..., Iterable[Any]], *args, timeout: Optional[float] = None,
+                     on_release: Optional[Callable[[], None]] = None) -> AsyncIterator[Any]:
+        """
+        Iterate the blocking iterable returned by `fn(*args)` on the inference pool and
+        yield its items on the event loop as they arrive.
+
+        The timeout covers the whole stream. If the consumer stops early (e.g. the
+        client disconnected) the worker thread stops pulling from the iterable.
+        `on_release` is called as in run(), once the worker thread has finished.
+
+        :raises InferenceBusyError: if the queue is already full
+        :raises InferenceTimeoutError: if the stream does not complete within the timeout
+        """
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        await self._acquire_slot(timeout, deadline, on_release)
+
+        items: asyncio.Queue = asyncio.Queue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                iterator = iter(fn(*args))
+                try:
+                    for item in iterator:
+                        if stop.is_set():
+                            break
+                        loop.call_soon_threadsafe(items.put_nowait, (item, None))
+                finally:
+                    close = getattr(iterator, "close", None)
+                    if close is not None:
+                        close()
+            except Exception as e:
+                loop.call_soon_threadsafe(items.put_nowait, (_END, e))
+                return
+            loop.call_soon_threadsafe(items.put_nowait, (_END, None))
+
+        future = loop.run_in_executor(self._pool, produce)
+        future.add_done_callback(lambda done: self._release(done, on_release))
+        try:
+            while True:
+                try:
+                    item, error = await asyncio.wait_for(items.get(), timeout=max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    logger.warning(f"Inference stream exceeded {timeout}s timeout; abandoning stream")
+                    raise InferenceTimeoutError(f"Inference stream timed out after {timeout}s")
+                if error is not None:
+                    raise error
+                if item is _END:
+                    return
+                yield item
+        finally:
+            stop.set()
+
+    def _release(self, future: asyncio.Future, on_release: Optional[Callable[[], None]] = None):
+        if not future.cancelled():
+            # Mark the exception as retrieved for calls whose caller already timed out
+            future.exception()
+        self._running -= 1
+        self._slots.release()
+        if on_release is not None:
+            on_release()
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -1,7 +1,6 @@
 from enum import Enum
-from jsonschema import validate, ValidationError
-from pydantic import BaseModel, ValidationError as PydanticValidationError
-from typing import Tuple, Union
+from pydantic import BaseModel
+from typing import Optional, Tuple, Union
 
 
 # Enum for schema identification
@@ -14,7 +13,10 @@ class SchemaNamespace(Enum):
 schemaOne = {
     "type": "object",
     "properties": {
-        "prompt": {"type": "string"}
+        "prompt": {"type": "string"},
+        "stream": {"type": "boolean"},
+        "image_bytes": {"type": "integer"},
+        "request_id": {"type": "string"}
     },
     "required": ["prompt"]
 }
@@ -23,7 +25,10 @@ schemaTwo = {
     "type": "object",
     "properties": {
         "image_data": {"type": "string"},
-        "prompt": {"type": "string"}
+        "prompt": {"type": "string"},
+        "stream": {"type": "boolean"},
+        "image_bytes": {"type": "integer"},
+        "request_id": {"type": "string"}
     },
     "required": ["image_data", "prompt"]
 }
@@ -32,11 +37,98 @@ schemaTwo = {
 # Define typed Python data models for each schema
 class SchemaOneModel(BaseModel):
     prompt: str = ""  # optional in schema, defaults to empty string
+    stream: Optional[bool] = None  # None -> server default (BEDROCK_STREAMING)
+    image_bytes: Optional[int] = None  # size of a binary image frame sent right after this message
+    request_id: Optional[str] = None  # required in pipelined sessions; echoed on every reply frame
 
 
 class SchemaTwoModel(BaseModel):
     image_data: str
     prompt: str = ""
+    stream: Optional[bool] = None
+    image_bytes: Optional[int] = None  # a binary frame takes precedence over image_data
+    request_id: Optional[str] = None
+
+
+# Python types accepted for each JSON Schema type used by the message schemas
+_JSON_TYPES = {
+    "string": (str,),
+    "boolean": (bool,),
+    "integer": (int,),
+    "number": (int, float),
+    "object": (dict,),
+    "array": (list,),
+}
+
+
+def _matches_type(value, json_type: str) -> bool:
+    # bool is a subclass of int in Python but not an integer/number in JSON Schema
+    if json_type in ("integer", "number") and isinstance(value, bool):
+        return False
+    return isinstance(value, _JSON_TYPES[json_type])
+
+
+class MessageValidator:
+    """
+    Single-pass validator for WebSocket prompt messages, compiled once from the JSON schemas.
+
+    Each schema is reduced to its required keys and per-property types, and a message is
+    checked against them with dict lookups and isinstance checks only, so large string
+    fields such as image_data are never scanned or copied. The matching model is built with
+    model_construct, since the fields were already type-checked. Error text is only built
+    when no schema matches.
+    """
+
+    def __init__(self, schemas):
+        """
+        :param schemas: list of (SchemaNamespace, json schema dict, model class), most specific first
+        """
+        self._compiled = []
+        for namespace, schema, model in schemas:
+            properties = {name: spec["type"] for name, spec in schema.get("properties", {}).items()}
+            self._compiled.append((namespace, tuple(schema.get("required", ())), properties, model))
+
+    def validate_and_load(self, json_data: dict) -> Tuple[SchemaNamespace, Union[SchemaOneModel, SchemaTwoModel]]:
+        if isinstance(json_data, dict):
+            for namespace, required, properties, model in self._compiled:
+                if self._matches(json_data, required, properties):
+                    fields = {name: json_data[name] for name in properties if name in json_data}
+                    return namespace, model.model_construct(**fields)
+        raise ValueError(self._describe_failure(json_data))
+
+    @staticmethod
+    def _matches(json_data: dict, required, properties) -> bool:
+        for name in required:
+            if name not in json_data:
+                return False
+        for name, json_type in properties.items():
+            if name in json_data and not _matches_type(json_data[name], json_type):
+                return False
+        return True
+
+    def _describe_failure(self, json_data) -> str:
+        errors = {}
+        for namespace, required, properties, _ in self._compiled:
+            if not isinstance(json_data, dict):
+                errors[namespace] = f"expected a JSON object, got {type(json_data).__name__}"
+                continue
+            problems = [f"'{name}' is a required property" for name in required if name not in json_data]
+            problems += [f"'{name}' must be of type {json_type}, got {type(json_data[name]).__name__}"
+                         for name, json_type in properties.items()
+                         if name in json_data and not _matches_type(json_data[name], json_type)]
+            errors[namespace] = "; ".join(problems)
+        return (
+            f"Input JSON does not match any known schema.\n\n"
+            f"- SchemaOne error: {errors[SchemaNamespace.SCHEMA_ONE]}\n\n"
+            f"- SchemaTwo error: {errors[SchemaNamespace.SCHEMA_TWO]}"
+        )
+
+
+# Built once at import; SchemaTwo is tried first so messages with an image load as SchemaTwoModel
+message_validator = MessageValidator([
+    (SchemaNamespace.SCHEMA_TWO, schemaTwo, SchemaTwoModel),
+    (SchemaNamespace.SCHEMA_ONE, schemaOne, SchemaOneModel),
+])
 
 
 def validate_and_load(json_data: dict) -> Tuple[SchemaNamespace, Union[SchemaOneModel, SchemaTwoModel]]:
@@ -47,25 +139,7 @@ def validate_and_load(json_data: dict) -> Tuple[SchemaNamespace, Union[SchemaOne
     :return: (SchemaNamespace, LoadedModelInstance)
     :raises ValueError: if JSON doesn't match any schema
     """
-    try:
-        validate(instance=json_data, schema=schemaTwo)
-        model = SchemaTwoModel(**json_data)
-        return SchemaNamespace.SCHEMA_TWO, model
-    except (ValidationError, PydanticValidationError) as e2:
-        error_two = str(e2)
-
-    try:
-        validate(instance=json_data, schema=schemaOne)
-        model = SchemaOneModel(**json_data)
-        return SchemaNamespace.SCHEMA_ONE, model
-    except (ValidationError, PydanticValidationError) as e1:
-        error_one = str(e1)
-
-    raise ValueError(
-        f"Input JSON does not match any known schema.\n\n"
-        f"- SchemaOne error: {error_one}\n\n"
-        f"- SchemaTwo error: {error_two}"
-    )
+    return message_validator.validate_and_load(json_data)
 
 
 # Example usage
@@ -0,0 +1,407 @@
+"""
+WebSocket load test: N concurrent /ws/graphrag sessions, each sending a series of prompts.
+
+    python -m utils.load_test --sessions 50 --prompts 5 --out results.json
+    python -m utils.load_test --url ws://localhost:8000/ws/graphrag --out results.json
+    python -m utils.load_test --out after.json --baseline before.json
+
+Without --url the app is started on a free local port against utils.stub_backends, so runs
+are offline and repeatable; the stub latency and failure options are passed through, and
+--env sets app configuration for that server. Each session does the real handshake (session_id
+and child_id, then prompts, optionally with an image as a binary frame or base64 text), sending
+its prompts one at a time or, with --pipelined, several at once tagged with request ids.
+Client-side latencies (connect, handshake, first chunk, full response) and the server's own
+per-stage histograms, scraped from /metrics before and after the run, are summarized as
+p50/p95/p99 and written as JSON together with the config and git commit.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import platform
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import websockets
+
+from utils.stub_backends import add_stub_arguments, stub_arguments
+
+_MAIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_BUCKET_LINE = re.compile(r'^(\w+)_bucket\{(.*)\} (\S+)$')
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+PROMPTS = [
+    "How is my child doing with homework this week?",
+    "What activities does my child enjoy the most?",
+    "How has my child been feeling lately?",
+    "Which homework should we focus on tonight?",
+    "What is happening in this image?",
+]
+
+
+def percentiles(values: List[float]) -> Dict[str, Any]:
+    """Nearest-rank p50/p95/p99 plus mean and max, in milliseconds."""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return round(ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)] * 1000, 2)
+
+    return {"count": len(ordered), "p50": rank(50), "p95": rank(95), "p99": rank(99),
+            "mean": round(sum(ordered) / len(ordered) * 1000, 2), "max": round(ordered[-1] * 1000, 2)}
+
+
+def scrape_histograms(base_url: str) -> Dict[Tuple[str, str], Dict[float, float]]:
+    """Cumulative bucket counts of every labelled histogram on /metrics, keyed by (metric, label value)."""
+    with urllib.request.urlopen(base_url + "/metrics", timeout=10) as response:
+        text = response.read().decode("utf-8")
+    histograms: Dict[Tuple[str, str], Dict[float, float]] = {}
+    for line in text.splitlines():
+        match = _BUCKET_LINE.match(line)
+        if not match:
+            continue
+        labels = dict(_LABEL.findall(match.group(2)))
+        le = labels.pop("le")
+        series = (match.group(1), ",".join(labels.values()))
+        histograms.setdefault(series, {})[math.inf if le == "+Inf" else float(le)] = float(match.group(3))
+    return histograms
+
+
+def histogram_quantile(q: float, buckets: Dict[float, float]) -> Optional[float]:
+    """Estimate a quantile from cumulative buckets, interpolating within a bucket as Prometheus does."""
+    bounds = sorted(buckets)
+    total = buckets[bounds[-1]]
+    if total <= 0:
+        return None
+    target = q * total
+    previous_bound, previous_count = 0.0, 0.0
+    for bound in bounds:
+        count = buckets[bound]
+        if count >= target:
+            if bound == math.inf:
+                return previous_bound
+            if count == previous_count:
+                return bound
+            return previous_bound + (bound - previous_bound) * (target - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+def server_stages(before: Dict, after: Dict) -> Dict[str, Dict[str, Any]]:
+    """Per-series quantiles of what the server observed during the run (after minus before)."""
+    stages = {}
+    for (metric, label), buckets in sorted(after.items()):
+        earlier = before.get((metric, label), {})
+        delta = {bound: count - earlier.get(bound, 0.0) for bound, count in buckets.items()}
+        count = delta[max(delta)]
+        if count <= 0:
+            continue
+        name = metric.replace("graphrag_", "").replace("_seconds", "") + (f".{label}" if label else "")
+        stages[name] = {"count": int(count)}
+        for p in (50, 95, 99):
+            value = histogram_quantile(p / 100, delta)
+            stages[name][f"p{p}"] = round(value * 1000, 2) if value is not None else None
+    return stages
+
+
+class SessionRecorder:
+    """Timings and outcomes collected by every session of a run."""
+
+    def __init__(self):
+        self.stages: Dict[str, List[float]] = {"connect": [], "handshake": [], "first_chunk": [], "response": []}
+        self.sources: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.prompts = 0
+        self.ok = 0
+
+    def error(self, kind: str):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+    def record(self, reply: Dict[str, Any], pending: Dict[str, Any]) -> bool:
+        """Record one reply frame for a prompt sent at pending["sent"]; True once the prompt is answered."""
+        now = time.perf_counter()
+        if "chunk" in reply:
+            if pending["first_chunk"] is None:
+                pending["first_chunk"] = now
+                self.stages["first_chunk"].append(now - pending["sent"])
+            return False
+        if "error" in reply:
+            self.error("busy" if reply.get("busy") else reply["error"].split(":")[0][:60])
+            return True
+        if "response" in reply:
+            self.stages["response"].append(now - pending["sent"])
+            if pending["first_chunk"] is None:
+                # One-shot and cached answers arrive whole; their first chunk is the response
+                self.stages["first_chunk"].append(now - pending["sent"])
+            source = reply.get("source", "unknown")
+            self.sources[source] = self.sources.get(source, 0) + 1
+            self.ok += 1
+            return True
+        return False
+
+
+def prompt_messages(index: int, number: int, args: argparse.Namespace, image: Optional[bytes],
+                    request_id: Optional[str] = None) -> List[Any]:
+    """The frames for session `index`'s prompt `number`: the prompt JSON and, for frame mode, the image."""
+    prompt: Dict[str, Any] = {"prompt": PROMPTS[(index + number) % len(PROMPTS)]}
+    if args.stream is not None:
+        prompt["stream"] = args.stream
+    if request_id is not None:
+        prompt["request_id"] = request_id
+    if image is None or (index * args.prompts + number) % 100 >= args.image_percent:
+        return [json.dumps(prompt)]
+    if args.image_mode == "frame":
+        return [json.dumps({**prompt, "image_bytes": len(image)}), image]
+    return [json.dumps({**prompt, "image_data": base64.b64encode(image).decode("ascii")})]
+
+
+async def expect_message(ws, msg: str) -> Dict[str, Any]:
+    message = json.loads(await ws.recv())
+    if message.get("msg") != msg:
+        raise RuntimeError(f"Expected {msg!r}, got {message}")
+    return message
+
+
+async def send_prompts_in_turn(ws, index: int, args: argparse.Namespace, image: Optional[bytes],
+                               recorder: SessionRecorder):
+    """Default protocol: one prompt at a time, each after the server's "Enter prompt"."""
+    for number in range(args.prompts):
+        if number:
+            if args.think_ms:
+                await asyncio.sleep(args.think_ms / 1000)
+            await asyncio.wait_for(expect_message(ws, "Enter prompt"), args.timeout)
+        recorder.prompts += 1
+        pending = {"sent": time.perf_counter(), "first_chunk": None}
+        for message in prompt_messages(index, number, args, image):
+            await ws.send(message)
+        while not recorder.record(json.loads(await asyncio.wait_for(ws.recv(), args.timeout)), pending):
+            pass
+
+
+async def send_prompts_pipelined(ws, index: int, args: argparse.Namespace, image: Optional[bytes],
+                                 recorder: SessionRecorder, max_in_flight: int):
+    """Pipelined protocol: keep up to max_in_flight prompts outstanding, matching replies by request_id."""
+    pending: Dict[str, Dict[str, Any]] = {}
+    number = 0
+    while number < args.prompts or pending:
+        while number < args.prompts and len(pending) < max_in_flight:
+            request_id = f"{index}-{number}"
+            recorder.prompts += 1
+            pending[request_id] = {"sent": time.perf_counter(), "first_chunk": None}
+            for message in prompt_messages(index, number, args, image, request_id):
+                await ws.send(message)
+            number += 1
+        reply = json.loads(await asyncio.wait_for(ws.recv(), args.timeout))
+        request_id = reply.get("request_id")
+        if request_id not in pending:
+            recorder.error(str(reply.get("error", "untagged reply")).split(":")[0][:60])
+            continue
+        if recorder.record(reply, pending[request_id]):
+            del pending[request_id]
+
+
+async def run_session(index: int, args: argparse.Namespace, image: Optional[bytes], recorder: SessionRecorder):
+    child_id = f"child-{index % args.children_in_use}"
+    started = time.perf_counter()
+    try:
+        ws = await websockets.connect(args.url, max_size=None, open_timeout=args.timeout)
+    except Exception as e:
+        recorder.error(f"connect_{type(e).__name__}")
+        return
+    connected = time.perf_counter()
+    recorder.stages["connect"].append(connected - started)
+    try:
+        await asyncio.wait_for(ws.recv(), args.timeout)
+        handshake = {"session_id": f"load-{uuid.uuid4().hex[:12]}", "child_id": child_id}
+        if args.pipelined:
+            handshake["pipelined"] = True
+        await ws.send(json.dumps(handshake))
+        ready = await asyncio.wait_for(expect_message(ws, "Ready" if args.pipelined else "Enter prompt"),
+                                       args.timeout)
+        recorder.stages["handshake"].append(time.perf_counter() - connected)
+        if args.pipelined:
+            await send_prompts_pipelined(ws, index, args, image, recorder, ready["max_in_flight"])
+        else:
+            await send_prompts_in_turn(ws, index, args, image, recorder)
+    except asyncio.TimeoutError:
+        recorder.error("timeout")
+    except websockets.ConnectionClosed:
+        recorder.error("connection_closed")
+    except Exception as e:
+        recorder.error(type(e).__name__)
+    finally:
+        await ws.close()
+
+
+async def run_load(args: argparse.Namespace, image: Optional[bytes]) -> Tuple[SessionRecorder, float]:
+    recorder = SessionRecorder()
+    delay = args.ramp_seconds / args.sessions if args.sessions else 0.0
+
+    async def delayed(index: int):
+        await asyncio.sleep(index * delay)
+        await run_session(index, args, image, recorder)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(delayed(index) for index in range(args.sessions)))
+    return recorder, time.perf_counter() - started
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub_server(args: argparse.Namespace) -> Tuple[subprocess.Popen, str]:
+    port = free_port()
+    env = dict(os.environ)
+    env.update(dict(pair.split("=", 1) for pair in args.env))
+    server = subprocess.Popen([sys.executable, "-m", "utils.stub_backends", "--port", str(port)] + stub_arguments(args),
+                              cwd=_MAIN_DIR, env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            with urllib.request.urlopen(base_url + "/health", timeout=1):
+                return server, base_url
+        except OSError:
+            if server.poll() is not None or time.monotonic() > deadline:
+                server.kill()
+                raise RuntimeError("Stub server did not start; see its output above")
+            time.sleep(0.2)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=_MAIN_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_image(args: argparse.Namespace) -> Optional[bytes]:
+    if not args.image_percent:
+        return None
+    if args.image:
+        with open(args.image, "rb") as f:
+            return f.read()
+    with open(os.path.join(_MAIN_DIR, "utils", "sample_image_data.json")) as f:
+        return base64.b64decode(json.load(f)["image_data"])
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any]):
+    """Print p50/p95/p99 and throughput next to a previous run's results."""
+    changed = sorted(key for key in set(results["config"]) | set(baseline.get("config", {}))
+                     if key != "url" and results["config"].get(key) != baseline.get("config", {}).get(key))
+    if changed:
+        print(f"\nNote: the runs differ in {', '.join(changed)}")
+    print(f"\n{'metric':<34}{'baseline':>12}{'this run':>12}{'change':>10}")
+
+    def row(name: str, old: Optional[float], new: Optional[float]):
+        if old is None or new is None:
+            return
+        change = f"{(new - old) / old * 100:+.1f}%" if old else ""
+        print(f"{name:<34}{old:>12.2f}{new:>12.2f}{change:>10}")
+
+    row("throughput_rps", baseline["summary"]["throughput_rps"], results["summary"]["throughput_rps"])
+    for group in ("client_ms", "server_ms"):
+        for stage, values in results[group].items():
+            for p in ("p50", "p95", "p99"):
+                row(f"{group}.{stage}.{p}", baseline.get(group, {}).get(stage, {}).get(p), values.get(p))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="WebSocket URL of a running server (default: start one against the stubs)")
+    parser.add_argument("--sessions", type=int, default=50, help="concurrent WebSocket sessions")
+    parser.add_argument("--prompts", type=int, default=5, help="prompts sent by each session, one at a time")
+    parser.add_argument("--children-in-use", type=int, default=20, help="distinct child_ids spread over the sessions")
+    parser.add_argument("--stream", dest="stream", action="store_true", default=None, help="ask for streamed answers")
+    parser.add_argument("--no-stream", dest="stream", action="store_false", help="ask for one-shot answers")
+    parser.add_argument("--image-percent", type=int, default=0, help="percentage of prompts sent with an image")
+    parser.add_argument("--image-mode", choices=["frame", "base64"], default="frame",
+                        help="send images as a binary frame or as base64 image_data")
+    parser.add_argument("--image", help="image file to send (default: the bundled sample image)")
+    parser.add_argument("--pipelined", action="store_true",
+                        help="use the pipelined protocol: each session keeps its in-flight limit of prompts outstanding")
+    parser.add_argument("--think-ms", type=float, default=0,
+                        help="pause between a response and the next prompt (not in pipelined mode)")
+    parser.add_argument("--ramp-seconds", type=float, default=0, help="spread session starts over this many seconds")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds to wait for any single reply")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="app setting for the stub server, e.g. RESPONSE_CACHE_ENABLED=true (repeatable)")
+    parser.add_argument("--out", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare against")
+    add_stub_arguments(parser)
+    return parser
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one load test as configured by build_parser()'s options and return the results."""
+    server = None
+    if args.url:
+        base_url = re.sub(r"^ws", "http", args.url.split("/ws/")[0])
+    else:
+        server, base_url = start_stub_server(args)
+        args.url = base_url.replace("http", "ws", 1) + "/ws/graphrag"
+
+    try:
+        image = load_image(args)
+        before = scrape_histograms(base_url)
+        started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+        recorder, duration = asyncio.run(run_load(args, image))
+        after = scrape_histograms(base_url)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=10)
+
+    config = {key: value for key, value in vars(args).items() if key not in ("out", "baseline")}
+    if not server:
+        # The stub options did not apply to an external server
+        config = {key: value for key, value in config.items()
+                  if "--" + key.replace("_", "-") not in stub_arguments(args)}
+    results = {
+        "run": {"started_at": started_at, "git_commit": git_commit(), "python": platform.python_version(),
+                "stub_backends": server is not None},
+        "config": config,
+        "summary": {
+            "sessions": args.sessions,
+            "prompts": recorder.prompts,
+            "ok": recorder.ok,
+            "errors": recorder.errors,
+            "sources": recorder.sources,
+            "duration_seconds": round(duration, 3),
+            "throughput_rps": round(recorder.ok / duration, 2) if duration else 0.0
+        },
+        "client_ms": {stage: percentiles(values) for stage, values in recorder.stages.items()},
+        # Each worker has its own /metrics, so with several workers a scrape sees only one of them
+        "server_ms": server_stages(before, after) if args.workers == 1 else {}
+    }
+    return results
+
+
+def main():
+    args = build_parser().parse_args()
+    results = run(args)
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
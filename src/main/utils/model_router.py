@@ -0,0 +1,304 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from utils.resilient_inference import InferenceError, InferenceResult
+
+logger = logging.getLogger(__name__)
+
+
+class Route:
+    """A model on an endpoint that can answer a prompt: a model (or inference profile) id, optionally in another region."""
+
+    __slots__ = ("model_id", "region", "name")
+
+    def __init__(self, model_id: str, region: Optional[str] = None):
+        """
+        :param model_id: str - Bedrock model or inference profile id
+        :param region: str - region to call, None for the app's default region
+        """
+        self.model_id = model_id
+        self.region = region
+        self.name = f"{model_id}@{region}" if region else model_id
+
+    def __repr__(self):
+        return f"Route({self.name})"
+
+
+def parse_routes(spec: str) -> List[Route]:
+    """
+    Parse "model_id[@region], ..." into routes, in order of preference.
+
+    :raises ValueError: if no route is given
+    """
+    routes = []
+    for item in (part.strip() for part in spec.split(",")):
+        if not item:
+            continue
+        # Model ids contain ":" (e.g. amazon.nova-lite-v1:0) but never "@"
+        model_id, _, region = item.partition("@")
+        routes.append(Route(model_id.strip(), region.strip() or None))
+    if not routes:
+        raise ValueError(f"No model routes in {spec!r}")
+    return routes
+
+
+class LatencyWindow:
+    """The most recent latencies of one kind of call on one route."""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+class ModelRouter:
+    """
+    Picks the route for a model call and hedges calls that run long.
+
+    Text-only and multimodal prompts have their own route lists. The first route in a list
+    is used until another has at least `min_samples` recent latencies and a lower median;
+    a fraction `explore` of calls goes to another route so every route keeps being measured.
+
+    Once a route has `min_samples` latencies, a call to it that is still running after the
+    `hedge_percentile` of them gets a duplicate on the next route in the ranking; with only
+    one route there is nowhere else to send it, so nothing is hedged. Whichever answers
+    first wins and the other is cancelled;
+    a blocking call already running on a worker thread finishes there, but its result is
+    dropped. At most `max_hedge_ratio` of calls are hedged, so a slow backend cannot double
+    its own load. One-shot calls are timed to their response, streams to their first item,
+    each in their own window.
+    """
+
+    def __init__(self, text_routes: List[Route], image_routes: List[Route], hedge_percentile: float = 95.0,
+                 min_samples: int = 20, window: int = 200, max_hedge_ratio: float = 0.1,
+                 explore: float = 0.05, hedge_allowed: Optional[Callable[[], bool]] = None,
+                 seed: Optional[int] = None):
+        """
+        :param text_routes: list - routes for text-only prompts, in order of preference
+        :param image_routes: list - routes for prompts with an image, in order of preference
+        :param hedge_percentile: float - hedge a call once it runs past this percentile of recent latency (0 disables hedging)
+        :param min_samples: int - latencies a route needs before it is ranked by them or hedged
+        :param window: int - recent latencies kept per route and kind of call
+        :param max_hedge_ratio: float - largest fraction of calls that may be hedged
+        :param explore: float - fraction of calls sent to a route other than the fastest
+        :param hedge_allowed: callable - checked before each hedge; e.g. a hedge is pointless while calls queue for a slot
+        :param seed: int - seeds route exploration, None for a random seed
+        """
+        self.text_routes = text_routes
+        self.image_routes = image_routes
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.max_hedge_ratio = max_hedge_ratio
+        self.explore = explore
+        self.hedge_allowed = hedge_allowed
+        self._random = random.Random(seed)
+        self._latencies: Dict[Tuple[str, str], LatencyWindow] = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedges_won = 0
+        self.hedges_skipped = 0
+        self.routed: Dict[str, int] = {}
+        self.failures: Dict[str, int] = {}
+
+    def routes_for(self, multimodal: bool) -> List[Route]:
+        return self.image_routes if multimodal else self.text_routes
+
+    def _window(self, route: Route, kind: str) -> LatencyWindow:
+        window = self._latencies.get((route.name, kind))
+        if window is None:
+            window = self._latencies[(route.name, kind)] = LatencyWindow(self.window)
+        return window
+
+    def rank(self, multimodal: bool, kind: str = "call") -> List[Route]:
+        """Routes for the payload type, fastest first; unmeasured routes keep their configured place behind the first."""
+        routes = self.routes_for(multimodal)
+        medians = {}
+        for route in routes:
+            window = self._window(route, kind)
+            if len(window) >= self.min_samples:
+                medians[route.name] = window.percentile(50)
+        preferred = routes[0]
+        if medians:
+            fastest = min((route for route in routes if route.name in medians), key=lambda r: medians[r.name])
+            if preferred.name not in medians or medians[fastest.name] < medians[preferred.name]:
+                preferred = fastest
+        # sorted() is stable, so unmeasured routes keep their configured order
+        ranked = [preferred] + sorted((route for route in routes if route is not preferred),
+                                      key=lambda r: (r.name not in medians, medians.get(r.name, 0.0)))
+        if len(ranked) > 1 and self.explore > 0 and self._random.random() < self.explore:
+            other = self._random.randrange(1, len(ranked))
+            ranked[0], ranked[other] = ranked[other], ranked[0]
+        return ranked
+
+    def hedge_delay(self, route: Route, kind: str = "call") -> Optional[float]:
+        """Seconds after which a call to `route` is hedged, None if it is not hedged."""
+        if self.hedge_percentile <= 0 or self.hedged >= self.max_hedge_ratio * self.calls:
+            return None
+        window = self._window(route, kind)
+        if len(window) < self.min_samples:
+            return None
+        return window.percentile(self.hedge_percentile)
+
+    def _may_hedge(self) -> bool:
+        if self.hedge_allowed is not None and not self.hedge_allowed():
+            self.hedges_skipped += 1
+            return False
+        self.hedged += 1
+        return True
+
+    def _plan(self, multimodal: bool, kind: str) -> Tuple[Route, Route, Optional[float]]:
+        self.calls += 1
+        ranked = self.rank(multimodal, kind)
+        primary = ranked[0]
+        if len(ranked) < 2:
+            # A duplicate on the same model and region only adds cost and quota pressure
+            return primary, primary, None
+        return primary, ranked[1], self.hedge_delay(primary, kind)
+
+    def _answered(self, route: Route, kind: str, started: float, ok: bool):
+        if ok:
+            self._window(route, kind).record(time.monotonic() - started)
+            self.routed[route.name] = self.routed.get(route.name, 0) + 1
+        else:
+            self.failures[route.name] = self.failures.get(route.name, 0) + 1
+
+    def _abandoned(self, route: Route, kind: str, started: float):
+        # The call was at least this slow; keeping it stops the window from forgetting its slow tail
+        self._window(route, kind).record(time.monotonic() - started)
+
+    async def run(self, call: Callable[[Route], Awaitable[InferenceResult]],
+                  multimodal: bool = False) -> InferenceResult:
+        """Await call(route) on the chosen route, hedged onto the alternate if it runs long."""
+        primary, alternate, delay = self._plan(multimodal, "call")
+        first = asyncio.ensure_future(call(primary))
+        pending = {first: (primary, time.monotonic())}
+        result = None
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({first}, timeout=delay)
+                if not done and self._may_hedge():
+                    logger.info(f"Hedging a call to {primary.name} on {alternate.name} after {delay * 1000:.0f}ms")
+                    pending[asyncio.ensure_future(call(alternate))] = (alternate, time.monotonic())
+            while pending:
+                done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    route, started = pending.pop(task)
+                    result = task.result()
+                    self._answered(route, "call", started, result.ok)
+                    if result.ok:
+                        if task is not first:
+                            self.hedges_won += 1
+                        return result
+            # Every copy failed; the last failure is as good an answer as any
+            return result
+        finally:
+            for task, (route, started) in pending.items():
+                task.cancel()
+                if result is not None and result.ok:
+                    self._abandoned(route, "call", started)
+
+    async def stream(self, open_stream: Callable[[Route], AsyncIterator[Any]],
+                     multimodal: bool = False) -> AsyncIterator[Any]:
+        """
+        Yield the items of open_stream(route) on the chosen route. If no item has arrived
+        after the hedge delay, the same stream is opened on the alternate and whichever
+        yields first is followed; the other is closed.
+
+        :raises InferenceError: if every copy failed before its first item
+        """
+        primary, alternate, delay = self._plan(multimodal, "stream")
+        candidates: Dict[asyncio.Future, Tuple[Route, AsyncIterator[Any], float]] = {}
+
+        def open_on(route: Route) -> asyncio.Future:
+            items = open_stream(route).__aiter__()
+            first_item = asyncio.ensure_future(items.__anext__())
+            candidates[first_item] = (route, items, time.monotonic())
+            return first_item
+
+        first = open_on(primary)
+        winner = None
+        failure: Optional[InferenceError] = None
+        try:
+            timeout = delay
+            while candidates and winner is None:
+                done, _ = await asyncio.wait(set(candidates), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if self._may_hedge():
+                        logger.info(f"Hedging a stream from {primary.name} on {alternate.name} "
+                                    f"after {delay * 1000:.0f}ms")
+                        open_on(alternate)
+                    timeout = None
+                    continue
+                for task in done:
+                    route, items, started = candidates.pop(task)
+                    error = task.exception()
+                    if error is None or isinstance(error, StopAsyncIteration):
+                        self._answered(route, "stream", started, True)
+                        if task is not first:
+                            self.hedges_won += 1
+                        winner = (task, items)
+                        break
+                    self._answered(route, "stream", started, False)
+                    if not isinstance(error, InferenceError):
+                        raise error
+                    failure = error
+        finally:
+            for task, (route, items, started) in candidates.items():
+                task.cancel()
+                if winner is not None:
+                    self._abandoned(route, "stream", started)
+                try:
+                    await task
+                except BaseException:
+                    pass
+                await items.aclose()
+        if winner is None:
+            raise failure
+        task, items = winner
+        if task.exception() is not None:
+            return
+        try:
+            yield task.result()
+            async for item in items:
+                yield item
+        finally:
+            # Releases the winner's inference slot at once if the consumer stops early
+            await items.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = {}
+        for (name, kind), window in self._latencies.items():
+            if len(window):
+                latencies.setdefault(name, {})[kind] = {
+                    "samples": len(window),
+                    "p50_ms": round(window.percentile(50) * 1000, 1),
+                    "p95_ms": round(window.percentile(95) * 1000, 1),
+                    "p99_ms": round(window.percentile(99) * 1000, 1)
+                }
+        return {
+            "text_routes": [route.name for route in self.text_routes],
+            "image_routes": [route.name for route in self.image_routes],
+            "hedge_percentile": self.hedge_percentile,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedges_won": self.hedges_won,
+            "hedges_skipped": self.hedges_skipped,
+            "answered": self.routed,
+            "failures": self.failures,
+            "latency": latencies
+        }
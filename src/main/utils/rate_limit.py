@@ -0,0 +1,61 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Async token bucket: `rate` tokens per second refill a bucket of `burst` tokens.
+
+    acquire() waits for a token; waiters are served in arrival order. try_acquire() takes
+    one only if it is available now. A rate of 0 or less disables the limit. Must be used
+    from a single event loop.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        :param rate: float - tokens added per second (0 or less for no limit)
+        :param burst: float - bucket size, i.e. how many calls may go at once after a quiet period (default: max(1, rate))
+        """
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        # Created lazily so the lock binds to the running event loop
+        self._lock: Optional[asyncio.Lock] = None
+        self.acquired = 0
+        self.waited_seconds = 0.0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        if self.rate <= 0:
+            return True
+        self._refill()
+        if self._tokens < tokens:
+            return False
+        self._tokens -= tokens
+        self.acquired += 1
+        return True
+
+    async def acquire(self, tokens: float = 1.0):
+        if self.rate <= 0:
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        started = time.monotonic()
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+        self.waited_seconds += time.monotonic() - started
+
+    def stats(self):
+        return {
+            "rate_per_second": self.rate,
+            "burst": self.burst,
+            "acquired": self.acquired,
+            "waited_seconds": round(self.waited_seconds, 3)
+        }
@@ -0,0 +1,461 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from enum import Enum
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterable, Optional, Tuple
+
+from utils.inference_executor import InferenceBusyError, InferenceExecutor, InferenceTimeoutError
+from utils.rate_limit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceErrorKind(Enum):
+    BUSY = "busy"                  # shed here: the queue was full or no slot freed up before the deadline
+    CIRCUIT_OPEN = "circuit_open"  # failed fast while the backend is unhealthy
+    THROTTLED = "throttled"        # the backend kept throttling until retries or the deadline ran out
+    TIMEOUT = "timeout"            # the backend did not answer in time
+    UNAVAILABLE = "unavailable"    # the backend kept failing with server or connection errors
+    REJECTED = "rejected"          # the backend refused the request (validation, access); not retried
+
+
+# Kinds a client should simply retry later
+RETRY_LATER = (InferenceErrorKind.BUSY, InferenceErrorKind.CIRCUIT_OPEN, InferenceErrorKind.THROTTLED)
+
+# botocore ClientError codes, by how the call failed
+_THROTTLE_CODES = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException",
+                   "RequestLimitExceeded", "Throttling"}
+_TIMEOUT_CODES = {"ModelTimeoutException", "RequestTimeout", "RequestTimeoutException"}
+_UNAVAILABLE_CODES = {"InternalServerException", "ServiceUnavailableException", "ServiceUnavailable",
+                      "ModelNotReadyException", "InternalFailure"}
+
+
+def classify_error(error: BaseException) -> InferenceErrorKind:
+    """Map an exception from a model call to the kind of failure it is."""
+    if isinstance(error, InferenceBusyError):
+        return InferenceErrorKind.BUSY
+    if isinstance(error, (InferenceTimeoutError, asyncio.TimeoutError, TimeoutError)):
+        return InferenceErrorKind.TIMEOUT
+    # botocore's ClientError carries the service error code; matched by shape to keep botocore optional here
+    response = getattr(error, "response", None)
+    code = response.get("Error", {}).get("Code") if isinstance(response, dict) else None
+    if code in _THROTTLE_CODES:
+        return InferenceErrorKind.THROTTLED
+    if code in _TIMEOUT_CODES:
+        return InferenceErrorKind.TIMEOUT
+    if code in _UNAVAILABLE_CODES:
+        return InferenceErrorKind.UNAVAILABLE
+    if code is None and isinstance(error, (ConnectionError, OSError)):
+        return InferenceErrorKind.UNAVAILABLE
+    # botocore's connection and read timeout errors are not ClientErrors
+    if code is None and type(error).__name__ in ("EndpointConnectionError", "ConnectTimeoutError",
+                                                 "ReadTimeoutError", "ConnectionClosedError"):
+        return InferenceErrorKind.UNAVAILABLE
+    return InferenceErrorKind.REJECTED
+
+
+class InferenceResult:
+    """Outcome of a model call: the response, or the kind of failure and what to tell the client."""
+
+    __slots__ = ("value", "error", "message", "attempts", "retry_after")
+
+    def __init__(self, value: Any = None, error: Optional[InferenceErrorKind] = None, message: str = "",
+                 attempts: int = 0, retry_after: Optional[float] = None):
+        """
+        :param value: the model's response, if the call succeeded
+        :param error: InferenceErrorKind - why it failed, None if it succeeded
+        :param message: str - detail of the last failure, for logs
+        :param attempts: int - calls made to the backend
+        :param retry_after: float - seconds a client should wait before retrying, if known
+        """
+        self.value = value
+        self.error = error
+        self.message = message
+        self.attempts = attempts
+        self.retry_after = retry_after
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def retry_later(self) -> bool:
+        return self.error in RETRY_LATER
+
+    def __repr__(self):
+        if self.ok:
+            return f"InferenceResult(ok, attempts={self.attempts})"
+        return f"InferenceResult({self.error.value}, attempts={self.attempts}, message={self.message!r})"
+
+
+class InferenceError(Exception):
+    """Raised by ResilientInference.stream(), which has no result to return; carries the failed result."""
+
+    def __init__(self, result: InferenceResult):
+        super().__init__(f"{result.error.value}: {result.message}" if result.message else result.error.value)
+        self.result = result
+
+
+class AIMDLimiter:
+    """
+    Concurrency limit that adapts to throttling: additive increase, multiplicative decrease.
+
+    Each success raises the limit by 1/limit (about +1 per round of calls), each throttle
+    cuts it by `decrease`. Throttles from calls started before the last cut are ignored, so
+    one burst of throttled calls cuts the limit once. Waiters get slots in arrival order; at
+    most `max_queue` may wait, beyond that acquire() is refused at once. Must be used from a
+    single event loop.
+    """
+
+    def __init__(self, initial: int, minimum: int = 1, maximum: Optional[int] = None,
+                 decrease: float = 0.5, max_queue: int = 32):
+        """
+        :param initial: int - starting limit
+        :param minimum: int - the limit never drops below this
+        :param maximum: int - the limit never rises above this (default: initial)
+        :param decrease: float - factor applied to the limit on a throttle
+        :param max_queue: int - callers allowed to wait for a slot
+        """
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum if maximum is not None else initial)
+        self.limit = float(min(self.maximum, max(self.minimum, initial)))
+        self.decrease = decrease
+        self.max_queue = max_queue
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._cut_at = 0.0
+        self.throttles = 0
+        self.cuts = 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: float) -> float:
+        """
+        Wait for a slot.
+
+        :return: the time the slot was taken, to hand back to on_throttle()
+        :raises InferenceBusyError: if the queue is full or no slot frees up within `timeout`
+        """
+        if self._waiters or self.in_flight >= int(self.limit):
+            if len(self._waiters) >= self.max_queue:
+                raise InferenceBusyError(f"Inference queue is full ({len(self._waiters)} waiting, "
+                                         f"{self.in_flight} running, limit {int(self.limit)})")
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(waiter, timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just as the wait timed out
+                    self.release()
+                raise InferenceBusyError(f"No inference slot within {timeout:.1f}s (limit {int(self.limit)})")
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    self.release()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        else:
+            self.in_flight += 1
+        return time.monotonic()
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        # Slots are handed to waiters directly, so a newcomer cannot take one ahead of them
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def on_success(self):
+        self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._wake()
+
+    def on_throttle(self, started: float):
+        self.throttles += 1
+        if started < self._cut_at:
+            return
+        self._cut_at = time.monotonic()
+        self.limit = max(float(self.minimum), self.limit * self.decrease)
+        self.cuts += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "throttles": self.throttles,
+            "cuts": self.cuts
+        }
+
+
+class CircuitBreaker:
+    """
+    Fails calls fast while the backend is unhealthy.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls are refused
+    for `reset_seconds`. Then one probe call is let through (half-open): its success closes
+    the circuit, its failure opens it again. Only server, connection and timeout failures
+    count; throttling means the backend is up but busy, which the AIMD limit deals with.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        """
+        :param failure_threshold: int - consecutive failures that open the circuit (0 disables the breaker)
+        :param reset_seconds: float - how long the circuit stays open before a probe
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> Tuple[bool, bool]:
+        """
+        Whether a call may go ahead, and whether it is the half-open probe. Only the caller
+        that took the probe may release_probe() it.
+        """
+        if self.failure_threshold <= 0 or self.state == self.CLOSED:
+            return True, False
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return True, True
+        self.rejected += 1
+        return False, False
+
+    def retry_after(self) -> float:
+        return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info("Circuit closed: the backend answered the probe")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def release_probe(self):
+        """Let another probe through if the current one ended without reaching the backend."""
+        if self.state == self.HALF_OPEN:
+            self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failure_threshold <= 0:
+            return
+        if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+            logger.warning(f"Circuit opened after {self.failures} consecutive failures; "
+                           f"failing fast for {self.reset_seconds}s")
+            self.state = self.OPEN
+            self._opened_at = time.monotonic()
+            self._probing = False
+            self.opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failure_threshold": self.failure_threshold,
+            "reset_seconds": self.reset_seconds,
+            "opened": self.opened,
+            "rejected": self.rejected
+        }
+
+
+class ResilientInference:
+    """
+    Model calls through an InferenceExecutor, with throttling-aware admission and retries.
+
+    A call waits for a slot under the AIMD concurrency limit (refused as BUSY when the
+    queue is full) and for a token from the rate limit, then runs on the executor. Throttling
+    cuts the limit; throttles, timeouts and server errors are retried with exponential
+    backoff and full jitter while the deadline allows. The circuit breaker fails calls fast
+    while the backend keeps failing. run() returns an InferenceResult and never raises for
+    a failed call.
+    """
+
+    _RETRYABLE = (InferenceErrorKind.THROTTLED, InferenceErrorKind.TIMEOUT, InferenceErrorKind.UNAVAILABLE)
+
+    def __init__(self, executor: InferenceExecutor, limiter: AIMDLimiter, breaker: CircuitBreaker,
+                 rate_limit: Optional[TokenBucket] = None, retries: int = 3, backoff_base: float = 0.25,
+                 backoff_max: float = 4.0, deadline: Optional[float] = None, seed: Optional[int] = None):
+        """
+        :param executor: InferenceExecutor - runs the blocking calls
+        :param limiter: AIMDLimiter - adaptive concurrency limit
+        :param breaker: CircuitBreaker - fails fast while the backend is unhealthy
+        :param rate_limit: TokenBucket - calls started per second (None for no limit)
+        :param retries: int - retries per call after the first attempt
+        :param backoff_base: float - first backoff in seconds, doubled per retry before jitter
+        :param backoff_max: float - cap on a single backoff
+        :param deadline: float - seconds a call may take including retries (default: the executor's timeout)
+        :param seed: int - seeds the backoff jitter, None for a random seed
+        """
+        self.executor = executor
+        self.limiter = limiter
+        self.breaker = breaker
+        self.rate_limit = rate_limit
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline if deadline is not None else executor.timeout
+        self._random = random.Random(seed)
+        self.calls = 0
+        self.attempts = 0
+        self.retried = 0
+        self.failures: Dict[str, int] = {}
+
+    async def run(self, fn: Callable[..., Any], *args) -> InferenceResult:
+        """Run the blocking `fn(*args)` with admission control and retries."""
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            admitted = await self._admit(deadline, attempt)
+            if isinstance(admitted, InferenceResult):
+                return self._failed(admitted)
+            started, probe = admitted
+            attempt += 1
+            self.attempts += 1
+            try:
+                # The limit slot is given back when the worker thread finishes, so a call that
+                # timed out here still counts against the limit while its thread runs on
+                value = await self.executor.run(fn, *args, timeout=max(deadline - time.monotonic(), 0.001),
+                                                on_release=self.limiter.release)
+            except Exception as e:
+                result, delay = self._on_error(e, started, attempt, deadline)
+                if result is not None:
+                    return self._failed(result)
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                # A half-open probe that was cancelled must not keep the circuit waiting on it
+                if probe:
+                    self.breaker.release_probe()
+            self._on_success()
+            return InferenceResult(value, attempts=attempt)
+
+    async def stream(self, fn: Callable[..., Iterable[Any]], *args) -> AsyncIterator[Any]:
+        """
+        Yield the items of the blocking iterable `fn(*args)` with admission control; a call is
+        retried only if it fails before its first item, since later items build on earlier ones.
+
+        :raises InferenceError: carrying the failed InferenceResult
+        """
+        self.calls += 1
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            admitted = await self._admit(deadline, attempt)
+            if isinstance(admitted, InferenceResult):
+                raise InferenceError(self._failed(admitted))
+            started, probe = admitted
+            attempt += 1
+            self.attempts += 1
+            yielded = False
+            items = self.executor.stream(fn, *args, timeout=max(deadline - time.monotonic(), 0.001),
+                                         on_release=self.limiter.release)
+            try:
+                async for item in items:
+                    yielded = True
+                    yield item
+            except Exception as e:
+                result, delay = self._on_error(e, started, attempt, deadline, retry=not yielded)
+                if result is not None:
+                    raise InferenceError(self._failed(result))
+                await asyncio.sleep(delay)
+                continue
+            finally:
+                # Also reached when the consumer stops early, e.g. the client went away: stops
+                # the worker thread, which gives the limit slot back once it has finished
+                await items.aclose()
+                if probe:
+                    self.breaker.release_probe()
+            self._on_success()
+            return
+
+    async def _admit(self, deadline: float, attempt: int):
+        """
+        Take a slot and a rate token; returns (the slot's start time, whether this call is the
+        circuit's half-open probe), or a failed result.
+        """
+        allowed, probe = self.breaker.allow()
+        if not allowed:
+            return InferenceResult(error=InferenceErrorKind.CIRCUIT_OPEN, message="Circuit open",
+                                   attempts=attempt, retry_after=round(self.breaker.retry_after(), 1))
+        try:
+            started = await self.limiter.acquire(deadline - time.monotonic())
+        except InferenceBusyError as e:
+            if probe:
+                self.breaker.release_probe()
+            return InferenceResult(error=InferenceErrorKind.BUSY, message=str(e), attempts=attempt)
+        if self.rate_limit is not None:
+            try:
+                await asyncio.wait_for(self.rate_limit.acquire(), timeout=max(deadline - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                self.limiter.release()
+                if probe:
+                    self.breaker.release_probe()
+                return InferenceResult(error=InferenceErrorKind.BUSY, message="No rate token before the deadline",
+                                       attempts=attempt)
+        return started, probe
+
+    def _on_success(self):
+        self.limiter.on_success()
+        self.breaker.record_success()
+
+    def _on_error(self, error: Exception, started: float, attempt: int, deadline: float,
+                  retry: bool = True) -> Tuple[Optional[InferenceResult], float]:
+        """Account for a failed attempt; returns (final result, 0) or (None, backoff before the retry)."""
+        kind = classify_error(error)
+        if kind == InferenceErrorKind.THROTTLED:
+            self.limiter.on_throttle(started)
+            # The backend answered; for the circuit that counts as healthy
+            self.breaker.record_success()
+        elif kind in (InferenceErrorKind.TIMEOUT, InferenceErrorKind.UNAVAILABLE):
+            self.breaker.record_failure()
+        elif kind != InferenceErrorKind.BUSY:
+            self.breaker.record_success()
+        result = InferenceResult(error=kind, message=str(error), attempts=attempt)
+        if not retry or kind not in self._RETRYABLE or attempt > self.retries:
+            return result, 0.0
+        delay = self._random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+        if time.monotonic() + delay >= deadline:
+            return result, 0.0
+        self.retried += 1
+        logger.info(f"Retrying model call in {delay:.2f}s after {kind.value}: {str(error)}")
+        return None, delay
+
+    def _failed(self, result: InferenceResult) -> InferenceResult:
+        self.failures[result.error.value] = self.failures.get(result.error.value, 0) + 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "attempts": self.attempts,
+            "retried": self.retried,
+            "failures": self.failures,
+            "deadline_seconds": self.deadline,
+            "limiter": self.limiter.stats(),
+            "circuit": self.breaker.stats(),
+            "rate_limit": self.rate_limit.stats() if self.rate_limit is not None else None
+        }
@@ -0,0 +1,358 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils.child_context import ChildContext
+
+logger = logging.getLogger(__name__)
+
+
+def worker_id() -> str:
+    """host:pid of this process, recorded against the sessions it serves and the invalidations it publishes."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SessionStore(ABC):
+    """
+    Session metadata and graph contexts shared by every worker serving the app.
+
+    A session maps a session_id to its child_id, and stays resumable for a while after the
+    client disconnects, so a reconnect routed to another worker can resume it. Contexts
+    stored here sit behind each worker's in-process context cache and in front of the
+    context store and the graph, so a context built by one worker is reused by the others.
+    Invalidations are published to a feed that every worker follows, so dropping a child's
+    context on one worker drops the cached copies on all of them.
+
+    WebSocket connections themselves cannot be shared; each worker keeps its own. Every
+    method blocks on the backend, so the app calls them through asyncio.to_thread.
+    """
+
+    backend = ""
+
+    @abstractmethod
+    def register(self, session_id: str, child_id: str):
+        """Record a session as connected to this worker."""
+
+    @abstractmethod
+    def unregister(self, session_id: str):
+        """Mark a session disconnected; it can be resumed until it expires."""
+
+    @abstractmethod
+    def child_for(self, session_id: str) -> Optional[str]:
+        """child_id of a known, unexpired session, None otherwise."""
+
+    @abstractmethod
+    def get_context(self, child_id: str) -> Optional[ChildContext]:
+        pass
+
+    @abstractmethod
+    def set_context(self, child_id: str, context: ChildContext):
+        pass
+
+    def invalidate_context(self, child_id: Optional[str]) -> bool:
+        """Drop a child's shared context (every child's with None) and tell the other workers."""
+        return self.invalidate_many(None if child_id is None else [child_id])
+
+    @abstractmethod
+    def invalidate_many(self, child_ids: Optional[Iterable[str]]) -> bool:
+        """
+        Drop several children's shared contexts (every child's with None) and tell the other
+        workers with a single invalidation.
+
+        :return: whether any shared context was dropped
+        """
+
+    @abstractmethod
+    def invalidations_since(self, cursor: int) -> Tuple[int, List[Optional[str]]]:
+        """
+        Invalidations published by other workers after `cursor`.
+
+        :return: the new cursor and the invalidated child_ids, None meaning all children
+        """
+
+    def heartbeat(self):
+        """Mark the sessions connected to this worker as still alive, so pruning keeps them."""
+
+    def prune(self):
+        """Remove expired sessions, contexts and old invalidations."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, object]:
+        pass
+
+    def close(self):
+        pass
+
+    async def follow_invalidations(self, apply: Callable[[Optional[str]], None], interval_seconds: float,
+                                   prune_seconds: float = 60.0):
+        """
+        Apply other workers' invalidations every `interval_seconds` until cancelled, and every
+        `prune_seconds` refresh this worker's sessions and prune expired rows.
+        """
+        cursor, _ = await asyncio.to_thread(self.invalidations_since, -1)
+        pruned_at = time.monotonic()
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                cursor, child_ids = await asyncio.to_thread(self.invalidations_since, cursor)
+                for child_id in child_ids:
+                    apply(child_id)
+                if time.monotonic() - pruned_at >= prune_seconds:
+                    pruned_at = time.monotonic()
+                    await asyncio.to_thread(self.heartbeat)
+                    await asyncio.to_thread(self.prune)
+            except Exception as e:
+                logger.error(f"Session store sync failed: {str(e)}")
+
+
+class InMemorySessionStore(SessionStore):
+    """
+    Single-process backend. Sessions live in a dict; contexts are not stored, since the
+    worker's own context cache already holds them, and there are no other workers to notify.
+    """
+
+    backend = "memory"
+
+    def __init__(self, session_ttl_seconds: float = 3600.0):
+        """
+        :param session_ttl_seconds: float - how long a disconnected session can be resumed
+        """
+        self.session_ttl_seconds = session_ttl_seconds
+        # session_id -> (child_id, connected, last_seen)
+        self._sessions: Dict[str, Tuple[str, bool, float]] = {}
+
+    def register(self, session_id: str, child_id: str):
+        self._sessions[session_id] = (child_id, True, time.time())
+
+    def unregister(self, session_id: str):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            self._sessions[session_id] = (session[0], False, time.time())
+
+    def child_for(self, session_id: str) -> Optional[str]:
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        child_id, connected, last_seen = session
+        if not connected and time.time() - last_seen > self.session_ttl_seconds:
+            del self._sessions[session_id]
+            return None
+        return child_id
+
+    def get_context(self, child_id: str) -> Optional[ChildContext]:
+        return None
+
+    def set_context(self, child_id: str, context: ChildContext):
+        pass
+
+    def invalidate_many(self, child_ids: Optional[Iterable[str]]) -> bool:
+        return False
+
+    def invalidations_since(self, cursor: int) -> Tuple[int, List[Optional[str]]]:
+        return cursor, []
+
+    def prune(self):
+        cutoff = time.time() - self.session_ttl_seconds
+        for session_id, (_, connected, last_seen) in list(self._sessions.items()):
+            if not connected and last_seen < cutoff:
+                del self._sessions[session_id]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": self.backend,
+            "worker": worker_id(),
+            "sessions_connected": sum(1 for _, connected, _ in self._sessions.values() if connected),
+            "sessions_resumable": sum(1 for _, connected, _ in self._sessions.values() if not connected)
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Backend shared by the workers on one host, in a SQLite file in WAL mode: readers do not
+    block each other or the writer, and each lookup is a primary-key read on an open
+    connection. Workers on other hosts need their own file (or a network backend).
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path: str = "session_store.db", context_ttl_seconds: float = 900.0,
+                 session_ttl_seconds: float = 3600.0):
+        """
+        :param path: str - SQLite file shared by the workers
+        :param context_ttl_seconds: float - how long a shared context is served
+        :param session_ttl_seconds: float - how long a disconnected session can be resumed
+        """
+        self.path = path
+        self.context_ttl_seconds = context_ttl_seconds
+        self.session_ttl_seconds = session_ttl_seconds
+        self.worker = worker_id()
+        # Used from the event loop and worker threads; every access goes through self._lock
+        self.conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    child_id TEXT NOT NULL,
+                    worker TEXT,
+                    last_seen REAL NOT NULL
+                )
+            """)
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS shared_context (
+                    child_id TEXT PRIMARY KEY,
+                    context TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    tokens_saved INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(shared_context)")]
+            if "tokens_saved" not in columns:
+                # Files written before compaction savings were shared alongside each context
+                self.conn.execute("ALTER TABLE shared_context ADD COLUMN tokens_saved INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS invalidations (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    child_ids TEXT,
+                    worker TEXT NOT NULL,
+                    at REAL NOT NULL
+                )
+            """)
+            self.conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def register(self, session_id: str, child_id: str):
+        with self._lock, self.conn:
+            self.conn.execute("""
+                INSERT INTO sessions (session_id, child_id, worker, last_seen) VALUES (?, ?, ?, ?)
+                ON CONFLICT(session_id) DO UPDATE SET child_id = excluded.child_id, worker = excluded.worker,
+                                                      last_seen = excluded.last_seen
+            """, (session_id, child_id, self.worker, time.time()))
+
+    def unregister(self, session_id: str):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE sessions SET worker = NULL, last_seen = ? WHERE session_id = ? AND worker = ?",
+                              (time.time(), session_id, self.worker))
+
+    def child_for(self, session_id: str) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT child_id FROM sessions WHERE session_id = ? AND (worker IS NOT NULL OR last_seen > ?)",
+                (session_id, time.time() - self.session_ttl_seconds)).fetchone()
+        return row[0] if row else None
+
+    def get_context(self, child_id: str) -> Optional[ChildContext]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT context, tokens_saved FROM shared_context WHERE child_id = ? AND expires_at > ?",
+                (child_id, time.time())).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return ChildContext(*row)
+
+    def set_context(self, child_id: str, context: ChildContext):
+        with self._lock, self.conn:
+            self.conn.execute("""
+                INSERT INTO shared_context (child_id, context, expires_at, tokens_saved) VALUES (?, ?, ?, ?)
+                ON CONFLICT(child_id) DO UPDATE SET context = excluded.context, expires_at = excluded.expires_at,
+                                                    tokens_saved = excluded.tokens_saved
+            """, (child_id, context.text, time.time() + self.context_ttl_seconds, context.tokens_saved))
+
+    def invalidate_many(self, child_ids: Optional[Iterable[str]]) -> bool:
+        # One row per call, holding the child_ids as a JSON list (NULL for every child), so
+        # refreshing a batch of children costs one commit and one row for followers to read
+        child_ids = None if child_ids is None else list(child_ids)
+        if child_ids == []:
+            return False
+        with self._lock, self.conn:
+            if child_ids is None:
+                dropped = self.conn.execute("DELETE FROM shared_context").rowcount > 0
+            else:
+                dropped = self.conn.executemany("DELETE FROM shared_context WHERE child_id = ?",
+                                                ((child_id,) for child_id in child_ids)).rowcount > 0
+            self.conn.execute("INSERT INTO invalidations (child_ids, worker, at) VALUES (?, ?, ?)",
+                              (None if child_ids is None else json.dumps(child_ids), self.worker, time.time()))
+        return dropped
+
+    def invalidations_since(self, cursor: int) -> Tuple[int, List[Optional[str]]]:
+        with self._lock:
+            if cursor < 0:
+                row = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()
+                return row[0], []
+            rows = self.conn.execute("SELECT seq, child_ids, worker FROM invalidations WHERE seq > ? ORDER BY seq",
+                                     (cursor,)).fetchall()
+        if not rows:
+            return cursor, []
+        invalidated: List[Optional[str]] = []
+        for _, child_ids, worker in rows:
+            if worker == self.worker:
+                continue
+            if child_ids is None:
+                invalidated.append(None)
+            else:
+                invalidated.extend(json.loads(child_ids))
+        return rows[-1][0], invalidated
+
+    def heartbeat(self):
+        with self._lock, self.conn:
+            self.conn.execute("UPDATE sessions SET last_seen = ? WHERE worker = ?", (time.time(), self.worker))
+
+    def prune(self):
+        now = time.time()
+        with self._lock, self.conn:
+            # Live workers refresh their connected sessions every prune interval, so a connected
+            # session this old was left by a worker that died without disconnecting it
+            self.conn.execute("DELETE FROM sessions WHERE last_seen < ?", (now - self.session_ttl_seconds,))
+            self.conn.execute("DELETE FROM shared_context WHERE expires_at <= ?", (now,))
+            # Followers poll every few seconds; an hour-old invalidation has been applied everywhere
+            self.conn.execute("DELETE FROM invalidations WHERE at < ?", (now - 3600,))
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            sessions = dict(self.conn.execute(
+                "SELECT worker IS NOT NULL, COUNT(*) FROM sessions GROUP BY worker IS NOT NULL").fetchall())
+            workers = self.conn.execute("SELECT COUNT(DISTINCT worker) FROM sessions").fetchone()[0]
+            contexts = self.conn.execute("SELECT COUNT(*) FROM shared_context WHERE expires_at > ?",
+                                         (time.time(),)).fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend,
+            "path": self.path,
+            "worker": self.worker,
+            "workers_with_sessions": workers,
+            "sessions_connected": sessions.get(1, 0),
+            "sessions_resumable": sessions.get(0, 0),
+            "contexts": contexts,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def create_session_store(backend: str, path: str = "session_store.db", context_ttl_seconds: float = 900.0,
+                         session_ttl_seconds: float = 3600.0) -> SessionStore:
+    """
+    :param backend: str - "memory" (one worker) or "sqlite" (several workers on one host)
+    """
+    if backend == "memory":
+        return InMemorySessionStore(session_ttl_seconds=session_ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteSessionStore(path, context_ttl_seconds=context_ttl_seconds,
+                                  session_ttl_seconds=session_ttl_seconds)
+    raise ValueError(f"Unknown session store backend {backend!r}; use 'memory' or 'sqlite'")
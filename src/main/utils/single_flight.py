@@ -0,0 +1,134 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+class _Broadcast:
+    """Items of one in-flight async generator, replayed to every subscriber from the start."""
+
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, item: Any):
+        self.items.append(item)
+        self._wake()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self):
+        # Waiters hold the old event; a fresh one is used for the next change
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        index = 0
+        while True:
+            while index < len(self.items):
+                yield self.items[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key onto one in-flight execution.
+
+    The first caller for a key starts the work; callers arriving while it runs await
+    the same result, and an exception is raised to every one of them. Nothing is
+    remembered once the call finishes, so this complements a cache rather than
+    replacing it. Must be used from a single event loop.
+    """
+
+    def __init__(self, name: str = "single_flight"):
+        """
+        :param name: str - label used in stats
+        """
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self.requests = 0
+        self.executions = 0
+        self.shared = 0
+        self.errors = 0
+
+    async def do(self, key: Hashable, fn: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """Await fn(*args, **kwargs), or the identical call already in flight for `key`."""
+        self.requests += 1
+        future = self._calls.get(key)
+        if future is None:
+            self.executions += 1
+            future = asyncio.ensure_future(fn(*args, **kwargs))
+            self._calls[key] = future
+            future.add_done_callback(lambda done: self._finish_call(key, done))
+        else:
+            self.shared += 1
+        # A waiter that is cancelled (e.g. its client went away) must not cancel the others
+        return await asyncio.shield(future)
+
+    def _finish_call(self, key: Hashable, future: asyncio.Future):
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if not future.cancelled() and future.exception() is not None:
+            self.errors += 1
+
+    async def stream(self, key: Hashable, fn: Callable[..., AsyncIterator[Any]], *args, **kwargs) -> AsyncIterator[Any]:
+        """
+        Iterate fn(*args, **kwargs), sharing one underlying iteration between concurrent
+        callers with the same key. Late joiners first receive the items already produced.
+        The underlying iteration is cancelled if every subscriber stops early.
+        """
+        self.requests += 1
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            self.executions += 1
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, fn(*args, **kwargs)))
+        else:
+            self.shared += 1
+
+        broadcast.subscribers += 1
+        try:
+            async for item in broadcast.subscribe():
+                yield item
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done:
+                broadcast.task.cancel()
+
+    async def _pump(self, key: Hashable, broadcast: _Broadcast, source: AsyncIterator[Any]):
+        try:
+            async for item in source:
+                broadcast.publish(item)
+            broadcast.finish()
+        except asyncio.CancelledError:
+            broadcast.finish(asyncio.CancelledError())
+            raise
+        except Exception as e:
+            self.errors += 1
+            broadcast.finish(e)
+        finally:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+            await source.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "requests": self.requests,
+            "executions": self.executions,
+            "calls_saved": self.shared,
+            "errors": self.errors,
+            "in_flight": len(self._calls) + len(self._streams)
+        }
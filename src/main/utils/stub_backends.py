@@ -0,0 +1,329 @@
+"""
+Local stand-ins for Neo4j and Bedrock, so the service can be load tested offline.
+
+    python -m utils.stub_backends --port 8001 [--graph-latency-ms 20] [--bedrock-ttft-ms 300] [--workers 4] ...
+
+Serves the real app (same handlers, caches, executor and metrics) with its graph store and
+Bedrock client replaced by stubs that answer with generated data after a configurable latency
+and fail at a configurable rate. utils.load_test starts this automatically.
+"""
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from botocore.exceptions import ClientError
+from neo4j.exceptions import ServiceUnavailable
+
+from utils.child_context import (ALL_CHILDREN_QUERY, CHANGED_CHILDREN_QUERY, CHILD_FACTS_BATCH_QUERY,
+                                 CHILD_FACTS_QUERY, FACT_LIMIT)
+
+logger = logging.getLogger(__name__)
+
+_SUBJECTS = ["Fractions", "Spelling", "Photosynthesis", "World Map", "Long Division", "Poetry", "Magnets",
+             "Times Tables", "Solar System", "Reading Log"]
+_CONCEPTS = ["Numerators", "Phonics", "Plants", "Continents", "Remainders", "Rhyme", "Forces", "Multiplication",
+             "Planets", "Comprehension"]
+_EMOTIONS = ["Happy", "Proud", "Frustrated", "Excited", "Nervous", "Calm", "Curious"]
+_ACTIVITIES = ["Football", "Piano", "Chess Club", "Swimming", "Art Class", "Robotics", "Drama"]
+_WORDS = ("your child is making steady progress and seems to enjoy the activities they take part in "
+          "a little encouragement with the harder homework would help them feel more confident").split()
+
+
+class _Latency:
+    """Delay and failure draws shared by the stubs; thread-safe since Bedrock calls run on a pool."""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float, seed: Optional[int]):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, latency_ms: Optional[float] = None) -> float:
+        """Seconds to wait: `latency_ms` (default: the configured latency) plus jitter."""
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, (self.latency_ms if latency_ms is None else latency_ms) + jitter) / 1000
+
+    def chance(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+    def fails(self) -> bool:
+        return self.chance(self.error_rate)
+
+
+def child_facts(child_id: str, fact_limit: int = FACT_LIMIT) -> Dict[str, Any]:
+    """Facts for a child in the shape CHILD_FACTS_QUERY returns, generated deterministically from the id."""
+    rng = random.Random(child_id)
+    homework = []
+    for index in rng.sample(range(len(_SUBJECTS)), min(fact_limit, rng.randint(2, 6))):
+        homework.append({"title": _SUBJECTS[index],
+                         "status": rng.choice(["Pending", "In Progress", "Completed"]),
+                         "difficulty": rng.choice(["Easy", "Medium", "Hard"]),
+                         "concepts": [_CONCEPTS[index]]})
+    emotions = [{"name": name,
+                 "trigger": f"{rng.choice(_SUBJECTS).lower()} at school",
+                 "activities": rng.sample(_ACTIVITIES, rng.randint(0, 2))}
+                for name in rng.sample(_EMOTIONS, min(fact_limit, rng.randint(1, 4)))]
+    activities = sorted(rng.sample(_ACTIVITIES, min(fact_limit, rng.randint(1, 4))))
+    return {"name": f"Child {child_id}", "homework": homework, "emotions": emotions, "activities": activities}
+
+
+class StubGraphStore:
+    """
+    Answers the queries the app sends to GraphStore with generated child facts.
+
+    Every child id exists. ALL_CHILDREN_QUERY lists `children` ids (child-0, child-1, ...) and
+    CHANGED_CHILDREN_QUERY reports no changes, so a context store can be filled from the stub.
+    Failures raise ServiceUnavailable, as the driver does when Neo4j is unreachable.
+    """
+
+    def __init__(self, latency_ms: float = 20.0, jitter_ms: float = 5.0, error_rate: float = 0.0,
+                 children: int = 1000, seed: Optional[int] = None):
+        """
+        :param latency_ms: float - mean time per query
+        :param jitter_ms: float - uniform +/- jitter added to each query
+        :param error_rate: float - fraction of queries that fail
+        :param children: int - number of children listed by ALL_CHILDREN_QUERY
+        :param seed: int - seeds latency and failure draws, None for a random seed
+        """
+        self._latency = _Latency(latency_ms, jitter_ms, error_rate, seed)
+        self.children = children
+        self.reads = 0
+        self.errors = 0
+
+    async def read(self, query: str, **params: Any) -> List[Dict[str, Any]]:
+        self.reads += 1
+        await asyncio.sleep(self._latency.delay())
+        if self._latency.fails():
+            self.errors += 1
+            raise ServiceUnavailable("Stub graph store: injected failure")
+        fact_limit = params.get("fact_limit", FACT_LIMIT)
+        if query == CHILD_FACTS_QUERY:
+            return [child_facts(params["child_id"], fact_limit)]
+        if query == CHILD_FACTS_BATCH_QUERY:
+            return [{"child_id": child_id, **child_facts(child_id, fact_limit)} for child_id in params["child_ids"]]
+        if query == ALL_CHILDREN_QUERY:
+            return [{"child_id": f"child-{index}"} for index in range(self.children)]
+        if query == CHANGED_CHILDREN_QUERY:
+            return []
+        if "timestamp()" in query:
+            return [{"now": int(time.time() * 1000)}]
+        return []
+
+    async def write(self, query: str, **params: Any) -> List[Dict[str, Any]]:
+        await asyncio.sleep(self._latency.delay())
+        return []
+
+    async def close(self):
+        pass
+
+
+class StubBedrockClient:
+    """
+    Stands in for the boto3 bedrock-runtime client: invoke_model and
+    invoke_model_with_response_stream with Nova-shaped responses.
+
+    invoke_model blocks for the first-token delay plus one token delay per generated token,
+    like a non-streaming call that returns once generation ends; the stream yields the first
+    chunk after the first-token delay and each further one after a token delay. Failures raise
+    a ThrottlingException ClientError when the call is made, as Bedrock does under load: at
+    random with `error_rate`, and whenever `capacity` calls are already running. A fraction
+    `slow_rate` of calls waits `slow_ms` longer for the first token, for a latency tail, and
+    `model_ttft_ms` gives some model ids their own first-token delay.
+    """
+
+    def __init__(self, ttft_ms: float = 300.0, token_ms: float = 15.0, tokens: int = 40, jitter_ms: float = 50.0,
+                 error_rate: float = 0.0, seed: Optional[int] = None, capacity: int = 0, slow_rate: float = 0.0,
+                 slow_ms: float = 0.0, model_ttft_ms: Optional[Dict[str, float]] = None):
+        """
+        :param ttft_ms: float - mean time to the first generated token
+        :param token_ms: float - time per further token
+        :param tokens: int - tokens (words) generated per response
+        :param jitter_ms: float - uniform +/- jitter added to the first-token delay
+        :param error_rate: float - fraction of calls that are throttled
+        :param seed: int - seeds latency and failure draws, None for a random seed
+        :param capacity: int - calls that may run at once before further ones are throttled (0 for no limit)
+        :param slow_rate: float - fraction of calls delayed by `slow_ms`
+        :param slow_ms: float - extra first-token delay of a slow call
+        :param model_ttft_ms: dict - model id -> mean first-token delay, for models other than the default
+        """
+        self._latency = _Latency(ttft_ms, jitter_ms, error_rate, seed)
+        self.token_ms = token_ms
+        self.tokens = tokens
+        self.capacity = capacity
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self.model_ttft_ms = model_ttft_ms or {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.running = 0
+
+    def _start(self, operation: str):
+        with self._lock:
+            self.calls += 1
+            over_capacity = self.capacity > 0 and self.running >= self.capacity
+            if not over_capacity:
+                self.running += 1
+        if over_capacity or self._latency.fails():
+            with self._lock:
+                self.errors += 1
+                if not over_capacity:
+                    self.running -= 1
+            raise ClientError({"Error": {"Code": "ThrottlingException", "Message": "Stub: injected throttle"}},
+                              operation)
+
+    def _first_token_delay(self, model_id: str) -> float:
+        delay = self._latency.delay(self.model_ttft_ms.get(model_id))
+        if self._latency.chance(self.slow_rate):
+            delay += self.slow_ms / 1000
+        return delay
+
+    def _finish(self):
+        with self._lock:
+            self.running -= 1
+
+    def _words(self) -> List[str]:
+        return [_WORDS[index % len(_WORDS)] for index in range(self.tokens)]
+
+    def invoke_model(self, body: bytes, modelId: str, **kwargs) -> Dict[str, Any]:
+        self._start("InvokeModel")
+        try:
+            time.sleep(self._first_token_delay(modelId) + self.tokens * self.token_ms / 1000)
+        finally:
+            self._finish()
+        text = " ".join(self._words()).capitalize() + "."
+        payload = {"output": {"message": {"role": "assistant", "content": [{"text": text}]}},
+                   "stopReason": "end_turn",
+                   "usage": {"inputTokens": len(body) // 4, "outputTokens": self.tokens}}
+        return {"body": io.BytesIO(json.dumps(payload).encode("utf-8"))}
+
+    def invoke_model_with_response_stream(self, body: bytes, modelId: str, **kwargs) -> Dict[str, Any]:
+        self._start("InvokeModelWithResponseStream")
+        return {"body": self._events(len(body), modelId)}
+
+    def _events(self, body_size: int, model_id: str) -> Iterator[Dict[str, Any]]:
+        try:
+            time.sleep(self._first_token_delay(model_id))
+            for index, word in enumerate(self._words()):
+                if index:
+                    time.sleep(self.token_ms / 1000)
+                delta = {"contentBlockDelta": {"delta": {"text": (" " if index else "") + word},
+                                               "contentBlockIndex": 0}}
+                yield {"chunk": {"bytes": json.dumps(delta).encode("utf-8")}}
+            metadata = {"metadata": {"usage": {"inputTokens": body_size // 4, "outputTokens": self.tokens}}}
+            yield {"chunk": {"bytes": json.dumps(metadata).encode("utf-8")}}
+        finally:
+            self._finish()
+
+
+def install(app_module, graph_store: StubGraphStore, bedrock_client: StubBedrockClient):
+    """Point an imported `app` module at the stubs; handlers look both up as module globals."""
+    app_module.graph_store = graph_store
+    app_module.bedrock_client = bedrock_client
+    # Routes in other regions reach the same stub, which tells models apart by modelId
+    app_module.bedrock_client_for = lambda region: bedrock_client
+    if app_module.context_materializer is not None:
+        app_module.context_materializer.graph_store = graph_store
+
+
+def add_stub_arguments(parser: argparse.ArgumentParser):
+    """Stub latency and failure options, shared with utils.load_test."""
+    group = parser.add_argument_group("stub backends")
+    group.add_argument("--graph-latency-ms", type=float, default=20.0, help="mean Neo4j query latency")
+    group.add_argument("--graph-jitter-ms", type=float, default=5.0, help="+/- jitter on each Neo4j query")
+    group.add_argument("--graph-error-rate", type=float, default=0.0, help="fraction of Neo4j queries that fail")
+    group.add_argument("--children", type=int, default=1000, help="children listed by the stub graph")
+    group.add_argument("--bedrock-ttft-ms", type=float, default=300.0, help="mean time to the first token")
+    group.add_argument("--bedrock-token-ms", type=float, default=15.0, help="time per further token")
+    group.add_argument("--bedrock-tokens", type=int, default=40, help="tokens generated per response")
+    group.add_argument("--bedrock-jitter-ms", type=float, default=50.0, help="+/- jitter on the first-token delay")
+    group.add_argument("--bedrock-error-rate", type=float, default=0.0, help="fraction of Bedrock calls throttled")
+    group.add_argument("--bedrock-capacity", type=int, default=0,
+                       help="Bedrock calls running at once before more are throttled (0 for no limit)")
+    group.add_argument("--bedrock-slow-rate", type=float, default=0.0,
+                       help="fraction of Bedrock calls that are slow to the first token")
+    group.add_argument("--bedrock-slow-ms", type=float, default=2000.0, help="extra first-token delay of a slow call")
+    group.add_argument("--bedrock-model-ttft-ms", action="append", default=[], metavar="MODEL_ID=MS",
+                       help="first-token delay for one model id (repeatable)")
+    group.add_argument("--seed", type=int, default=None, help="seed for latency and failure draws")
+    group.add_argument("--workers", type=int, default=1, help="uvicorn worker processes serving the app")
+
+
+def stub_arguments(args: argparse.Namespace) -> List[str]:
+    """The stub options in `args` as command-line arguments for `python -m utils.stub_backends`."""
+    argv = []
+    for name in ("graph_latency_ms", "graph_jitter_ms", "graph_error_rate", "children", "bedrock_ttft_ms",
+                 "bedrock_token_ms", "bedrock_tokens", "bedrock_jitter_ms", "bedrock_error_rate", "bedrock_capacity",
+                 "bedrock_slow_rate", "bedrock_slow_ms", "seed", "workers"):
+        value = getattr(args, name)
+        if value is not None:
+            argv += ["--" + name.replace("_", "-"), str(value)]
+    for model_ttft in args.bedrock_model_ttft_ms:
+        argv += ["--bedrock-model-ttft-ms", model_ttft]
+    return argv
+
+
+def model_ttft_ms(pairs: List[str]) -> Dict[str, float]:
+    """["MODEL_ID=MS", ...] as {model_id: ms}."""
+    delays = {}
+    for pair in pairs:
+        model_id, _, ms = pair.rpartition("=")
+        delays[model_id] = float(ms)
+    return delays
+
+
+# Stub options handed from main() to the app factory in each worker process
+_CONFIG_ENV = "GRAPHRAG_STUB_BACKENDS"
+
+
+def create_app():
+    """uvicorn app factory: import the app and install the stubs configured by main(), once per worker."""
+    import app
+
+    args = argparse.Namespace(**json.loads(os.environ[_CONFIG_ENV]))
+    logging.getLogger().setLevel(args.log_level.upper())
+    install(app,
+            StubGraphStore(latency_ms=args.graph_latency_ms, jitter_ms=args.graph_jitter_ms,
+                           error_rate=args.graph_error_rate, children=args.children, seed=args.seed),
+            StubBedrockClient(ttft_ms=args.bedrock_ttft_ms, token_ms=args.bedrock_token_ms,
+                              tokens=args.bedrock_tokens, jitter_ms=args.bedrock_jitter_ms,
+                              error_rate=args.bedrock_error_rate,
+                              seed=None if args.seed is None else args.seed + 1,
+                              capacity=args.bedrock_capacity, slow_rate=args.bedrock_slow_rate,
+                              slow_ms=args.bedrock_slow_ms, model_ttft_ms=model_ttft_ms(args.bedrock_model_ttft_ms)))
+    return app.app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the app against local Neo4j and Bedrock stand-ins")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--log-level", default="warning", help="app and uvicorn log level")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+
+    # The stub graph answers the schema statements too, but there is no point sending them
+    os.environ.setdefault("NEO4J_BOOTSTRAP_SCHEMA", "false")
+    os.environ[_CONFIG_ENV] = json.dumps(vars(args))
+    if args.workers > 1 and os.getenv("SESSION_STORE_BACKEND", "memory") == "memory":
+        logger.warning("Several workers with SESSION_STORE_BACKEND=memory: sessions and contexts are not shared")
+    import uvicorn
+
+    uvicorn.run("utils.stub_backends:create_app", factory=True, host=args.host, port=args.port,
+                workers=args.workers, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import asyncio
+import json
+
+import pytest
+
+from utils.batch_reports import BatchReportGenerator, CheckpointInUseError, ReportCheckpoint, report_prompt
+
+
+class Busy(Exception):
+    pass
+
+
+def collect(generator: BatchReportGenerator, child_ids, prompt, checkpoint=None):
+    async def scenario():
+        return [result async for result in generator.run(child_ids, prompt, checkpoint)]
+
+    return asyncio.run(scenario())
+
+
+def make_generator(contexts, fail=(), busy_once=(), **kwargs):
+    loads = []
+    busy = set(busy_once)
+
+    async def load_contexts(child_ids):
+        loads.append(list(child_ids))
+        return {child_id: contexts[child_id] for child_id in child_ids if child_id in contexts}
+
+    async def generate(context, prompt):
+        child_id = prompt.split()[-1]
+        if child_id in busy:
+            busy.discard(child_id)
+            raise Busy("inference queue full")
+        if child_id in fail:
+            raise RuntimeError("model refused")
+        return f"{prompt} / {context}"
+
+    generator = BatchReportGenerator(load_contexts, generate, retry_on=(Busy,), **kwargs)
+    return generator, loads
+
+
+def test_report_prompt_replaces_the_child_id():
+    assert report_prompt("Summary for {child_id}", "C1") == "Summary for C1"
+
+
+def test_run_reports_every_child_then_a_summary():
+    contexts = {f"C{i}": f"context {i}" for i in range(5)}
+    generator, loads = make_generator(contexts, fail={"C3"}, busy_once={"C1"}, batch_size=2, max_concurrency=2)
+    results = collect(generator, ["C0", "C1", "C2", "C3", "C4", "C9", "C0"], "Report for {child_id}")
+    summary = results.pop()["summary"]
+    by_child = {result["child_id"]: result for result in results}
+    assert sorted(by_child) == ["C0", "C1", "C2", "C3", "C4", "C9"]
+    # Retried after a 1s backoff
+    assert by_child["C1"]["status"] == "ok"
+    assert by_child["C3"] == {"child_id": "C3", "status": "error", "error": "model refused"}
+    assert by_child["C9"]["error"] == "No graph data for child"
+    assert by_child["C0"]["response"] == "Report for C0 / context 0"
+    assert summary["children"] == 6 and summary["ok"] == 4 and summary["errors"] == 2
+    # Duplicates are dropped and contexts load batch_size children at a time
+    assert loads == [["C0", "C1"], ["C2", "C3"], ["C4", "C9"]]
+
+
+def test_checkpoint_resumes_and_skips_completed_children(tmp_path):
+    path = str(tmp_path / "run.ndjson")
+    contexts = {"C1": "a", "C2": "b"}
+    generator, _ = make_generator(contexts, fail={"C2"})
+    checkpoint = ReportCheckpoint(path, "Report for {child_id}")
+    collect(generator, ["C1", "C2"], "Report for {child_id}", checkpoint)
+    checkpoint.close()
+
+    generator, loads = make_generator(contexts)
+    checkpoint = ReportCheckpoint(path, "Report for {child_id}")
+    assert checkpoint.completed == {"C1"}
+    results = collect(generator, ["C1", "C2"], "Report for {child_id}", checkpoint)
+    checkpoint.close()
+    assert loads == [["C2"]]
+    assert results[-1]["summary"]["skipped"] == 1 and results[-1]["summary"]["ok"] == 1
+    with open(path) as f:
+        lines = [json.loads(line) for line in f]
+    assert "prompt_sha256" in lines[0]
+    assert [line["status"] for line in lines[1:]] == ["ok", "error", "ok"]
+
+
+def test_checkpoint_refuses_another_prompt(tmp_path):
+    path = str(tmp_path / "run.ndjson")
+    ReportCheckpoint(path, "first prompt").close()
+    with pytest.raises(ValueError):
+        ReportCheckpoint(path, "second prompt")
+    # The refused open released its lock
+    ReportCheckpoint(path, "first prompt").close()
+
+
+def test_checkpoint_is_open_in_one_run_at_a_time(tmp_path):
+    path = str(tmp_path / "run.ndjson")
+    checkpoint = ReportCheckpoint(path, "prompt")
+    with pytest.raises(CheckpointInUseError):
+        ReportCheckpoint(path, "prompt")
+    checkpoint.close()
+    ReportCheckpoint(path, "prompt").close()
@@ -0,0 +1,66 @@
+import time
+
+from utils.bounded_cache import BoundedCache
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = BoundedCache(max_entries=2, ttl_seconds=None)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_are_misses():
+    cache = BoundedCache(ttl_seconds=0.01)
+    cache.set("a", "1")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+    assert cache.stats()["expirations"] == 1
+
+
+def test_byte_cap_evicts_and_skips_oversized_values():
+    cache = BoundedCache(max_entries=100, max_bytes=10, ttl_seconds=None)
+    cache.set("a", "12345")
+    cache.set("b", "12345")
+    cache.set("c", "12345")
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 10
+    cache.set("big", "x" * 11)
+    assert cache.get("big") is None
+    assert cache.get("b") == "12345"
+
+
+def test_listeners_hear_only_removed_keys():
+    cache = BoundedCache(ttl_seconds=None)
+    heard = []
+    cache.add_invalidation_listener(heard.append)
+    cache.set("a", "1")
+    assert cache.invalidate("a") is True
+    assert cache.invalidate("a") is False
+    assert cache.invalidate("never-cached") is False
+    cache.clear()
+    assert heard == ["a", None]
+
+
+def test_invalidate_group_uses_the_index():
+    cache = BoundedCache(max_entries=3, ttl_seconds=None, group_of=lambda key: key[0])
+    heard = []
+    cache.add_invalidation_listener(heard.append)
+    for key in [("C1", "x"), ("C1", "y"), ("C2", "x"), ("C2", "y")]:
+        cache.set(key, "answer")
+    # ("C1", "x") was evicted, so only one C1 entry is left to drop
+    assert cache.invalidate_group("C1") == 1
+    assert heard == [("C1", "y")]
+    assert cache.invalidate_group("C1") == 0
+    assert cache.invalidate_group("C3") == 0
+    assert len(cache) == 2
+    cache.invalidate(("C2", "x"))
+    cache.set(("C2", "x"), "again")
+    assert cache.invalidate_group("C2") == 2
+    assert cache._groups == {}
@@ -0,0 +1,112 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from utils.child_context import ChildContext
+from utils.context_compaction import ContextCompactor
+from utils.context_materializer import ContextMaterializer
+from utils.context_store import ContextStore
+from utils.file_lock import try_lock
+from utils.stub_backends import StubGraphStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ContextStore(str(tmp_path / "child_context.db"))
+    yield store
+    store.close()
+
+
+def test_put_many_get_and_watermark(store):
+    assert store.get_watermark() is None
+    store.put_many([("C1", ChildContext("context 1", 5)), ("C2", ChildContext("context 2"))])
+    store.put("C1", ChildContext("context 1 again", 7))
+    store.set_watermark(1700000000000)
+    assert store.get("C1") == ChildContext("context 1 again", 7)
+    assert store.get("C3") is None
+    assert store.get_many(["C1", "C2", "C3"]) == {"C1": ChildContext("context 1 again", 7),
+                                                  "C2": ChildContext("context 2", 0)}
+    assert store.get_watermark() == 1700000000000
+    assert len(store) == 2
+    assert store.stats()["hits"] == 3 and store.stats()["misses"] == 2
+
+
+def test_watermark_survives_reopening(tmp_path):
+    path = str(tmp_path / "child_context.db")
+    first = ContextStore(path)
+    first.put_many([("C1", ChildContext("context 1"))])
+    first.set_watermark(42)
+    first.close()
+    reopened = ContextStore(path)
+    try:
+        assert reopened.get_watermark() == 42
+        assert reopened.get("C1").text == "context 1"
+    finally:
+        reopened.close()
+
+
+def test_purge_except_drops_other_children(store):
+    store.put_many([(child_id, ChildContext(child_id)) for child_id in ("C1", "C2", "C3")])
+    assert sorted(store.purge_except(["C1", "C3", "C9"])) == ["C2"]
+    assert store.get("C2") is None
+    assert len(store) == 2
+
+
+def test_materializer_fills_the_store_and_purges_removed_children(store):
+    graph = StubGraphStore(latency_ms=0, jitter_ms=0, children=5, seed=1)
+    refreshed = []
+
+    async def on_refresh(child_ids):
+        refreshed.append(list(child_ids))
+
+    materializer = ContextMaterializer(graph, store, batch_size=2, on_refresh=on_refresh)
+    store.put("gone", ChildContext("context of a child no longer in the graph"))
+
+    report = asyncio.run(materializer.refresh())
+    assert report["mode"] == "full"
+    assert report["children_refreshed"] == 5 and report["children_purged"] == 1
+    # One callback per batch, then one for the purged children
+    assert refreshed == [["child-0", "child-1"], ["child-2", "child-3"], ["child-4"], ["gone"]]
+    assert len(store) == 5
+    assert store.get_watermark() == report["watermark"]
+
+    refreshed.clear()
+    report = asyncio.run(materializer.refresh())
+    assert report["mode"] == "incremental" and report["children_refreshed"] == 0
+    assert refreshed == []
+
+
+def test_stores_written_before_tokens_saved_are_migrated(tmp_path):
+    path = str(tmp_path / "child_context.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE child_context (child_id TEXT PRIMARY KEY, context TEXT NOT NULL, refreshed_at REAL NOT NULL)")
+    conn.execute("INSERT INTO child_context VALUES ('C1', 'old context', 0)")
+    conn.commit()
+    conn.close()
+    store = ContextStore(path)
+    try:
+        assert store.get("C1") == ChildContext("old context", 0)
+    finally:
+        store.close()
+
+
+def test_compaction_savings_are_stored_with_the_context(store):
+    graph = StubGraphStore(latency_ms=0, jitter_ms=0, children=2, seed=1)
+    materializer = ContextMaterializer(graph, store, compactor=ContextCompactor(60))
+    asyncio.run(materializer.refresh())
+    context = store.get("child-0")
+    assert context.tokens_saved > 0
+    assert materializer.compactor.stats()["tokens_saved"] == sum(store.get(f"child-{i}").tokens_saved
+                                                                 for i in range(2))
+
+
+def test_only_one_holder_of_the_refresh_lock(tmp_path):
+    path = str(tmp_path / "child_context.db.refresh.lock")
+    held = try_lock(path)
+    assert held is not None
+    assert try_lock(path) is None
+    held.close()
+    again = try_lock(path)
+    assert again is not None
+    again.close()
@@ -0,0 +1,101 @@
+"""
+Checks the child context query against a small seeded dataset on a live Neo4j instance.
+
+Seeds one test child with several homework/concept/activity/emotion facts, PROFILEs the
+previous single-MATCH query and CHILD_FACTS_QUERY, and asserts the new query returns one
+row carrying every fact, where the old query's row explosion + LIMIT dropped facts.
+Row and db-hit totals from both plans are printed for comparison. The seeded nodes are
+removed afterwards.
+
+    NEO4J_URI=... NEO4J_USERNAME=... NEO4J_PASSWORD=... python -m utils.test_graph_context_query
+"""
+import os
+
+from dotenv import load_dotenv
+from neo4j import GraphDatabase
+
+from utils.child_context import CHILD_FACTS_QUERY, FACT_LIMIT, render_child_context
+
+TEST_CHILD_ID = "TEST_CTX_CHILD"
+
+# The query build_graph_context used before the per-relationship rewrite
+LEGACY_QUERY = """
+MATCH (c:Child {child_id: $child_id})-[:ASSIGNED]->(h:Homework),
+      (c)-[:PARTICIPATED]->(a:Activity), (h)-[:COVERS]->(con:Concept),
+      (c)-[:EXPERIENCED]->(em:Emotion)-[:RELATED_TO]->(a:Activity)
+RETURN DISTINCT c.name, h.title, h.status, h.difficulty, em.name, em.trigger, con.name, a.name
+LIMIT 10
+"""
+
+SEED_QUERY = """
+CREATE (c:Child {child_id: $child_id, name: 'Test Child', test_fixture: true})
+WITH c
+UNWIND range(1, 4) AS i
+CREATE (h:Homework {title: 'Homework ' + i, status: CASE WHEN i % 2 = 0 THEN 'Completed' ELSE 'Pending' END,
+                    difficulty: CASE WHEN i = 1 THEN 'Hard' ELSE 'Easy' END, test_fixture: true})
+CREATE (c)-[:ASSIGNED]->(h)
+WITH c, h, i
+UNWIND range(1, 3) AS j
+CREATE (h)-[:COVERS]->(:Concept {name: 'Concept ' + i + '.' + j, test_fixture: true})
+WITH DISTINCT c
+UNWIND range(1, 3) AS k
+CREATE (a:Activity {name: 'Activity ' + k, test_fixture: true})
+CREATE (em:Emotion {name: 'Emotion ' + k, trigger: 'Trigger ' + k, test_fixture: true})
+CREATE (c)-[:PARTICIPATED]->(a)
+CREATE (c)-[:EXPERIENCED]->(em)-[:RELATED_TO]->(a)
+"""
+
+CLEANUP_QUERY = "MATCH (n {test_fixture: true}) DETACH DELETE n"
+
+
+def total_db_hits(plan) -> int:
+    return plan.get("dbHits", 0) + sum(total_db_hits(child) for child in plan.get("children", []))
+
+
+def total_rows(plan) -> int:
+    return plan.get("rows", 0) + sum(total_rows(child) for child in plan.get("children", []))
+
+
+def profile(session, query, **params):
+    result = session.run("PROFILE " + query, **params)
+    records = [record.data() for record in result]
+    plan = result.consume().profile
+    return records, total_db_hits(plan), total_rows(plan)
+
+
+def main():
+    load_dotenv()
+    driver = GraphDatabase.driver(os.getenv("NEO4J_URI"),
+                                  auth=(os.getenv("NEO4J_USERNAME", "neo4j"), os.getenv("NEO4J_PASSWORD")))
+    try:
+        with driver.session() as session:
+            session.run(CLEANUP_QUERY).consume()
+            session.run(SEED_QUERY, child_id=TEST_CHILD_ID).consume()
+
+            legacy_records, legacy_hits, legacy_rows = profile(session, LEGACY_QUERY, child_id=TEST_CHILD_ID)
+            records, hits, rows = profile(session, CHILD_FACTS_QUERY, child_id=TEST_CHILD_ID, fact_limit=FACT_LIMIT)
+            print(f"legacy query: {len(legacy_records)} records, {legacy_rows} intermediate rows, {legacy_hits} db hits")
+            print(f"facts query:  {len(records)} records, {rows} intermediate rows, {hits} db hits")
+
+            assert len(records) == 1, "facts query must return exactly one row per child"
+            facts = records[0]
+            assert len(facts["homework"]) == 4
+            assert all(len(hw["concepts"]) == 3 for hw in facts["homework"])
+            assert len(facts["emotions"]) == 3 and len(facts["activities"]) == 3
+            # Pending + Hard homework ranks first
+            assert facts["homework"][0]["title"] == "Homework 1"
+            # The legacy query expands 4 homework x 3 concepts x 3 emotion/activity pairs = 36 rows and
+            # LIMIT 10 then drops most of them, so homework/concept facts go missing from the context
+            legacy_pairs = {(r["h.title"], r["con.name"]) for r in legacy_records}
+            pairs = {(hw["title"], con) for hw in facts["homework"] for con in hw["concepts"]}
+            assert len(pairs) == 12 and len(legacy_pairs) < len(pairs)
+            print(render_child_context(facts))
+            print("OK")
+    finally:
+        with driver.session() as session:
+            session.run(CLEANUP_QUERY).consume()
+        driver.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.inference_executor import InferenceBusyError, InferenceExecutor, InferenceTimeoutError
+
+
+def test_run_returns_the_result_off_the_loop():
+    executor = InferenceExecutor(max_concurrency=2, max_queue=2, timeout=5)
+
+    async def scenario():
+        return await executor.run(lambda: threading.current_thread().name)
+
+    try:
+        assert asyncio.run(scenario()).startswith("inference")
+    finally:
+        executor.shutdown()
+
+
+def test_full_queue_is_rejected_at_once():
+    executor = InferenceExecutor(max_concurrency=1, max_queue=1, timeout=5)
+    gate = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(executor.run(gate.wait))
+        waiting = asyncio.ensure_future(executor.run(gate.wait))
+        await asyncio.sleep(0.05)
+        assert (executor.in_flight, executor.queue_depth) == (1, 1)
+        released = []
+        with pytest.raises(InferenceBusyError):
+            await executor.run(gate.wait, on_release=lambda: released.append(True))
+        # Nothing was started for the rejected call, so it is released at once
+        assert released == [True]
+        gate.set()
+        await asyncio.gather(running, waiting)
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+
+def test_wait_for_a_slot_is_bounded_by_the_timeout():
+    executor = InferenceExecutor(max_concurrency=1, max_queue=4, timeout=5)
+    gate = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(executor.run(gate.wait))
+        await asyncio.sleep(0.01)
+        started = time.monotonic()
+        with pytest.raises(InferenceTimeoutError):
+            await executor.run(gate.wait, timeout=0.05)
+        assert time.monotonic() - started < 1
+        assert executor.queue_depth == 0
+        gate.set()
+        await running
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+
+def test_timed_out_call_keeps_its_slot_until_the_thread_finishes():
+    executor = InferenceExecutor(max_concurrency=1, max_queue=1, timeout=5)
+    released = []
+
+    async def scenario():
+        with pytest.raises(InferenceTimeoutError):
+            await executor.run(time.sleep, 0.2, timeout=0.05, on_release=lambda: released.append(time.monotonic()))
+        assert executor.in_flight == 1
+        assert released == []
+        await asyncio.sleep(0.3)
+        assert executor.in_flight == 0
+        assert len(released) == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        executor.shutdown()
+
+
+def test_stream_hands_items_over_in_order():
+    executor = InferenceExecutor(max_concurrency=1, max_queue=1, timeout=5)
+    released = []
+
+    def produce():
+        for i in range(5):
+            time.sleep(0.001)
+            yield i
+
+    async def scenario():
+        return [item async for item in executor.stream(produce, on_release=lambda: released.append(True))]
+
+    try:
+        assert asyncio.run(scenario()) == [0, 1, 2, 3, 4]
+        assert released == [True]
+    finally:
+        executor.shutdown()
+
+
+def test_stream_stops_the_thread_when_the_consumer_stops():
+    executor = InferenceExecutor(max_concurrency=1, max_queue=1, timeout=5)
+    pulled = []
+
+    def produce():
+        for i in range(1000):
+            pulled.append(i)
+            time.sleep(0.005)
+            yield i
+
+    async def scenario():
+        items = executor.stream(produce)
+        async for _ in items:
+            break
+        await items.aclose()
+        await asyncio.sleep(0.05)
+        assert executor.in_flight == 0
+
+    try:
+        asyncio.run(scenario())
+        assert len(pulled) < 20
+    finally:
+        executor.shutdown()
+
+
+def test_stream_errors_reach_the_consumer():
+    executor = InferenceExecutor(max_concurrency=1, max_queue=1, timeout=5)
+
+    def produce():
+        yield 1
+        raise ValueError("backend went away")
+
+    async def scenario():
+        received = []
+        with pytest.raises(ValueError):
+            async for item in executor.stream(produce):
+                received.append(item)
+        return received
+
+    try:
+        assert asyncio.run(scenario()) == [1]
+    finally:
+        executor.shutdown()
@@ -0,0 +1,50 @@
+import pytest
+
+from utils.json_validations import (SchemaNamespace, SchemaOneModel, SchemaTwoModel, message_validator,
+                                    validate_and_load)
+
+
+def test_messages_with_an_image_load_as_schema_two():
+    image_data = "aGVsbG8=" * 1000
+    namespace, payload = validate_and_load({"image_data": image_data, "prompt": "Describe", "request_id": "q1"})
+    assert namespace is SchemaNamespace.SCHEMA_TWO and isinstance(payload, SchemaTwoModel)
+    # The large field is passed through, not copied
+    assert payload.image_data is image_data
+    assert payload == SchemaTwoModel.model_validate({"image_data": image_data, "prompt": "Describe",
+                                                     "request_id": "q1"})
+
+
+def test_messages_without_an_image_load_as_schema_one_with_defaults():
+    namespace, payload = validate_and_load({"prompt": "Hi", "image_bytes": 2048, "unknown": 1})
+    assert namespace is SchemaNamespace.SCHEMA_ONE
+    assert payload == SchemaOneModel(prompt="Hi", image_bytes=2048)
+    assert payload.stream is None and payload.request_id is None
+    assert "unknown" not in payload.model_dump()
+
+
+@pytest.mark.parametrize("message, problem", [
+    ({}, "'prompt' is a required property"),
+    ({"prompt": 3}, "'prompt' must be of type string, got int"),
+    ({"prompt": "Hi", "stream": "yes"}, "'stream' must be of type boolean, got str"),
+    # bool is an int in Python but not an integer in JSON Schema
+    ({"prompt": "Hi", "image_bytes": True}, "'image_bytes' must be of type integer, got bool"),
+    ({"image_data": "aGVsbG8=", "prompt": None}, "'prompt' must be of type string, got NoneType"),
+    (["prompt"], "expected a JSON object, got list"),
+])
+def test_invalid_messages_are_rejected_before_a_model_is_built(monkeypatch, message, problem):
+    constructed = []
+
+    def recording(model):
+        original = model.model_construct
+
+        def model_construct(**fields):
+            constructed.append(fields)
+            return original(**fields)
+        return model_construct
+
+    for model in (SchemaOneModel, SchemaTwoModel):
+        monkeypatch.setattr(model, "model_construct", recording(model))
+    with pytest.raises(ValueError) as rejected:
+        message_validator.validate_and_load(message)
+    assert problem in str(rejected.value)
+    assert constructed == []
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from utils.metrics import MetricsRegistry, watch_event_loop_lag
+
+
+def test_counter_renders_labelled_series():
+    registry = MetricsRegistry()
+    errors = registry.counter("errors_total", "Errors", labels=("error",))
+    errors.inc(error="timeout")
+    errors.inc(2, error="timeout")
+    errors.inc(error='quote"d')
+    assert errors.value(error="timeout") == 3
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP errors_total Errors", "# TYPE errors_total counter"]
+    assert 'errors_total{error="timeout"} 3' in lines
+    assert 'errors_total{error="quote\\"d"} 1' in lines
+
+
+def test_gauge_is_read_at_scrape_time():
+    registry = MetricsRegistry()
+    depth = [0]
+    registry.gauge("queue_depth", "Queue depth", lambda: depth[0])
+    depth[0] = 7
+    assert "queue_depth 7" in registry.render().splitlines()
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    seconds = registry.histogram("stage_seconds", "Stage time", labels=("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        seconds.observe(value, stage="send")
+    lines = registry.render().splitlines()
+    assert 'stage_seconds_bucket{stage="send",le="0.1"} 2' in lines
+    assert 'stage_seconds_bucket{stage="send",le="1.0"} 3' in lines
+    assert 'stage_seconds_bucket{stage="send",le="+Inf"} 4' in lines
+    assert 'stage_seconds_count{stage="send"} 4' in lines
+    assert 'stage_seconds_sum{stage="send"} 2.65' in lines
+
+
+def test_histogram_times_blocks_that_raise():
+    registry = MetricsRegistry()
+    seconds = registry.histogram("stage_seconds", "Stage time", labels=("stage",))
+    with pytest.raises(ValueError):
+        with seconds.time(stage="validate"):
+            raise ValueError("bad message")
+    assert 'stage_seconds_count{stage="validate"} 1' in registry.render().splitlines()
+
+
+def test_event_loop_lag_is_observed():
+    registry = MetricsRegistry()
+    lag = registry.histogram("lag_seconds", "Lag")
+
+    async def scenario():
+        watcher = asyncio.ensure_future(watch_event_loop_lag(lag, interval=0.01))
+        await asyncio.sleep(0.05)
+        watcher.cancel()
+
+    asyncio.run(scenario())
+    count = [line for line in registry.render().splitlines() if line.startswith("lag_seconds_count")]
+    assert count and int(count[0].split()[-1]) >= 2
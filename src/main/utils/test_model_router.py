@@ -0,0 +1,187 @@
+import asyncio
+
+import pytest
+
+from utils.model_router import ModelRouter, Route, parse_routes
+from utils.resilient_inference import InferenceError, InferenceErrorKind, InferenceResult
+
+FAST, SLOW = Route("fast"), Route("slow")
+
+
+def measure(router, route, seconds, kind="call", samples=5):
+    for _ in range(samples):
+        router._window(route, kind).record(seconds)
+
+
+def test_parse_routes_keeps_model_ids_and_regions():
+    routes = parse_routes("amazon.nova-lite-v1:0, amazon.nova-micro-v1:0@us-west-2,,")
+    assert [(route.model_id, route.region) for route in routes] == [
+        ("amazon.nova-lite-v1:0", None), ("amazon.nova-micro-v1:0", "us-west-2")]
+    assert routes[1].name == "amazon.nova-micro-v1:0@us-west-2"
+    with pytest.raises(ValueError):
+        parse_routes(" , ")
+
+
+def test_rank_prefers_the_first_route_until_another_is_measured_faster():
+    router = ModelRouter([SLOW, FAST], [FAST], min_samples=5, explore=0)
+    assert router.rank(multimodal=False) == [SLOW, FAST]
+    assert router.rank(multimodal=True) == [FAST]
+    measure(router, SLOW, 0.5)
+    measure(router, FAST, 0.1, samples=4)
+    assert router.rank(multimodal=False) == [SLOW, FAST]
+    measure(router, FAST, 0.1, samples=1)
+    assert router.rank(multimodal=False) == [FAST, SLOW]
+    # Streams are ranked by their own latencies
+    assert router.rank(multimodal=False, kind="stream") == [SLOW, FAST]
+
+
+def test_hedge_delay_needs_samples_and_respects_the_hedge_ratio():
+    router = ModelRouter([FAST], [FAST], hedge_percentile=95, min_samples=5, max_hedge_ratio=0.5)
+    router.calls = 10
+    assert router.hedge_delay(FAST) is None
+    measure(router, FAST, 0.2)
+    assert router.hedge_delay(FAST) == pytest.approx(0.2)
+    router.hedged = 5
+    assert router.hedge_delay(FAST) is None
+    assert ModelRouter([FAST], [FAST], hedge_percentile=0, min_samples=5).hedge_delay(FAST) is None
+
+
+def hedging_router(**kwargs):
+    router = ModelRouter([SLOW, FAST], [SLOW], min_samples=5, max_hedge_ratio=1.0, explore=0, **kwargs)
+    measure(router, SLOW, 0.02)
+    measure(router, SLOW, 0.02, kind="stream")
+    return router
+
+
+def test_a_slow_call_is_hedged_and_the_loser_cancelled():
+    router = hedging_router()
+    cancelled = []
+
+    async def call(route):
+        try:
+            await asyncio.sleep(1 if route is SLOW else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(route)
+            raise
+        return InferenceResult(value=route.name)
+
+    async def scenario():
+        result = await router.run(call)
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(scenario()).value == "fast"
+    assert cancelled == [SLOW]
+    assert (router.hedged, router.hedges_won) == (1, 1)
+    assert router.routed == {"fast": 1}
+
+
+def test_no_hedge_while_hedging_is_not_allowed():
+    router = hedging_router(hedge_allowed=lambda: False)
+    routes = []
+
+    async def call(route):
+        routes.append(route)
+        await asyncio.sleep(0.05)
+        return InferenceResult(value=route.name)
+
+    assert asyncio.run(router.run(call)).value == "slow"
+    assert routes == [SLOW]
+    assert (router.hedged, router.hedges_skipped) == (0, 1)
+
+
+def test_a_failed_call_falls_back_to_the_hedge():
+    router = hedging_router()
+
+    async def call(route):
+        if route is SLOW:
+            await asyncio.sleep(0.05)
+            return InferenceResult(error=InferenceErrorKind.UNAVAILABLE, message="down")
+        await asyncio.sleep(0.1)
+        return InferenceResult(value=route.name)
+
+    assert asyncio.run(router.run(call)).value == "fast"
+    assert router.failures == {"slow": 1}
+
+
+def test_a_slow_stream_is_hedged_and_the_loser_closed():
+    router = hedging_router()
+    closed = []
+
+    async def open_stream(route):
+        try:
+            await asyncio.sleep(1 if route is SLOW else 0.01)
+            for token in ("a", "b"):
+                yield f"{route.name}:{token}"
+        finally:
+            closed.append(route)
+
+    async def scenario():
+        return [item async for item in router.stream(open_stream)]
+
+    assert asyncio.run(scenario()) == ["fast:a", "fast:b"]
+    assert sorted(route.name for route in closed) == ["fast", "slow"]
+    assert router.hedges_won == 1
+
+
+def test_a_stream_closed_early_releases_the_winner():
+    router = ModelRouter([FAST], [FAST])
+    closed = []
+
+    async def open_stream(route):
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield "token"
+        finally:
+            closed.append(route)
+
+    async def scenario():
+        items = router.stream(open_stream)
+        async for _ in items:
+            break
+        await items.aclose()
+
+    asyncio.run(scenario())
+    assert closed == [FAST]
+
+
+def test_stream_raises_when_every_copy_fails():
+    router = hedging_router()
+
+    async def open_stream(route):
+        await asyncio.sleep(0.05 if route is SLOW else 0.1)
+        raise InferenceError(InferenceResult(error=InferenceErrorKind.TIMEOUT))
+        yield
+
+    async def scenario():
+        return [item async for item in router.stream(open_stream)]
+
+    with pytest.raises(InferenceError):
+        asyncio.run(scenario())
+    assert router.failures == {"slow": 1, "fast": 1}
+
+
+def test_a_single_route_is_never_hedged():
+    router = ModelRouter([SLOW], [SLOW], min_samples=5, max_hedge_ratio=1.0)
+    measure(router, SLOW, 0.01)
+    measure(router, SLOW, 0.01, kind="stream")
+    calls = []
+
+    async def call(route):
+        calls.append(route)
+        await asyncio.sleep(0.05)
+        return InferenceResult(value=route.name)
+
+    async def open_stream(route):
+        calls.append(route)
+        await asyncio.sleep(0.05)
+        yield route.name
+
+    async def scenario():
+        return await router.run(call), [item async for item in router.stream(open_stream)]
+
+    result, items = asyncio.run(scenario())
+    assert (result.value, items) == ("slow", ["slow"])
+    assert calls == [SLOW, SLOW]
+    assert (router.hedged, router.hedges_skipped) == (0, 0)
@@ -0,0 +1,38 @@
+import asyncio
+import time
+
+from utils.rate_limit import TokenBucket
+
+
+def test_burst_then_rate():
+    bucket = TokenBucket(rate=50, burst=5)
+
+    async def scenario():
+        started = time.monotonic()
+        for _ in range(10):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    elapsed = asyncio.run(scenario())
+    # 5 go at once from the burst, the other 5 are paced at 50 per second
+    assert 0.08 <= elapsed < 0.5
+    assert bucket.acquired == 10
+    assert bucket.stats()["waited_seconds"] > 0
+
+
+def test_try_acquire_does_not_wait():
+    bucket = TokenBucket(rate=1, burst=2)
+    assert bucket.try_acquire()
+    assert bucket.try_acquire()
+    assert not bucket.try_acquire()
+
+
+def test_zero_rate_disables_the_limit():
+    bucket = TokenBucket(rate=0)
+
+    async def scenario():
+        for _ in range(1000):
+            await bucket.acquire()
+
+    asyncio.run(scenario())
+    assert all(bucket.try_acquire() for _ in range(1000))
@@ -0,0 +1,218 @@
+import asyncio
+import time
+
+import pytest
+
+from utils.inference_executor import InferenceBusyError, InferenceExecutor
+from utils.resilient_inference import (AIMDLimiter, CircuitBreaker, InferenceError, InferenceErrorKind,
+                                       ResilientInference, classify_error)
+
+
+class FakeClientError(Exception):
+    """Shaped like botocore's ClientError, which carries the service error code."""
+
+    def __init__(self, code: str):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}}
+
+
+def test_classify_error():
+    assert classify_error(InferenceBusyError()) == InferenceErrorKind.BUSY
+    assert classify_error(FakeClientError("ThrottlingException")) == InferenceErrorKind.THROTTLED
+    assert classify_error(FakeClientError("ModelTimeoutException")) == InferenceErrorKind.TIMEOUT
+    assert classify_error(FakeClientError("ServiceUnavailableException")) == InferenceErrorKind.UNAVAILABLE
+    assert classify_error(ConnectionResetError()) == InferenceErrorKind.UNAVAILABLE
+    assert classify_error(FakeClientError("ValidationException")) == InferenceErrorKind.REJECTED
+
+
+def test_limiter_grows_on_success_and_cuts_once_per_burst():
+    limiter = AIMDLimiter(4, minimum=1, maximum=8)
+    # About +1 per round of `limit` successes
+    for _ in range(5):
+        limiter.on_success()
+    assert int(limiter.limit) == 5
+    before = limiter.limit
+    started = time.monotonic()
+    limiter.on_throttle(started)
+    # A second throttle from a call started before the cut is part of the same burst
+    limiter.on_throttle(started)
+    assert limiter.limit == pytest.approx(before * 0.5)
+    assert (limiter.throttles, limiter.cuts) == (2, 1)
+    for _ in range(10):
+        limiter.on_throttle(time.monotonic())
+    assert limiter.limit == 1
+
+
+def test_limiter_hands_slots_to_waiters_in_order_and_bounds_the_queue():
+    limiter = AIMDLimiter(1, max_queue=2)
+
+    async def scenario():
+        await limiter.acquire(1)
+        order = []
+
+        async def wait(name):
+            await limiter.acquire(1)
+            order.append(name)
+
+        waiters = [asyncio.ensure_future(wait(name)) for name in ("first", "second")]
+        await asyncio.sleep(0)
+        assert limiter.waiting == 2
+        with pytest.raises(InferenceBusyError):
+            await limiter.acquire(1)
+        limiter.release()
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(*waiters)
+        assert order == ["first", "second"]
+        with pytest.raises(InferenceBusyError):
+            await limiter.acquire(0.01)
+        assert limiter.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.allow() == (True, False)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.allow() == (False, False)
+    time.sleep(0.06)
+    assert breaker.allow() == (True, True)
+    # Only one probe at a time while half-open
+    assert breaker.allow() == (False, False)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    time.sleep(0.06)
+    assert breaker.allow() == (True, True)
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() == (True, False)
+
+
+def make_inference(concurrency: int = 2, timeout: float = 5, **kwargs) -> ResilientInference:
+    executor = InferenceExecutor(max_concurrency=concurrency, max_queue=8, timeout=timeout)
+    return ResilientInference(executor, AIMDLimiter(concurrency, max_queue=8), CircuitBreaker(3, 30),
+                              backoff_base=0.001, backoff_max=0.01, seed=1, **kwargs)
+
+
+def test_throttles_are_retried_and_cut_the_limit():
+    inference = make_inference(concurrency=4)
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) < 3:
+            raise FakeClientError("ThrottlingException")
+        return "answer"
+
+    try:
+        result = asyncio.run(inference.run(call))
+        assert result.ok and result.value == "answer" and result.attempts == 3
+        assert inference.limiter.cuts >= 1
+        assert inference.limiter.in_flight == 0
+    finally:
+        inference.executor.shutdown()
+
+
+def test_rejected_calls_are_not_retried():
+    inference = make_inference()
+
+    def call():
+        raise FakeClientError("ValidationException")
+
+    try:
+        result = asyncio.run(inference.run(call))
+        assert result.error == InferenceErrorKind.REJECTED and result.attempts == 1
+        assert inference.stats()["failures"] == {"rejected": 1}
+    finally:
+        inference.executor.shutdown()
+
+
+def test_circuit_opens_after_repeated_failures():
+    inference = make_inference(retries=0)
+
+    def call():
+        raise FakeClientError("ServiceUnavailableException")
+
+    async def scenario():
+        return [await inference.run(call) for _ in range(4)]
+
+    try:
+        results = asyncio.run(scenario())
+        assert [result.error for result in results] == [InferenceErrorKind.UNAVAILABLE] * 3 + \
+            [InferenceErrorKind.CIRCUIT_OPEN]
+        assert results[-1].retry_later and results[-1].retry_after > 0
+    finally:
+        inference.executor.shutdown()
+
+
+def test_timed_out_call_holds_its_limit_slot_until_the_thread_finishes():
+    inference = make_inference(concurrency=1, timeout=0.05, retries=0)
+
+    async def scenario():
+        result = await inference.run(time.sleep, 0.3)
+        assert result.error == InferenceErrorKind.TIMEOUT
+        # The thread is still sleeping, so the slot is still taken
+        assert inference.limiter.in_flight == 1
+        await asyncio.sleep(0.35)
+        assert inference.limiter.in_flight == 0
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        inference.executor.shutdown()
+
+
+def test_stream_retries_only_before_the_first_item():
+    inference = make_inference()
+    opened = []
+
+    def produce():
+        opened.append(1)
+        if len(opened) == 1:
+            raise FakeClientError("ThrottlingException")
+        yield "a"
+        raise FakeClientError("ServiceUnavailableException")
+
+    async def scenario():
+        received = []
+        with pytest.raises(InferenceError) as failure:
+            async for item in inference.stream(produce):
+                received.append(item)
+        return received, failure.value.result
+
+    try:
+        received, result = asyncio.run(scenario())
+        assert received == ["a"]
+        assert result.error == InferenceErrorKind.UNAVAILABLE
+        assert len(opened) == 2
+        assert inference.limiter.in_flight == 0
+    finally:
+        inference.executor.shutdown()
+
+
+def test_only_the_probe_releases_the_half_open_circuit():
+    executor = InferenceExecutor(max_concurrency=4, max_queue=8, timeout=5)
+    inference = ResilientInference(executor, AIMDLimiter(4, max_queue=8), CircuitBreaker(1, 0.05), retries=0)
+
+    def fail():
+        raise ConnectionResetError("down")
+
+    async def scenario():
+        # Admitted while the circuit is closed, still running once it is half-open
+        early = asyncio.ensure_future(inference.run(time.sleep, 0.5))
+        await asyncio.sleep(0.01)
+        assert (await inference.run(fail)).error == InferenceErrorKind.UNAVAILABLE
+        await asyncio.sleep(0.06)
+        probe = asyncio.ensure_future(inference.run(time.sleep, 0.2))
+        await asyncio.sleep(0.01)
+        early.cancel()
+        await asyncio.gather(early, return_exceptions=True)
+        # The probe is still in flight, so nothing else gets through
+        assert (await inference.run(time.sleep, 0)).error == InferenceErrorKind.CIRCUIT_OPEN
+        assert (await probe).ok
+        assert inference.breaker.state == CircuitBreaker.CLOSED
+
+    asyncio.run(scenario())
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from utils.child_context import ChildContext
+from utils.session_store import InMemorySessionStore, SQLiteSessionStore, SessionStore
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "session_store.db")
+
+
+def open_worker(path: str, name: str, **kwargs) -> SQLiteSessionStore:
+    store = SQLiteSessionStore(path, **kwargs)
+    # Two stores in one test process stand in for two workers
+    store.worker = name
+    return store
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        SessionStore()
+
+
+def test_invalidations_replay_to_other_workers(store_path):
+    first = open_worker(store_path, "first")
+    second = open_worker(store_path, "second")
+    try:
+        cursor, pending = second.invalidations_since(-1)
+        assert pending == []
+
+        first.set_context("C1", ChildContext("context 1", 12))
+        first.set_context("C2", ChildContext("context 2"))
+        # Compaction savings are shared along with the context
+        assert second.get_context("C1") == ChildContext("context 1", 12)
+
+        assert first.invalidate_many(["C1", "C2"]) is True
+        first.invalidate_context("C3")
+        first.invalidate_context(None)
+
+        cursor, pending = second.invalidations_since(cursor)
+        assert pending == ["C1", "C2", "C3", None]
+        assert second.get_context("C1") is None
+        # Replayed once; a worker never replays its own invalidations
+        assert second.invalidations_since(cursor) == (cursor, [])
+        assert first.invalidations_since(0)[1] == []
+    finally:
+        first.close()
+        second.close()
+
+
+def test_invalidate_many_writes_one_row_per_batch(store_path):
+    store = open_worker(store_path, "first")
+    try:
+        store.invalidate_many([f"C{i}" for i in range(50)])
+        assert store.invalidate_many([]) is False
+        assert store.conn.execute("SELECT COUNT(*) FROM invalidations").fetchone()[0] == 1
+    finally:
+        store.close()
+
+
+def test_follow_invalidations_applies_other_workers_batches(store_path):
+    first = open_worker(store_path, "first")
+    second = open_worker(store_path, "second")
+    applied = []
+
+    async def scenario():
+        follower = asyncio.ensure_future(second.follow_invalidations(applied.append, 0.01))
+        await asyncio.sleep(0.05)
+        first.invalidate_many(["C1", "C2"])
+        for _ in range(100):
+            if applied:
+                break
+            await asyncio.sleep(0.01)
+        follower.cancel()
+
+    try:
+        asyncio.run(scenario())
+        assert applied == ["C1", "C2"]
+    finally:
+        first.close()
+        second.close()
+
+
+def test_sessions_resume_until_they_expire(store_path):
+    first = open_worker(store_path, "first", session_ttl_seconds=3600)
+    second = open_worker(store_path, "second", session_ttl_seconds=3600)
+    try:
+        first.register("S1", "C1")
+        first.unregister("S1")
+        assert second.child_for("S1") == "C1"
+        assert second.child_for("unknown") is None
+    finally:
+        first.close()
+        second.close()
+
+
+def test_in_memory_sessions_expire():
+    store = InMemorySessionStore(session_ttl_seconds=0)
+    store.register("S1", "C1")
+    assert store.child_for("S1") == "C1"
+    store.unregister("S1")
+    assert store.child_for("S1") is None
+
+
+def test_prune_drops_sessions_left_by_a_crashed_worker(store_path):
+    crashed = open_worker(store_path, "crashed", session_ttl_seconds=60)
+    live = open_worker(store_path, "live", session_ttl_seconds=60)
+    try:
+        crashed.register("s-crashed", "C1")
+        live.register("s-live", "C2")
+        live.register("s-left", "C3")
+        live.unregister("s-left")
+        crashed.invalidate_context("C1")
+        # An hour on, only the live worker has kept its connected sessions fresh
+        live.conn.execute("UPDATE sessions SET last_seen = last_seen - 3600")
+        live.conn.execute("UPDATE invalidations SET at = at - 3601")
+        live.conn.commit()
+        live.heartbeat()
+        live.prune()
+        sessions = [row[0] for row in live.conn.execute("SELECT session_id FROM sessions")]
+        assert sessions == ["s-live"]
+        assert live.conn.execute("SELECT COUNT(*) FROM invalidations").fetchone()[0] == 0
+        assert live.child_for("s-crashed") is None and live.child_for("s-live") == "C2"
+    finally:
+        crashed.close()
+        live.close()
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch(child_id):
+        calls.append(child_id)
+        await asyncio.sleep(0.01)
+        return f"context of {child_id}"
+
+    async def scenario():
+        return await asyncio.gather(*[flight.do("C1", fetch, "C1") for _ in range(5)], flight.do("C2", fetch, "C2"))
+
+    results = asyncio.run(scenario())
+    assert results == ["context of C1"] * 5 + ["context of C2"]
+    assert calls == ["C1", "C2"]
+    stats = flight.stats()
+    assert (stats["requests"], stats["executions"], stats["calls_saved"], stats["in_flight"]) == (6, 2, 4, 0)
+
+
+def test_nothing_is_remembered_after_the_call():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        return len(calls)
+
+    async def scenario():
+        return [await flight.do("key", fetch), await flight.do("key", fetch)]
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+
+def test_errors_reach_every_waiter():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("graph down")
+
+    async def scenario():
+        return await asyncio.gather(*[flight.do("key", fail) for _ in range(3)], return_exceptions=True)
+
+    results = asyncio.run(scenario())
+    assert [type(result) for result in results] == [RuntimeError] * 3
+    assert flight.stats()["errors"] == 1
+
+
+def test_a_cancelled_waiter_does_not_cancel_the_others():
+    flight = SingleFlight()
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def scenario():
+        first = asyncio.ensure_future(flight.do("key", slow))
+        second = asyncio.ensure_future(flight.do("key", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "done"
+
+
+def test_streams_are_shared_and_replayed_to_late_joiners():
+    flight = SingleFlight()
+    opened = []
+
+    async def tokens():
+        opened.append(1)
+        for token in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield token
+
+    async def consume(delay):
+        await asyncio.sleep(delay)
+        return [token async for token in flight.stream("key", tokens)]
+
+    async def scenario():
+        return await asyncio.gather(consume(0), consume(0.015))
+
+    assert asyncio.run(scenario()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert opened == [1]
+
+
+def test_stream_stops_when_every_subscriber_leaves():
+    flight = SingleFlight()
+    closed = []
+
+    async def tokens():
+        try:
+            while True:
+                await asyncio.sleep(0.005)
+                yield "token"
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        items = flight.stream("key", tokens)
+        async for _ in items:
+            break
+        await items.aclose()
+        await asyncio.sleep(0.02)
+
+    asyncio.run(scenario())
+    assert closed == [True]
+    assert flight.stats()["in_flight"] == 0
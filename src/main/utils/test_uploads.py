@@ -0,0 +1,88 @@
+import asyncio
+import base64
+import io
+import json
+import os
+
+import pytest
+from fastapi import FastAPI, Request, UploadFile
+from fastapi.testclient import TestClient
+
+from utils.uploads import UploadSizeLimitMiddleware, iter_base64_json
+
+
+class ShortReads:
+    """An upload whose reads return at most `limit` bytes, whatever size is asked for."""
+
+    def __init__(self, data: bytes, limit: int):
+        self._file = io.BytesIO(data)
+        self.limit = limit
+
+    async def read(self, size: int = -1) -> bytes:
+        return self._file.read(min(size, self.limit))
+
+
+async def encode(file, chunk_size):
+    pieces = [piece async for piece in iter_base64_json(file, "image_data", chunk_size)]
+    return pieces, json.loads(b"".join(pieces))
+
+
+@pytest.mark.parametrize("size", [0, 1, 2, 3, 1000, 4097])
+@pytest.mark.parametrize("chunk_size", [1, 3, 64, 100])
+def test_pieces_form_one_base64_string(size, chunk_size):
+    data = os.urandom(size)
+    _, document = asyncio.run(encode(UploadFile(file=io.BytesIO(data)), chunk_size))
+    assert document == {"image_data": base64.b64encode(data).decode()}
+
+
+def test_short_reads_are_carried_to_the_next_chunk():
+    data = os.urandom(1000)
+    pieces, document = asyncio.run(encode(ShortReads(data, limit=7), chunk_size=30))
+    assert base64.b64decode(document["image_data"]) == data
+    # Only the last encoded piece may carry padding
+    assert not any(b"=" in piece for piece in pieces[1:-2])
+
+
+def limited_client(max_bytes: int = 100) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=max_bytes, paths=["/upload"])
+    app.state.declared_lengths = []
+
+    async def received(request: Request):
+        app.state.declared_lengths.append(request.headers.get("content-length"))
+        return {"bytes": len(await request.body())}
+
+    app.post("/upload")(received)
+    app.post("/other")(received)
+    return TestClient(app)
+
+
+def chunks(total: int, size: int = 30):
+    for start in range(0, total, size):
+        yield b"x" * min(size, total - start)
+
+
+def test_declared_length_over_the_limit_is_refused_before_the_body_is_read():
+    client = limited_client()
+    assert client.post("/upload", content=b"x" * 100).json() == {"bytes": 100}
+    response = client.post("/upload", content=b"x" * 101)
+    assert response.status_code == 413
+    assert response.json() == {"detail": "Upload exceeds the 100 byte limit"}
+    # The endpoint only saw the first request
+    assert client.app.state.declared_lengths == ["100"]
+
+
+def test_streamed_body_is_cut_off_once_it_passes_the_limit():
+    client = limited_client()
+    assert client.post("/upload", content=chunks(100)).json() == {"bytes": 100}
+    response = client.post("/upload", content=chunks(1000))
+    assert response.status_code == 413
+    assert "100 byte limit" in response.json()["detail"]
+    # Sent chunked, with no Content-Length to check up front
+    assert client.app.state.declared_lengths == [None, None]
+
+
+def test_other_paths_are_not_limited():
+    client = limited_client()
+    assert client.post("/other", content=b"x" * 1000).json() == {"bytes": 1000}
+    assert client.post("/other", content=chunks(1000)).json() == {"bytes": 1000}
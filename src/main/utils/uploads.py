@@ -0,0 +1,81 @@
+import base64
+from typing import AsyncIterator, Iterable
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+
+class UploadTooLargeError(HTTPException):
+    """Request body exceeded the upload limit; rendered as 413 by FastAPI's exception handling."""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Upload exceeds the {max_bytes} byte limit")
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware capping request bodies on upload routes.
+
+    A declared Content-Length over the limit is rejected before any of the body is
+    read; chunked uploads without a length are counted as they arrive and aborted as
+    soon as they cross it, so an oversized file is never fully spooled.
+    """
+
+    def __init__(self, app, max_bytes: int, paths: Iterable[str]):
+        """
+        :param app: ASGI app - the wrapped application
+        :param max_bytes: int - largest accepted request body
+        :param paths: iterable of str - request paths the limit applies to
+        """
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            error = UploadTooLargeError(self.max_bytes)
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise UploadTooLargeError(self.max_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def iter_base64_json(file: UploadFile, field: str, chunk_size: int = 192 * 1024) -> AsyncIterator[bytes]:
+    """
+    Stream `{"<field>": "<base64 of file>"}` without holding the file or its encoding in memory.
+
+    Chunks are encoded on 3-byte boundaries so the concatenated pieces form one valid
+    base64 string.
+    """
+    chunk_size = max(3, chunk_size - chunk_size % 3)
+    yield b'{"' + field.encode("utf-8") + b'": "'
+    leftover = b""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        data = leftover + chunk if leftover else chunk
+        cut = len(data) - len(data) % 3
+        leftover = data[cut:]
+        yield base64.b64encode(data[:cut])
+    if leftover:
+        yield base64.b64encode(leftover)
+    yield b'"}'